@@ -1,10 +1,55 @@
 from django.contrib import admin
-from .models import CustomUser, Location, Challenge, Hint, UserProgress, Leaderboard, ParticipationHistory
+from .models import CustomUser, Hunt, Location, Challenge, Hint, UserProgress, Leaderboard, ParticipationHistory, UserSummary, LocationStats
+from . import hunts
+
+
+# Los __str__ de estos modelos usan la ubicación o el usuario relacionados:
+# list_select_related evita una consulta extra por fila en los listados del admin
+class ChallengeAdmin(admin.ModelAdmin):
+    list_select_related = ('location',)
+
+
+class HintAdmin(admin.ModelAdmin):
+    list_select_related = ('location',)
+
+
+class UserProgressAdmin(admin.ModelAdmin):
+    list_select_related = ('user', 'location')
+    # Sin el COUNT(*) de toda la tabla en cada página; para exportar está /api/export/
+    show_full_result_count = False
+
+
+class LeaderboardAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+
+
+class ParticipationHistoryAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+    show_full_result_count = False
+
+
+@admin.action(description="Activar la búsqueda seleccionada")
+def activate_hunt(modeladmin, request, queryset):
+    if queryset.count() != 1:
+        modeladmin.message_user(request, "Selecciona una sola búsqueda.", level='error')
+        return
+    hunts.activate(queryset.get())
+
+
+class HuntAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_active', 'starts_at', 'ends_at', 'archived_at')
+    # La búsqueda activa se cambia con la acción, que también prepara su ranking
+    readonly_fields = ('is_active', 'archived_at')
+    actions = [activate_hunt]
+
 
 admin.site.register(CustomUser)
+admin.site.register(Hunt, HuntAdmin)
 admin.site.register(Location)
-admin.site.register(Challenge)
-admin.site.register(Hint)
-admin.site.register(UserProgress)
-admin.site.register(Leaderboard)
-admin.site.register(ParticipationHistory)
+admin.site.register(Challenge, ChallengeAdmin)
+admin.site.register(Hint, HintAdmin)
+admin.site.register(UserProgress, UserProgressAdmin)
+admin.site.register(Leaderboard, LeaderboardAdmin)
+admin.site.register(ParticipationHistory, ParticipationHistoryAdmin)
+admin.site.register(UserSummary)
+admin.site.register(LocationStats)
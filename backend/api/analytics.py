@@ -0,0 +1,149 @@
+"""
+Estadísticas por ubicación para los organizadores.
+
+``LocationStats`` acumula los contadores de cada ubicación a partir de
+``ParticipationHistory``. ``aggregate`` solo procesa los eventos con id mayor que
+la marca guardada en ``AnalyticsCursor`` (por bloques de ``batch_size``), así que
+cada ejecución cuesta lo que los eventos nuevos y no recorre el historial
+completo. El informe lee una fila por ubicación.
+
+Los ids se asignan al insertar pero se vuelven visibles al confirmar, así que
+un evento con id menor puede aparecer después de uno mayor. La marca solo avanza
+sobre eventos escritos (``recorded_at``) hace más de ``ANALYTICS_SAFETY_LAG``
+segundos, tiempo en el que cualquier transacción anterior ya se confirmó; si
+alguno quedara fuera igualmente, ``rebuild`` recalcula todo desde cero.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api import hunts
+from api.models import AnalyticsCursor, Location, LocationStats, ParticipationHistory
+
+EventType = ParticipationHistory.EventType
+CURSOR = 'location_stats'
+
+# Contador de LocationStats que suma cada tipo de evento
+COUNTERS = {
+    EventType.SCAN: 'scans',
+    EventType.CHALLENGE_VIEW: 'challenge_views',
+    EventType.ANSWER_ATTEMPT: 'answer_attempts',
+    EventType.HINT_TAKEN: 'hints_taken',
+    EventType.COMPLETION: 'completions',
+}
+FIELDS = list(COUNTERS.values()) + ['correct_answers', 'points_total', 'points_histogram']
+
+
+def _apply(first_id, last_id):
+    """
+    Suma a LocationStats los eventos con id en (first_id, last_id].
+    """
+    rows = (
+        ParticipationHistory.objects.filter(pk__gt=first_id, pk__lte=last_id)
+        .values('location_id', 'event_type', 'value')
+        .annotate(count=Count('pk'))
+        .order_by()
+    )
+    deltas = defaultdict(lambda: defaultdict(int))
+    histograms = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        delta = deltas[row['location_id']]
+        delta[COUNTERS[row['event_type']]] += row['count']
+        if row['event_type'] == EventType.ANSWER_ATTEMPT and row['value']:
+            delta['correct_answers'] += row['count']
+        elif row['event_type'] == EventType.COMPLETION:
+            points = row['value'] or 0
+            delta['points_total'] += points * row['count']
+            histograms[row['location_id']][str(points)] += row['count']
+
+    existing = LocationStats.objects.in_bulk(list(deltas))
+    created = []
+    for location_id, delta in deltas.items():
+        stats = existing.get(location_id)
+        if stats is None:
+            stats = LocationStats(location_id=location_id)
+            created.append(stats)
+        for field, value in delta.items():
+            setattr(stats, field, getattr(stats, field) + value)
+        histogram = dict(stats.points_histogram)
+        for points, count in histograms[location_id].items():
+            histogram[points] = histogram.get(points, 0) + count
+        stats.points_histogram = histogram
+
+    LocationStats.objects.bulk_create(created)
+    LocationStats.objects.bulk_update(list(existing.values()), FIELDS)
+
+
+def aggregate(batch_size=5000):
+    """
+    Procesa los eventos nuevos desde la marca hasta el primero escrito hace menos de
+    ``ANALYTICS_SAFETY_LAG`` segundos. Devuelve cuántos eventos se procesaron.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYTICS_SAFETY_LAG)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            # El bloqueo de la marca evita que dos agregaciones cuenten los mismos eventos
+            cursor, _ = AnalyticsCursor.objects.select_for_update().get_or_create(name=CURSOR)
+            rows = list(
+                ParticipationHistory.objects.filter(pk__gt=cursor.last_event_id)
+                .order_by('pk')
+                .values_list('pk', 'recorded_at')[:batch_size]
+            )
+            ids = []
+            for pk, recorded_at in rows:
+                if recorded_at > cutoff:
+                    break
+                ids.append(pk)
+            if not ids:
+                return processed
+            _apply(cursor.last_event_id, ids[-1])
+            cursor.last_event_id = ids[-1]
+            cursor.save(update_fields=['last_event_id'])
+        processed += len(ids)
+        if len(ids) < len(rows):
+            return processed
+
+
+def rebuild(batch_size=5000):
+    """
+    Borra las estadísticas y la marca y vuelve a procesar todo el historial.
+    """
+    with transaction.atomic():
+        LocationStats.objects.all().delete()
+        AnalyticsCursor.objects.filter(name=CURSOR).delete()
+    return aggregate(batch_size)
+
+
+def _ratio(numerator, denominator):
+    return round(numerator / denominator, 2) if denominator else None
+
+
+def report(hunt_id=None):
+    """
+    Una fila por ubicación de la búsqueda (por defecto la activa), incluidas las
+    que aún no tienen eventos (una consulta).
+    """
+    if hunt_id is None:
+        hunt_id = hunts.active_id()
+    rows = []
+    for location in Location.objects.filter(hunt_id=hunt_id).select_related('stats').order_by('pk'):
+        stats = getattr(location, 'stats', None) or LocationStats(location=location)
+        rows.append({
+            "location": {"id": location.pk, "name": location.name},
+            "scans": stats.scans,
+            "challenge_views": stats.challenge_views,
+            "completions": stats.completions,
+            "completion_rate": _ratio(stats.completions, stats.scans),
+            "answer_attempts": stats.answer_attempts,
+            "answer_accuracy": _ratio(stats.correct_answers, stats.answer_attempts),
+            # Pistas pedidas por cada escaneo
+            "average_hints": _ratio(stats.hints_taken, stats.scans),
+            "average_points": _ratio(stats.points_total, stats.completions),
+            "points_distribution": stats.points_histogram,
+        })
+    return rows
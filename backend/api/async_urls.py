@@ -0,0 +1,13 @@
+from django.urls import path
+from . import async_views
+
+# Endpoints asíncronos del juego (ASGI), montados en /api/v2/
+urlpatterns = [
+    path('login/', async_views.login_user, name='async_login'),
+    path('leaderboard/', async_views.get_leaderboard, name='async_get_leaderboard'),
+    path('leaderboard/stream/', async_views.leaderboard_stream, name='async_leaderboard_stream'),
+    path('scan-qr/', async_views.scan_qr_code, name='async_scan_qr_code'),
+    path('get_challenge/<str:token>/', async_views.get_challenge, name='async_get_challenge'),
+    path('validate_answer/<str:token>/', async_views.validate_answer, name='async_validate_answer'),
+    path('get_next_hint/<str:token>/', async_views.get_next_hint, name='async_get_next_hint'),
+]
@@ -0,0 +1,308 @@
+"""
+Versiones asíncronas (ASGI) de los endpoints del juego, montadas en /api/v2/.
+
+Usan el ORM asíncrono de Django (``aget``, ``acreate``, ``aget_or_create``,
+``aupdate``) y autentican el JWT sin bloquear el hilo del event loop. Las
+respuestas son las mismas que las de ``api/views.py``.
+"""
+import asyncio
+import functools
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import content_cache, events, hints, live_ranking, passwords, qr_tokens, ranking, scoring, summaries
+from api.authentication import user_cache
+from api.models import CustomUser, UserProgress
+
+logger = logging.getLogger(__name__)
+
+
+async def _authenticate(request, raw_token=None):
+    """
+    Valida el JWT de la cabecera Authorization (o ``raw_token``) y devuelve el usuario (ORM asíncrono).
+    """
+    authentication = JWTAuthentication()
+    if raw_token is None:
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        raise AuthenticationFailed("Las credenciales de autenticación no se proveyeron.")
+
+    validated_token = authentication.get_validated_token(raw_token)
+    user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+    user = user_cache.get(user_id) if user_cache.enabled else None
+    if user is not None:
+        return user
+    user = await CustomUser.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+    if user is None or not user.is_active:
+        raise AuthenticationFailed("Usuario no encontrado o inactivo.")
+    if user_cache.enabled:
+        user_cache.put(user_id, user)
+    return user
+
+
+def jwt_required(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            request.user = await _authenticate(request)
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def _resolve_qr_token(request, token):
+    try:
+        return await qr_tokens.aresolve(token, request.user), None
+    except qr_tokens.TokenExpired:
+        return None, JsonResponse({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+    except qr_tokens.TokenForbidden:
+        return None, JsonResponse({"error": "El token no pertenece a este usuario."}, status=status.HTTP_403_FORBIDDEN)
+    except qr_tokens.TokenInvalid:
+        return None, JsonResponse({"error": "Token inválido."}, status=status.HTTP_404_NOT_FOUND)
+
+
+@csrf_exempt
+@require_GET
+@jwt_required
+async def get_leaderboard(request):
+    if request.GET.get('around') == 'me':
+        try:
+            size = min(int(request.GET.get('size', settings.LEADERBOARD_AROUND_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({"error": "Parámetro 'size' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        window = await sync_to_async(ranking.get_around)(request.user, max(size, 0))
+        if window is None:
+            return JsonResponse({"error": "El usuario no está en el ranking."}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(window)
+
+    try:
+        limit = min(int(request.GET.get('limit', settings.LEADERBOARD_PAGE_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "Parámetro 'limit' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page = await ranking.aget_page(request.GET.get('cursor'), limit)
+    except ValueError:
+        return JsonResponse({"error": "Cursor inválido."}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse(page)
+
+
+@csrf_exempt
+@require_POST
+async def login_user(request):
+    """
+    Login solo con JWT: el hash de la contraseña se espera en el pool de
+    api/passwords.py sin bloquear el event loop.
+    """
+    data = _json_body(request)
+    user = await passwords.aauthenticate(data.get('email'), data.get('password'), request)
+    if user is None:
+        return JsonResponse({'error': 'Credenciales incorrectas'}, status=status.HTTP_401_UNAUTHORIZED)
+    await passwords.alogged_in(request, user)
+
+    refresh = RefreshToken.for_user(user)
+    return JsonResponse({
+        'access_token': str(refresh.access_token),
+        'refresh_token': str(refresh),
+    })
+
+
+async def _leaderboard_snapshot(limit):
+    return live_ranking.format_event('snapshot', await ranking.aget_page(None, limit))
+
+
+async def _leaderboard_events(queue, limit):
+    try:
+        yield await _leaderboard_snapshot(limit)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), settings.LIVE_RANKING_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comentario SSE para que proxies y navegador no cierren la conexión
+                yield ": ping\n\n"
+                continue
+            if message is live_ranking.RESYNC:
+                yield await _leaderboard_snapshot(limit)
+            else:
+                yield message
+    finally:
+        live_ranking.broadcaster.unsubscribe(queue)
+
+
+@require_GET
+async def leaderboard_stream(request):
+    """
+    Ranking en vivo (Server-Sent Events): un evento ``snapshot`` con la primera página
+    y luego eventos ``delta`` con la nueva posición de cada usuario que sume puntos.
+
+    EventSource no permite cabeceras, así que el JWT también se acepta en ``?access_token=``.
+
+    Solo funciona con un servidor ASGI (uvicorn, daphne): bajo WSGI (``runserver``,
+    gunicorn) Django junta todo el iterador asíncrono antes de enviar nada, así que
+    un stream sin fin nunca llegaría al cliente y ocuparía el hilo para siempre.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "El ranking en vivo requiere un servidor ASGI."}, status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+
+    try:
+        request.user = await _authenticate(request, request.GET.get('access_token'))
+    except AuthenticationFailed as exc:
+        return JsonResponse({"detail": str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        limit = min(int(request.GET.get('limit', settings.LEADERBOARD_PAGE_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": "Parámetro 'limit' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Suscribirse antes del snapshot para no perder cambios entre ambos
+    queue = live_ranking.broadcaster.subscribe()
+    response = StreamingHttpResponse(_leaderboard_events(queue, limit), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_POST
+@jwt_required
+async def scan_qr_code(request):
+    user = request.user
+    qr_code_value = _json_body(request).get('qr_code')
+
+    location = await content_cache.aget_bundle_by_qr(qr_code_value) if qr_code_value else None
+    if location is None:
+        return JsonResponse({"error": "Código QR no válido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    user_progress, _ = await UserProgress.objects.aget_or_create(
+        user=user, location_id=location["id"], defaults={"last_scanned_qr_id": location["id"], "hunt_id": location.get("hunt")}
+    )
+    if user_progress.completed:
+        return JsonResponse({"error": "Ya has completado el desafío para esta ubicación."}, status=status.HTTP_403_FORBIDDEN)
+
+    access_token = await qr_tokens.aissue(user, location["id"])
+    if user_progress.last_scanned_qr_id != location["id"]:
+        await UserProgress.objects.filter(pk=user_progress.pk).aupdate(last_scanned_qr_id=location["id"])
+    await summaries.arecord_scan(user.id, location["id"])
+    await events.arecord(user.id, location["id"], events.EventType.SCAN)
+
+    return JsonResponse({
+        "message": "QR escaneado con éxito.",
+        "location": location["name"],
+        "token": access_token,
+    })
+
+
+@csrf_exempt
+@require_GET
+@jwt_required
+async def get_challenge(request, token):
+    location_id, error_response = await _resolve_qr_token(request, token)
+    if error_response:
+        return error_response
+
+    user_progress = await UserProgress.objects.filter(user=request.user, location_id=location_id).afirst()
+    if user_progress and user_progress.completed:
+        return JsonResponse({"message": "Este desafío ya ha sido completado."}, status=status.HTTP_403_FORBIDDEN)
+
+    location = await content_cache.aget_bundle(location_id)
+    challenge = location["challenge"] if location else None
+    if not challenge:
+        return JsonResponse({"message": "No hay desafíos disponibles para esta ubicación."}, status=status.HTTP_404_NOT_FOUND)
+
+    await events.arecord(request.user.id, location_id, events.EventType.CHALLENGE_VIEW)
+    return JsonResponse({
+        "question": challenge["question"],
+        "points": challenge["points"],
+        "options": challenge["options"],
+    })
+
+
+@csrf_exempt
+@require_POST
+@jwt_required
+async def validate_answer(request, token):
+    location_id, error_response = await _resolve_qr_token(request, token)
+    if error_response:
+        return error_response
+
+    user_progress = await UserProgress.objects.filter(user=request.user, location_id=location_id).afirst()
+    if user_progress and user_progress.completed:
+        return JsonResponse({"message": "Este desafío ya ha sido completado."}, status=status.HTTP_403_FORBIDDEN)
+
+    location = await content_cache.aget_bundle(location_id)
+    challenge = location["challenge"] if location else None
+    answer = _json_body(request).get('answer')
+    if not challenge or not isinstance(answer, str) or not answer:
+        return JsonResponse({"error": "No se encontró el desafío o la respuesta no es válida."}, status=status.HTTP_404_NOT_FOUND)
+
+    correct = challenge["correct_answer"].lower() == answer.lower()
+    await events.arecord(request.user.id, location_id, events.EventType.ANSWER_ATTEMPT, int(correct))
+    if not correct:
+        return JsonResponse({"message": "Respuesta incorrecta.", "correct": False})
+
+    # La puntuación usa una transacción con select_for_update, que solo existe en el ORM síncrono
+    await sync_to_async(scoring.award_completion)(request.user, location_id, challenge["points"])
+    return JsonResponse({"message": "Respuesta correcta.", "points": challenge["points"], "correct": True})
+
+
+@csrf_exempt
+@require_GET
+@jwt_required
+async def get_next_hint(request, token):
+    location_id, error_response = await _resolve_qr_token(request, token)
+    if error_response:
+        logger.error("Token rechazado: %s", token)
+        return error_response
+
+    try:
+        count = int(request.GET.get('count', 1))
+        if not 1 <= count <= settings.HINTS_MAX_BATCH:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({"error": f"Parámetro 'count' inválido (1 a {settings.HINTS_MAX_BATCH})."}, status=status.HTTP_400_BAD_REQUEST)
+
+    location = await content_cache.aget_bundle(location_id)
+    try:
+        # UPDATE ... RETURNING con SQL directo: se ejecuta en el hilo del ORM síncrono
+        taken, remaining = await sync_to_async(hints.take_hints)(request.user.id, location_id, location, count)
+    except hints.NoProgress:
+        return JsonResponse({"error": "No se encontró progreso."}, status=status.HTTP_404_NOT_FOUND)
+    if not taken:
+        return JsonResponse({"message": "No hay más pistas disponibles para esta ubicación."})
+
+    for order, _ in taken:
+        await events.arecord(request.user.id, location_id, events.EventType.HINT_TAKEN, order)
+    return JsonResponse({
+        "hint": taken[0][1],
+        "hints": [{"order": order, "text": text} for order, text in taken],
+        "remaining": remaining,
+    })
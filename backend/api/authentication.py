@@ -0,0 +1,112 @@
+"""
+Autenticación JWT con caché de usuarios en memoria.
+
+``JWTAuthentication`` de simplejwt carga el usuario de la base de datos en cada
+solicitud. ``CachedJWTAuthentication`` guarda en cada proceso los usuarios ya
+resueltos por el claim ``user_id`` durante ``AUTH_USER_CACHE_TTL`` segundos, con
+desalojo LRU a partir de ``AUTH_USER_CACHE_SIZE`` entradas. Solo se cachean
+usuarios activos; guardar o borrar un ``CustomUser`` (p. ej. desactivarlo desde
+el admin) lo invalida mediante una señal. Los cambios hechos con ``update()`` no
+disparan señales y se ven al vencer el TTL.
+
+La señal se ejecuta solo en el proceso que hizo el cambio. Con ``CACHES_COHERENT``
+además incrementa la versión ``user:<id>`` de ``api/versions.py``, que cada
+acierto compara con la guardada junto al usuario (una lectura de la caché
+compartida en lugar de una consulta), así que la invalidación llega a todos los
+procesos. Sin cachés coherentes los demás procesos conservan la copia hasta que
+vence el TTL, que por eso es de pocos segundos por defecto.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api import versions
+
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id (str) -> (vence, versión, usuario)
+
+    @property
+    def enabled(self):
+        # Con CHECK_REVOKE_TOKEN cada token se compara con el hash de la contraseña
+        # actual, así que el usuario se lee siempre de la base de datos
+        return settings.AUTH_USER_CACHE_TTL > 0 and not getattr(jwt_settings, 'CHECK_REVOKE_TOKEN', False)
+
+    def version(self, user_id):
+        """
+        Versión compartida del usuario, o None sin cachés coherentes (no llegaría
+        a los demás procesos).
+        """
+        if not settings.CACHES_COHERENT:
+            return None
+        return versions.get(versions.user_key(user_id))
+
+    def get(self, user_id, version=None):
+        """
+        Devuelve una copia del usuario cacheado o None si no está, venció o se
+        guardó con otra versión. Cada solicitud recibe su propia copia para que
+        los cambios en ``request.user`` no se compartan.
+        """
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic() or entry[1] != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            user = entry[2]
+        return copy.copy(user)
+
+    def put(self, user_id, user, version=None):
+        key = str(user_id)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, version, copy.copy(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+        if settings.CACHES_COHERENT:
+            versions.bump(versions.user_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not user_cache.enabled:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken("El token no contiene una identificación de usuario reconocible.") from exc
+
+        # La versión se lee antes que la fila: si cambia entre ambas lecturas, la
+        # copia queda guardada con la versión anterior y el próximo acierto la descarta
+        version = user_cache.version(user_id)
+        user = user_cache.get(user_id, version)
+        if user is None:
+            # Valida existencia y estado activo igual que simplejwt
+            user = super().get_user(validated_token)
+            user_cache.put(user_id, user, version)
+        return user
@@ -0,0 +1,272 @@
+"""
+Benchmark de la API del juego.
+
+Crea una base de datos de prueba (como ``manage.py test``), la llena con N usuarios,
+ubicaciones, desafíos y pistas, y reproduce recorridos de jugadores con varios
+hilos usando el cliente de pruebas de Django::
+
+    scan-qr → get_challenge → get_next_hint → validate_answer → update_user_progress
+    ... y al final leaderboard y user-data
+
+Por cada endpoint (nombre de la URL) reporta latencia p50/p95/p99, solicitudes por
+segundo y consultas por solicitud. Los resultados se guardan en JSON para comparar
+entre commits con ``compare``.
+"""
+import math
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import events, hunts
+from api.models import Challenge, CustomUser, Hint, Leaderboard, Location
+from api.rank_cache import rank_cache
+
+EMAIL = "jugador{}@benchmark.local"
+QR_CODE = "BENCH-{}"
+HINTS_PER_LOCATION = 3
+
+
+# Base de datos de prueba
+
+def create_test_database(verbosity=0):
+    """
+    Crea la base de datos de prueba. En SQLite se usa un archivo temporal (y no
+    la BD en memoria) con transacciones IMMEDIATE, para que los hilos esperen el
+    bloqueo de escritura en lugar de fallar con "database is locked".
+    """
+    for alias in connections:
+        db = connections[alias].settings_dict
+        if not db['ENGINE'].endswith('sqlite3'):
+            continue
+        if not db['TEST'].get('NAME'):
+            db['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), f"benchmark_{alias}.sqlite3")
+        db['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+        db['OPTIONS'].setdefault('timeout', 30)
+    return setup_databases(verbosity=verbosity, interactive=False)
+
+
+def destroy_test_database(old_config, verbosity=0):
+    teardown_databases(old_config, verbosity=verbosity)
+
+
+def seed(users, locations, rng):
+    """
+    Inserta usuarios (con su fila de ranking), ubicaciones, desafíos y pistas.
+    """
+    password = make_password(None)
+    CustomUser.objects.bulk_create(
+        [CustomUser(email=EMAIL.format(i), first_name="Jugador", last_name=str(i), password=password) for i in range(users)],
+        batch_size=1000,
+    )
+    # bulk_create no dispara la señal que crea la fila de Leaderboard
+    user_ids = CustomUser.objects.filter(email__endswith="@benchmark.local").values_list('pk', flat=True)
+    Leaderboard.objects.bulk_create(
+        [Leaderboard(user_id=user_id, hunt_id=hunts.active_id(), total_points=rng.randrange(0, 200, 10)) for user_id in user_ids],
+        batch_size=1000,
+    )
+
+    Location.objects.bulk_create(
+        [Location(name=f"Ubicación {j}", description="Benchmark", qr_code=QR_CODE.format(j), hunt_id=hunts.active_id()) for j in range(locations)],
+        batch_size=1000,
+    )
+    location_ids = list(Location.objects.filter(qr_code__startswith="BENCH-").values_list('pk', flat=True))
+    Challenge.objects.bulk_create(
+        [
+            Challenge(location_id=location_id, question="¿Respuesta?", correct_answer="Sí", points=10, options=["Sí", "No"])
+            for location_id in location_ids
+        ],
+        batch_size=1000,
+    )
+    Hint.objects.bulk_create(
+        [
+            Hint(location_id=location_id, order=order, text=f"Pista {order}")
+            for location_id in location_ids
+            for order in range(1, HINTS_PER_LOCATION + 1)
+        ],
+        batch_size=1000,
+    )
+
+    # Las cachés en memoria del proceso apuntaban a la base de datos anterior
+    rank_cache.reset()
+    caches[settings.CONTENT_CACHE_ALIAS].clear()
+
+
+# Recorridos
+
+class Recorder:
+    """
+    Acumula (segundos, consultas, status) por nombre de URL. Es seguro entre hilos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def call(self, client, method, path, data=None):
+        name = resolve(path.split('?')[0]).url_name
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            if method == 'post':
+                response = client.post(path, data or {}, content_type='application/json')
+            else:
+                response = client.get(path)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples[name].append((elapsed, len(queries), response.status_code))
+        return response
+
+
+def play(recorder, user, qr_codes, rng):
+    """
+    Recorrido de un jugador: visita las ubicaciones dadas y consulta el ranking.
+    """
+    client = Client(headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+    for qr_code in qr_codes:
+        response = recorder.call(client, 'post', '/api/scan-qr/', {"qr_code": qr_code})
+        token = response.json().get("token")
+        if token is None:
+            continue
+        recorder.call(client, 'get', f'/api/get_challenge/{token}/')
+        if rng.random() < 0.5:
+            recorder.call(client, 'get', f'/api/get_next_hint/{token}/')
+        if rng.random() < 0.3:
+            recorder.call(client, 'post', f'/api/validate_answer/{token}/', {"answer": "No"})
+        recorder.call(client, 'post', f'/api/validate_answer/{token}/', {"answer": "Sí"})
+        recorder.call(client, 'post', f'/api/update_user_progress/{token}/')
+    recorder.call(client, 'get', '/api/leaderboard/')
+    recorder.call(client, 'get', '/api/user-data/')
+
+
+def run(users, locations, visits=3, workers=4, seed_value=1):
+    """
+    Llena la base de datos actual y ejecuta un recorrido por usuario con ``workers``
+    hilos. Devuelve el resumen (ver ``summarize``).
+    """
+    rng = random.Random(seed_value)
+    seed(users, locations, rng)
+
+    players = list(CustomUser.objects.filter(email__endswith="@benchmark.local").order_by('pk'))
+    qr_codes = [QR_CODE.format(j) for j in range(locations)]
+    journeys = [
+        (player, rng.sample(qr_codes, min(visits, locations)), random.Random(rng.random()))
+        for player in players
+    ]
+
+    recorder = Recorder()
+
+    def journey(args):
+        try:
+            play(recorder, *args)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    if workers <= 1:
+        for args in journeys:
+            play(recorder, *args)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(journey, journeys))
+    elapsed = time.perf_counter() - start
+
+    events.event_buffer.flush()
+    summary = summarize(recorder.samples, elapsed)
+    summary["meta"] = {
+        "timestamp": timezone.now().isoformat(),
+        "commit": _git_commit(),
+        "database": connection.vendor,
+        "users": users,
+        "locations": locations,
+        "visits": visits,
+        "workers": workers,
+        "seed": seed_value,
+        "settings": {
+            "QR_TOKEN_MODE": settings.QR_TOKEN_MODE,
+            "RANKING_CACHE_ENABLED": settings.RANKING_CACHE_ENABLED,
+            "EVENT_LOG_SYNC": settings.EVENT_LOG_SYNC,
+        },
+    }
+    return summary
+
+
+# Resultados
+
+def percentile(values, pct):
+    """
+    Percentil por rango más cercano de una lista ya ordenada.
+    """
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    endpoints = {}
+    total_requests = total_errors = 0
+    for name, rows in sorted(samples.items()):
+        latencies = sorted(seconds for seconds, _, _ in rows)
+        errors = sum(1 for _, _, code in rows if code >= 400)
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "rps": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "queries_per_request": round(sum(queries for _, queries, _ in rows) / len(rows), 2),
+        }
+        total_requests += len(rows)
+        total_errors += errors
+    return {
+        "total": {
+            "requests": total_requests,
+            "errors": total_errors,
+            "seconds": round(elapsed, 3),
+            "rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def compare(previous, current):
+    """
+    Devuelve líneas de texto con el cambio de p95 y consultas por endpoint respecto
+    a un resultado anterior.
+    """
+    lines = []
+    for name, now in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(name)
+        if before is None:
+            lines.append(f"{name}: nuevo")
+            continue
+        p95 = (now["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        queries = now["queries_per_request"] - before["queries_per_request"]
+        lines.append(f"{name}: p95 {p95:+.1f}%, consultas {queries:+.2f}")
+    return lines
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
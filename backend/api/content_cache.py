@@ -0,0 +1,195 @@
+"""
+Caché de lectura del contenido del juego (Location, Challenge y Hint).
+
+Cada ubicación se guarda como un paquete ya armado con su desafío y sus pistas
+ordenadas por ``order``. Se puede buscar por id de ubicación o por código QR;
+el código QR es único dentro de cada búsqueda, así que se resuelve junto con la
+búsqueda activa (``api/hunts.py``), cuyas ubicaciones son las que se pueden escanear. Las señales de
+``api/signals.py`` lo invalidan cuando cambia el contenido; para que la
+invalidación llegue a todos los procesos la caché ``CONTENT_CACHE_ALIAS`` debe
+ser compartida (``REDIS_URL``). Si no lo es, los paquetes duran poco
+(``CONTENT_CACHE_TIMEOUT``) y los demás procesos ven el cambio al expirar.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from api import db_routers, hunts, versions
+from api.models import Challenge, Hint, Location
+
+LOCATION_KEY = 'content:location:{}'
+QR_KEY = 'content:qr:{}:{}'  # Búsqueda, código QR
+
+
+def _backend():
+    return caches[settings.CONTENT_CACHE_ALIAS]
+
+
+def build_bundle(location):
+    """
+    Arma el paquete de contenido de una ubicación (2 consultas: desafío y pistas).
+    """
+    challenge = location.challenges.order_by('pk').first()
+    hints = list(location.hints.order_by('order').values_list('order', 'text'))
+    return _bundle(location, challenge, hints)
+
+
+async def abuild_bundle(location):
+    challenge = await location.challenges.order_by('pk').afirst()
+    hints = [hint async for hint in location.hints.order_by('order').values_list('order', 'text')]
+    return _bundle(location, challenge, hints)
+
+
+def _bundle(location, challenge, hints):
+    return {
+        "id": location.id,
+        "name": location.name,
+        "description": location.description,
+        "qr_code": location.qr_code,
+        "hunt": location.hunt_id,
+        "challenge": {
+            "id": challenge.id,
+            "question": challenge.question,
+            "correct_answer": challenge.correct_answer,
+            "points": challenge.points,
+            "options": challenge.options,
+        } if challenge else None,
+        "hints": hints,
+    }
+
+
+def _entries(bundle):
+    return {
+        LOCATION_KEY.format(bundle["id"]): bundle,
+        QR_KEY.format(bundle["hunt"], bundle["qr_code"]): bundle["id"],
+    }
+
+
+def _store(bundle):
+    _backend().set_many(_entries(bundle), timeout=settings.CONTENT_CACHE_TIMEOUT)
+    return bundle
+
+
+async def _astore(bundle):
+    await _backend().aset_many(_entries(bundle), timeout=settings.CONTENT_CACHE_TIMEOUT)
+    return bundle
+
+
+def get_bundle(location_id):
+    """
+    Devuelve el paquete de la ubicación o None si no existe.
+    """
+    bundle = _backend().get(LOCATION_KEY.format(location_id))
+    if bundle is not None:
+        return bundle
+
+    location = Location.objects.filter(pk=location_id).first()
+    if location is None:
+        return None
+    return _store(build_bundle(location))
+
+
+def _playable(bundle, hunt_id):
+    # Paquetes guardados antes de las búsquedas no tienen la clave: espacio por defecto
+    return bundle if bundle.get("hunt") == hunt_id else None
+
+
+def get_bundle_by_qr(qr_code):
+    """
+    Devuelve el paquete de la ubicación de la búsqueda activa con el código QR dado
+    o None si no existe.
+    """
+    hunt_id = hunts.active_id()
+    location_id = _backend().get(QR_KEY.format(hunt_id, qr_code))
+    if location_id is not None:
+        bundle = get_bundle(location_id)
+        # El código QR o la búsqueda pudieron haber cambiado desde que se guardó la referencia
+        if bundle is not None and bundle["qr_code"] == qr_code:
+            return _playable(bundle, hunt_id)
+
+    location = Location.objects.filter(hunt_id=hunt_id, qr_code=qr_code).first()
+    if location is None:
+        return None
+    return _store(build_bundle(location))
+
+
+def get_bundles_by_qr(qr_codes):
+    """
+    Devuelve {código QR: paquete} de los códigos de la búsqueda activa. Lee la caché con
+    ``get_many`` y arma los que faltan con tres consultas en total, sin importar
+    cuántos sean.
+    """
+    qr_codes = set(qr_codes)
+    hunt_id = hunts.active_id()
+    backend = _backend()
+    ids = backend.get_many([QR_KEY.format(hunt_id, qr_code) for qr_code in qr_codes])
+    cached = backend.get_many([LOCATION_KEY.format(location_id) for location_id in ids.values()])
+    bundles = {
+        bundle["qr_code"]: bundle for bundle in cached.values()
+        if bundle["qr_code"] in qr_codes and _playable(bundle, hunt_id)
+    }
+
+    missing = qr_codes - bundles.keys()
+    if missing:
+        locations = Location.objects.filter(hunt_id=hunt_id, qr_code__in=missing).prefetch_related(
+            Prefetch('challenges', queryset=Challenge.objects.order_by('pk')),
+            Prefetch('hints', queryset=Hint.objects.order_by('order')),
+        )
+        entries = {}
+        for location in locations:
+            challenges = list(location.challenges.all())
+            hints = [(hint.order, hint.text) for hint in location.hints.all()]
+            bundle = _bundle(location, challenges[0] if challenges else None, hints)
+            bundles[bundle["qr_code"]] = bundle
+            entries.update(_entries(bundle))
+        backend.set_many(entries, timeout=settings.CONTENT_CACHE_TIMEOUT)
+    return bundles
+
+
+async def aget_bundle(location_id):
+    """
+    Versión asíncrona de ``get_bundle`` (ORM y caché asíncronos).
+    """
+    bundle = await _backend().aget(LOCATION_KEY.format(location_id))
+    if bundle is not None:
+        return bundle
+
+    location = await Location.objects.filter(pk=location_id).afirst()
+    if location is None:
+        return None
+    return await _astore(await abuild_bundle(location))
+
+
+async def aget_bundle_by_qr(qr_code):
+    hunt_id = await hunts.aactive_id()
+    location_id = await _backend().aget(QR_KEY.format(hunt_id, qr_code))
+    if location_id is not None:
+        bundle = await aget_bundle(location_id)
+        if bundle is not None and bundle["qr_code"] == qr_code:
+            return _playable(bundle, hunt_id)
+
+    location = await Location.objects.filter(hunt_id=hunt_id, qr_code=qr_code).afirst()
+    if location is None:
+        return None
+    return await _astore(await abuild_bundle(location))
+
+
+def get_hint(bundle, order):
+    """
+    Texto de la pista con el número ``order`` del paquete o None si no existe.
+    """
+    for hint_order, text in bundle["hints"]:
+        if hint_order == order:
+            return text
+    return None
+
+
+def invalidate(location_id, qr_code=None, hunt_id=None):
+    # Hasta que la réplica se ponga al día, el paquete se vuelve a armar desde la base principal
+    db_routers.mark_content_written()
+    versions.bump(versions.location_key(location_id))
+    versions.bump(versions.LOCATIONS)
+    keys = [LOCATION_KEY.format(location_id)]
+    if qr_code is not None:
+        keys.append(QR_KEY.format(hunt_id, qr_code))
+    _backend().delete_many(keys)
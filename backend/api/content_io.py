@@ -0,0 +1,293 @@
+"""
+Lectura y escritura del contenido de la búsqueda (ubicaciones con su desafío y
+pistas) en JSON Lines o CSV, usado por los comandos ``import_content`` y
+``export_content``.
+
+Cada registro tiene la forma::
+
+    {"name": ..., "description": ..., "qr_code": ...,
+     "challenge": {"question": ..., "correct_answer": ..., "points": 10, "options": [...]},
+     "hints": [{"order": 1, "text": ...}, ...]}
+
+Opcionalmente ``latitude`` y ``longitude`` (grados) para el índice espacial.
+Se importa y exporta el contenido de la búsqueda activa (``api/hunts.py``): el
+código QR identifica la ubicación dentro de ella.
+En CSV el desafío se aplana en columnas y ``options`` y ``hints`` van como JSON.
+"""
+import csv
+import json
+
+from django.db import transaction
+
+from api import content_cache, hunts
+from api.models import Challenge, Hint, Location
+
+CSV_FIELDS = ['name', 'description', 'qr_code', 'latitude', 'longitude', 'question', 'correct_answer', 'points', 'options', 'hints']
+
+
+class ContentError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"Línea {line}: {message}")
+        self.line = line
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+# Lectura
+
+def _read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ContentError(line_number, f"JSON inválido ({exc.msg}).")
+
+
+def _read_csv(stream):
+    # La línea 1 es el encabezado
+    for line_number, row in enumerate(csv.DictReader(stream), start=2):
+        try:
+            record = {
+                "name": row.get('name'),
+                "description": row.get('description') or None,
+                "qr_code": row.get('qr_code'),
+                "hints": json.loads(row.get('hints') or '[]'),
+            }
+            for field in ('latitude', 'longitude'):
+                if row.get(field):
+                    record[field] = float(row[field])
+            if row.get('question'):
+                record["challenge"] = {
+                    "question": row['question'],
+                    "correct_answer": row.get('correct_answer'),
+                    "points": int(row['points']) if row.get('points') else 10,
+                    "options": json.loads(row.get('options') or '[]'),
+                }
+        except (json.JSONDecodeError, ValueError) as exc:
+            raise ContentError(line_number, f"Valor inválido ({exc}).")
+        yield line_number, record
+
+
+def read_records(stream, fmt):
+    reader = _read_csv if fmt == 'csv' else _read_jsonl
+    return reader(stream)
+
+
+def validate_record(line_number, record):
+    """
+    Verifica un registro antes de escribirlo. Lanza ContentError si no es válido.
+    """
+    if not isinstance(record, dict):
+        raise ContentError(line_number, "Cada registro debe ser un objeto.")
+    for field in ('name', 'qr_code'):
+        if not record.get(field):
+            raise ContentError(line_number, f"El campo '{field}' es obligatorio.")
+        if not isinstance(record[field], str):
+            raise ContentError(line_number, f"'{field}' debe ser un texto.")
+    if not isinstance(record.get("description") or '', str):
+        raise ContentError(line_number, "'description' debe ser un texto.")
+
+    latitude, longitude = record.get("latitude"), record.get("longitude")
+    if (latitude is None) != (longitude is None):
+        raise ContentError(line_number, "'latitude' y 'longitude' van juntas.")
+    if latitude is not None:
+        numbers = all(isinstance(value, (int, float)) for value in (latitude, longitude))
+        if not numbers or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ContentError(line_number, "Coordenadas inválidas.")
+
+    challenge = record.get("challenge")
+    if challenge is not None:
+        if not isinstance(challenge, dict):
+            raise ContentError(line_number, "'challenge' debe ser un objeto.")
+        if not challenge.get("question") or not challenge.get("correct_answer"):
+            raise ContentError(line_number, "El desafío necesita 'question' y 'correct_answer'.")
+        if not isinstance(challenge.get("options", []), list):
+            raise ContentError(line_number, "'options' debe ser una lista.")
+        if not isinstance(challenge.get("points", 10), int) or challenge.get("points", 10) < 0:
+            raise ContentError(line_number, "'points' debe ser un entero positivo.")
+
+    # unique_together (location, order) de Hint
+    orders = set()
+    if not isinstance(record.get("hints") or [], list):
+        raise ContentError(line_number, "'hints' debe ser una lista.")
+    for hint in record.get("hints") or []:
+        order = hint.get("order") if isinstance(hint, dict) else None
+        if not isinstance(order, int) or order < 1 or not hint.get("text"):
+            raise ContentError(line_number, "Cada pista necesita 'order' (entero >= 1) y 'text'.")
+        if order in orders:
+            raise ContentError(line_number, f"La pista con order={order} está repetida.")
+        orders.add(order)
+
+
+# Escritura en la base de datos
+
+def _import_chunk(chunk, replace_hints):
+    hunt_id = hunts.active_id()
+    # El código QR es único por búsqueda y, en el espacio por defecto (hunt NULL), solo
+    # con una restricción parcial que ON CONFLICT no puede usar: como con Challenge,
+    # se separa entre las ubicaciones que ya existen (bulk_update) y las nuevas (bulk_create).
+    location_fields = ['name', 'description', 'latitude', 'longitude']
+    existing = {
+        location.qr_code: location
+        for location in Location.objects.filter(hunt_id=hunt_id, qr_code__in=[record["qr_code"] for _, record in chunk])
+    }
+    locations, new_locations = [], []
+    for _, record in chunk:
+        location = existing.get(record["qr_code"]) or Location(qr_code=record["qr_code"], hunt_id=hunt_id)
+        location.name = record["name"]
+        location.description = record.get("description")
+        location.latitude = record.get("latitude")
+        location.longitude = record.get("longitude")
+        locations.append(location)
+        if location.pk is None:
+            new_locations.append(location)
+    Location.objects.bulk_update([location for location in locations if location.pk is not None], location_fields, batch_size=100)
+    Location.objects.bulk_create(new_locations)
+    ids = dict(Location.objects.filter(hunt_id=hunt_id, qr_code__in=existing.keys() | {loc.qr_code for loc in new_locations}).values_list('qr_code', 'id'))
+
+    # Challenge no tiene una restricción única por ubicación, así que se separa
+    # entre los que ya existen (bulk_update, solo si cambiaron) y los nuevos (bulk_create).
+    fields = ['question', 'correct_answer', 'points', 'options']
+    existing = {
+        challenge.location_id: challenge
+        for challenge in Challenge.objects.filter(location_id__in=ids.values()).order_by('-pk').only('location_id', *fields)
+    }
+    to_update, to_create = [], []
+    for _, record in chunk:
+        data = record.get("challenge")
+        if data is None:
+            continue
+        location_id = ids[record["qr_code"]]
+        values = {
+            "question": data["question"],
+            "correct_answer": data["correct_answer"],
+            "points": data.get("points", 10),
+            "options": data.get("options", []),
+        }
+        current = existing.get(location_id)
+        if current is None:
+            to_create.append(Challenge(location_id=location_id, **values))
+        elif any(getattr(current, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(current, field, value)
+            to_update.append(current)
+    Challenge.objects.bulk_create(to_create)
+    Challenge.objects.bulk_update(to_update, fields, batch_size=100)
+
+    if replace_hints:
+        Hint.objects.filter(location_id__in=ids.values()).delete()
+    hints = [
+        Hint(location_id=ids[record["qr_code"]], order=hint["order"], text=hint["text"])
+        for _, record in chunk
+        for hint in record.get("hints") or []
+    ]
+    Hint.objects.bulk_create(
+        hints,
+        update_conflicts=True,
+        unique_fields=['location', 'order'],
+        update_fields=['text'],
+    )
+
+    # bulk_create no dispara señales: invalidamos la caché de contenido al confirmar
+    def invalidate():
+        for qr_code, location_id in ids.items():
+            content_cache.invalidate(location_id, qr_code, hunt_id)
+    transaction.on_commit(invalidate)
+    return len(locations), len(to_create) + len(to_update), len(hints)
+
+
+def import_records(records, chunk_size=1000, replace_hints=False):
+    """
+    Valida e inserta/actualiza los registros por bloques dentro de una transacción.
+    Devuelve (ubicaciones, desafíos, pistas) procesados.
+    """
+    totals = [0, 0, 0]
+    seen_qr, seen_names = set(), set()
+    chunk = []
+
+    def write():
+        for idx, count in enumerate(_import_chunk(chunk, replace_hints)):
+            totals[idx] += count
+        chunk.clear()
+
+    with transaction.atomic():
+        for line_number, record in records:
+            validate_record(line_number, record)
+            if record["qr_code"] in seen_qr:
+                raise ContentError(line_number, f"El código QR '{record['qr_code']}' está repetido en el archivo.")
+            if record["name"] in seen_names:
+                raise ContentError(line_number, f"El nombre '{record['name']}' está repetido en el archivo.")
+            seen_qr.add(record["qr_code"])
+            seen_names.add(record["name"])
+
+            chunk.append((line_number, record))
+            if len(chunk) >= chunk_size:
+                write()
+        if chunk:
+            write()
+    return tuple(totals)
+
+
+# Exportación
+
+def iter_records(chunk_size=1000):
+    """
+    Recorre las ubicaciones de la búsqueda activa con su desafío y pistas sin cargar
+    toda la tabla en memoria.
+    """
+    queryset = Location.objects.filter(hunt_id=hunts.active_id()).order_by('pk').prefetch_related('challenges', 'hints')
+    for location in queryset.iterator(chunk_size=chunk_size):
+        challenges = sorted(location.challenges.all(), key=lambda c: c.pk)
+        record = {
+            "name": location.name,
+            "description": location.description,
+            "qr_code": location.qr_code,
+            "hints": [
+                {"order": hint.order, "text": hint.text}
+                for hint in sorted(location.hints.all(), key=lambda h: h.order)
+            ],
+        }
+        if location.latitude is not None:
+            record["latitude"], record["longitude"] = location.latitude, location.longitude
+        if challenges:
+            challenge = challenges[0]
+            record["challenge"] = {
+                "question": challenge.question,
+                "correct_answer": challenge.correct_answer,
+                "points": challenge.points,
+                "options": challenge.options,
+            }
+        yield record
+
+
+def write_records(records, stream, fmt):
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for record in records:
+            challenge = record.get("challenge") or {}
+            writer.writerow({
+                "name": record["name"],
+                "description": record["description"] or '',
+                "qr_code": record["qr_code"],
+                "latitude": record.get("latitude", ''),
+                "longitude": record.get("longitude", ''),
+                "question": challenge.get("question", ''),
+                "correct_answer": challenge.get("correct_answer", ''),
+                "points": challenge.get("points", ''),
+                "options": json.dumps(challenge.get("options", []), ensure_ascii=False),
+                "hints": json.dumps(record["hints"], ensure_ascii=False),
+            })
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+    return count
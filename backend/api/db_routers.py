@@ -0,0 +1,97 @@
+"""
+Enrutamiento de lecturas a la réplica de PostgreSQL (alias ``DATABASE_REPLICA_ALIAS``).
+
+Van a la réplica:
+
+- Las lecturas de contenido (``Location``, ``Challenge``, ``Hint``), salvo durante
+  ``REPLICA_STICKY_SECONDS`` después de un cambio de contenido, para que la caché
+  de contenido no se vuelva a llenar con datos atrasados.
+- Todas las lecturas de las vistas marcadas con ``@replica_reads``
+  (``get_leaderboard`` y ``get_user_data``), salvo si el usuario escribió su
+  propio progreso o puntaje hace menos de ``REPLICA_STICKY_SECONDS``: así ve
+  siempre lo que acaba de hacer (read-your-writes).
+
+Dentro de una transacción abierta en ``default`` todas las lecturas van a
+``default``: la réplica no ve lo que la transacción aún no confirma (p. ej. las
+ubicaciones recién creadas por ``import_content``).
+
+Las marcas se guardan en la caché ``default`` para que valgan entre procesos si
+esa caché es compartida (Redis/Memcached). Las escrituras y migraciones van
+siempre a ``default``. Sin réplica configurada el router no cambia nada.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+USER_KEY = 'replica:sticky:user:{}'
+CONTENT_KEY = 'replica:sticky:content'
+CONTENT_MODELS = {'location', 'challenge', 'hint'}
+
+# True dentro de una vista @replica_reads cuyo usuario puede leer de la réplica
+_replica_allowed = contextvars.ContextVar('replica_allowed', default=False)
+
+
+def replica_alias():
+    return settings.DATABASE_REPLICA_ALIAS
+
+
+def mark_written(user_id):
+    """
+    El usuario escribió su progreso o puntaje: sus lecturas van a la base principal por un rato.
+    """
+    if replica_alias():
+        cache.set(USER_KEY.format(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+async def amark_written(user_id):
+    if replica_alias():
+        await cache.aset(USER_KEY.format(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def mark_content_written():
+    if replica_alias():
+        cache.set(CONTENT_KEY, True, settings.REPLICA_STICKY_SECONDS)
+
+
+def replica_reads(view):
+    """
+    Envía a la réplica las lecturas de la vista. Va debajo de ``@api_view`` para
+    que ``request.user`` ya esté autenticado.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        allowed = bool(replica_alias()) and not cache.get(USER_KEY.format(request.user.pk))
+        reset = _replica_allowed.set(allowed)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_allowed.reset(reset)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if not alias:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if _replica_allowed.get():
+            return alias
+        if model._meta.app_label == 'api' and model._meta.model_name in CONTENT_MODELS and not cache.get(CONTENT_KEY):
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS if replica_alias() else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la base principal
+        return True if replica_alias() else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema por replicación
+        return db != replica_alias() if replica_alias() else None
@@ -0,0 +1,179 @@
+"""
+Registro de eventos de participación (escaneos, vistas de desafío, respuestas,
+pistas y completaciones).
+
+Las vistas solo agregan el evento a un buffer en memoria; un hilo en segundo
+plano lo escribe en ``ParticipationHistory`` con ``bulk_create`` cuando se
+alcanza ``EVENT_LOG_BATCH_SIZE`` eventos o pasan ``EVENT_LOG_FLUSH_INTERVAL``
+segundos. Al terminar el proceso se vacía el buffer para no perder eventos.
+
+Si la base de datos no está disponible, el lote vuelve al buffer hasta
+``EVENT_LOG_MAX_RETRIES`` veces seguidas; después se guarda fila por fila y se
+descartan (registrándolas en el log) las que sigan fallando, para que una fila
+inválida no bloquee a las demás. El buffer no pasa de ``EVENT_LOG_MAX_PENDING``
+eventos: los que no caben se descartan y se cuentan en ``dropped()``.
+"""
+import atexit
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from api.models import ParticipationHistory
+
+logger = logging.getLogger(__name__)
+
+EventType = ParticipationHistory.EventType
+
+
+class EventBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._failures = 0    # Escrituras por lote fallidas seguidas
+        self._dropped = 0     # Eventos descartados en total
+        self._unreported = 0  # Descartados por buffer lleno aún no avisados en el log
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, user_id, location_id, event_type, value=None, timestamp=None):
+        """
+        Agrega un evento al buffer. Es lo único que paga la solicitud. ``timestamp``
+        permite registrar la hora en que ocurrió (p. ej. acciones sincronizadas sin conexión).
+        """
+        event = ParticipationHistory(
+            user_id=user_id,
+            location_id=location_id,
+            event_type=event_type,
+            value=value,
+            timestamp=timestamp or timezone.now(),
+        )
+        if settings.EVENT_LOG_SYNC:
+            event.save()
+            return
+
+        with self._lock:
+            if len(self._pending) >= settings.EVENT_LOG_MAX_PENDING:
+                self._dropped += 1
+                self._unreported += 1
+                return
+            self._pending.append(event)
+            size = len(self._pending)
+        self._ensure_thread()
+        if size >= settings.EVENT_LOG_BATCH_SIZE:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Escribe los eventos pendientes. Devuelve cuántos se guardaron.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+            unreported, self._unreported = self._unreported, 0
+        if unreported:
+            logger.warning("Buffer de eventos lleno: se descartaron %s eventos de participación", unreported)
+        if not batch:
+            return 0
+
+        try:
+            with transaction.atomic():
+                ParticipationHistory.objects.bulk_create(batch, batch_size=settings.EVENT_LOG_BATCH_SIZE)
+        except Exception:
+            self._failures += 1
+            if self._failures <= settings.EVENT_LOG_MAX_RETRIES:
+                logger.exception(
+                    "No se pudieron guardar %s eventos de participación; se reintentará (%s/%s)",
+                    len(batch), self._failures, settings.EVENT_LOG_MAX_RETRIES,
+                )
+                self._requeue(batch)
+                return 0
+            logger.exception("No se pudieron guardar %s eventos de participación; se guardan uno por uno", len(batch))
+            self._failures = 0
+            return self._save_each(batch)
+        self._failures = 0
+        return len(batch)
+
+    def _requeue(self, batch):
+        with self._lock:
+            # Se devuelven al inicio para conservar el orden; si no caben, se pierden los más nuevos
+            self._pending[:0] = batch
+            overflow = len(self._pending) - settings.EVENT_LOG_MAX_PENDING
+            if overflow > 0:
+                del self._pending[-overflow:]
+                self._dropped += overflow
+                self._unreported += overflow
+
+    def _save_each(self, batch):
+        saved = 0
+        for event in batch:
+            # Un lote fallido pudo haber asignado pk a algunos eventos antes del rollback
+            event.pk = None
+            try:
+                with transaction.atomic():
+                    event.save(force_insert=True)
+            except Exception:
+                logger.exception(
+                    "Se descarta el evento de participación (usuario %s, ubicación %s, tipo %s)",
+                    event.user_id, event.location_id, event.event_type,
+                )
+                with self._lock:
+                    self._dropped += 1
+            else:
+                saved += 1
+        return saved
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def dropped(self):
+        with self._lock:
+            return self._dropped
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name='participation-events', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(settings.EVENT_LOG_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def shutdown(self):
+        """
+        Detiene el hilo y escribe lo que quede en el buffer.
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.EVENT_LOG_FLUSH_INTERVAL + 5)
+            self._thread = None
+        self.flush()
+
+
+event_buffer = EventBuffer()
+record = event_buffer.record
+atexit.register(event_buffer.shutdown)
+
+
+async def arecord(user_id, location_id, event_type, value=None):
+    """
+    Versión asíncrona de ``record``: solo toca la BD si ``EVENT_LOG_SYNC`` está activo.
+    """
+    if settings.EVENT_LOG_SYNC:
+        await sync_to_async(record)(user_id, location_id, event_type, value)
+    else:
+        record(user_id, location_id, event_type, value)
@@ -0,0 +1,79 @@
+"""
+Exportación de resultados en CSV o JSON Lines: historial de participación,
+progreso de los usuarios y ranking final (estos dos, de la búsqueda activa).
+
+Las filas se leen con ``values_list`` e ``.iterator(chunk_size=...)`` (sin crear
+instancias de modelos ni cargar la tabla completa) y se generan línea por línea,
+así que la memoria no depende del número de filas. La misma función alimenta el
+``StreamingHttpResponse`` de la vista y el comando ``export_results``.
+"""
+import csv
+import json
+from datetime import datetime
+
+from api import hunts, ranking
+from api.models import Leaderboard, ParticipationHistory, UserProgress
+
+
+def _participation():
+    return ParticipationHistory.objects.order_by('pk').values_list(
+        'pk', 'user_id', 'user__email', 'location_id', 'location__name', 'event_type', 'value', 'timestamp',
+    )
+
+
+def _progress():
+    return UserProgress.objects.filter(hunt_id=hunts.active_id()).order_by('pk').values_list(
+        'pk', 'user_id', 'user__email', 'location_id', 'location__name', 'completed', 'points_earned', 'current_hint', 'completed_at',
+    )
+
+
+def _leaderboard():
+    return Leaderboard.objects.filter(hunt_id=hunts.active_id()).order_by(*ranking.RANKING_ORDER).values_list(
+        'user_id', 'user__email', 'user__first_name', 'user__last_name', 'total_points',
+    )
+
+
+# Nombre -> (consulta, columnas). El ranking agrega la posición como primera columna.
+DATASETS = {
+    'participation': (_participation, ['id', 'user_id', 'email', 'location_id', 'location', 'event_type', 'value', 'timestamp']),
+    'progress': (_progress, ['id', 'user_id', 'email', 'location_id', 'location', 'completed', 'points_earned', 'current_hint', 'completed_at']),
+    'leaderboard': (_leaderboard, ['rank', 'user_id', 'email', 'first_name', 'last_name', 'total_points']),
+}
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def iter_rows(dataset, chunk_size=2000):
+    query, _ = DATASETS[dataset]
+    rows = query().iterator(chunk_size=chunk_size)
+    if dataset == 'leaderboard':
+        return ((rank, *row) for rank, row in enumerate(rows, start=1))
+    return rows
+
+
+class _Echo:
+    """
+    "Archivo" que devuelve lo que se le escribe, para usar ``csv.writer`` línea por línea.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_lines(dataset, fmt, chunk_size=2000):
+    """
+    Genera el archivo exportado línea por línea (con encabezado en CSV).
+    """
+    _, columns = DATASETS[dataset]
+    rows = iter_rows(dataset, chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow([_value(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + '\n'
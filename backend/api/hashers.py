@@ -0,0 +1,21 @@
+"""
+Hashers de contraseña con costo configurable desde settings.
+
+Usan el mismo nombre de algoritmo que los de Django, así que los hashes existentes
+siguen siendo válidos. Si el costo configurado cambia, ``must_update`` lo detecta y
+la contraseña se vuelve a hashear con el nuevo costo en el siguiente login.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class ConfigurableScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR or ScryptPasswordHasher.work_factor
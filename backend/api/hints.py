@@ -0,0 +1,92 @@
+"""
+Entrega de pistas por lotes.
+
+Las pistas de cada ubicación vienen ordenadas del paquete de la caché de contenido,
+así que entregar ``k`` pistas solo necesita avanzar ``UserProgress.current_hint``.
+En PostgreSQL ese avance es un único ``UPDATE ... RETURNING`` atómico: solicitudes
+concurrentes reciben rangos distintos y no se lee la fila antes de escribirla. En
+los demás motores (MySQL no tiene ``UPDATE ... RETURNING``; MariaDB y SQLite solo
+en algunas versiones) se bloquea la fila con ``select_for_update`` y se actualiza;
+``HINTS_UPDATE_RETURNING`` fuerza una u otra variante.
+
+``current_hint`` puede quedar hasta ``k - 1`` posiciones por encima de la última
+pista; cualquier valor mayor que la última pista significa que ya no quedan.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from api.models import UserProgress
+
+
+class NoProgress(Exception):
+    """
+    El usuario no tiene progreso en la ubicación (no escaneó el QR).
+    """
+
+
+def _advance_returning(user_id, location_id, count, last_order):
+    table = UserProgress._meta.db_table
+    with connection.cursor() as cursor:
+        # Se limita a una fila porque (user, location) no es único en UserProgress
+        cursor.execute(
+            f'UPDATE "{table}" SET "current_hint" = "current_hint" + %s '
+            f'WHERE "id" = (SELECT "id" FROM "{table}" WHERE "user_id" = %s AND "location_id" = %s ORDER BY "id" LIMIT 1) '
+            f'AND "current_hint" <= %s RETURNING "current_hint"',
+            [count, user_id, location_id, last_order],
+        )
+        row = cursor.fetchone()
+    return row[0] - count if row else None
+
+
+def _advance_locking(user_id, location_id, count, last_order):
+    with transaction.atomic():
+        progress = (
+            UserProgress.objects.select_for_update()
+            .filter(user_id=user_id, location_id=location_id)
+            .order_by('pk')
+            .only('current_hint')
+            .first()
+        )
+        if progress is None or progress.current_hint > last_order:
+            return None
+        UserProgress.objects.filter(pk=progress.pk).update(current_hint=F('current_hint') + count)
+        return progress.current_hint
+
+
+def _use_returning():
+    if settings.HINTS_UPDATE_RETURNING is not None:
+        return settings.HINTS_UPDATE_RETURNING
+    # can_return_columns_from_insert solo habla de INSERT (p. ej. MariaDB lo
+    # tiene en INSERT pero no en UPDATE)
+    return connection.vendor == 'postgresql'
+
+
+def take_hints(user_id, location_id, bundle, count=1):
+    """
+    Entrega hasta ``count`` pistas desde ``current_hint`` y lo avanza de forma atómica.
+
+    Devuelve (pistas [(order, text)], pistas que quedan). Lanza NoProgress si el
+    usuario no escaneó la ubicación.
+    """
+    hints = bundle["hints"] if bundle else []
+    if not hints:
+        if not UserProgress.objects.filter(user_id=user_id, location_id=location_id).exists():
+            raise NoProgress()
+        return [], 0
+
+    last_order = hints[-1][0]
+    if _use_returning():
+        first = _advance_returning(user_id, location_id, count, last_order)
+    else:
+        first = _advance_locking(user_id, location_id, count, last_order)
+
+    if first is None:
+        # No se actualizó nada: o no hay progreso o ya se entregaron todas las pistas
+        if not UserProgress.objects.filter(user_id=user_id, location_id=location_id).exists():
+            raise NoProgress()
+        return [], 0
+
+    taken = [(order, text) for order, text in hints if first <= order < first + count]
+    remaining = sum(1 for order, _ in hints if order >= first + count)
+    return taken, remaining
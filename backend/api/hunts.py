@@ -0,0 +1,171 @@
+"""
+Búsquedas (eventos): la búsqueda activa y el archivo de las terminadas.
+
+Ubicaciones, progreso y ranking llevan la búsqueda a la que pertenecen, y todo
+lo que ven los jugadores (escaneos, ranking, caché del ranking, índice espacial,
+resúmenes) se filtra por la activa. Los índices de esas tablas empiezan por la
+búsqueda, así que las consultas de la activa no recorren las filas de las demás.
+
+``active_id`` guarda en cada proceso el id de la búsqueda activa y solo lo vuelve
+a leer cuando cambia la versión ``HUNTS`` de ``api/versions.py``: normalmente no
+cuesta ninguna consulta. Si la caché de versiones es local del proceso, otro
+proceso no ve ese cambio, así que además se vuelve a leer cada
+``ACTIVE_HUNT_CACHE_TTL`` segundos. ``None`` es el espacio por defecto (filas sin búsqueda).
+
+``archive`` mueve por lotes el progreso, el ranking (con la posición final) y el
+historial de una búsqueda terminada a las tablas ``Archived*``, para que las
+tablas activas no crezcan con cada semestre.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api import versions
+from api.models import (
+    ArchivedLeaderboard, ArchivedParticipation, ArchivedProgress, CustomUser, Hunt, Leaderboard,
+    ParticipationHistory, UserProgress,
+)
+
+_lock = threading.Lock()
+_active = {"version": None, "hunt_id": None, "read_at": 0.0}
+
+
+class HuntError(Exception):
+    pass
+
+
+def _fresh(version):
+    ttl = settings.ACTIVE_HUNT_CACHE_TTL
+    if _active["version"] != version:
+        return False
+    return ttl is None or time.monotonic() - _active["read_at"] < ttl
+
+
+def active_id():
+    """
+    Id de la búsqueda activa (None si no hay ninguna).
+    """
+    version = versions.get(versions.HUNTS)
+    with _lock:
+        if _fresh(version):
+            return _active["hunt_id"]
+    # Siempre desde la base principal: la réplica puede no ver aún el cambio
+    hunt_id = Hunt.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).values_list('pk', flat=True).first()
+    with _lock:
+        _active.update(version=version, hunt_id=hunt_id, read_at=time.monotonic())
+    return hunt_id
+
+
+async def aactive_id():
+    version = await versions.aget(versions.HUNTS)
+    with _lock:
+        if _fresh(version):
+            return _active["hunt_id"]
+    hunt_id = await Hunt.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).values_list('pk', flat=True).afirst()
+    with _lock:
+        _active.update(version=version, hunt_id=hunt_id, read_at=time.monotonic())
+    return hunt_id
+
+
+def changed():
+    """
+    Avisa a todos los procesos que cambió la búsqueda activa (o sus datos).
+    """
+    versions.bump(versions.HUNTS)
+    versions.bump(versions.LEADERBOARD)
+    versions.bump(versions.LOCATIONS)
+
+
+def activate(hunt, batch_size=5000):
+    """
+    Activa ``hunt`` (y termina la que estaba activa). Cada usuario empieza la
+    búsqueda con una fila de ranking en 0. Los resúmenes de jugador se recalculan
+    al leerlos (``summaries.get_summary``), no aquí.
+    """
+    with transaction.atomic():
+        Hunt.objects.filter(is_active=True).exclude(pk=hunt.pk).update(
+            is_active=False, ends_at=Coalesce('ends_at', timezone.now()),
+        )
+        Hunt.objects.filter(pk=hunt.pk).update(is_active=True)
+        users = CustomUser.objects.order_by('pk').values_list('pk', flat=True)
+        Leaderboard.objects.bulk_create(
+            (Leaderboard(user_id=user_id, hunt=hunt) for user_id in users.iterator(chunk_size=batch_size)),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(changed)
+    hunt.is_active = True
+
+
+def _move(queryset, to_archived, batch_size, pause):
+    """
+    Copia las filas de ``queryset`` a la tabla de archivo y las borra de la activa,
+    un lote por transacción. Devuelve cuántas movió.
+    """
+    model = queryset.model
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset[:batch_size])
+            if not rows:
+                return moved
+            to_archived(rows)
+            # _raw_delete: sin señales ni cascadas (nada referencia estas filas)
+            model.objects.filter(pk__in=[row.pk for row in rows])._raw_delete(model.objects.db)
+        moved += len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def archive(hunt, batch_size=None, pause=0):
+    """
+    Mueve el progreso, el ranking y el historial de ``hunt`` a las tablas de archivo.
+    Devuelve {tabla: filas movidas}. La búsqueda activa no se puede archivar.
+    """
+    from api import analytics, ranking
+
+    if hunt.is_active:
+        raise HuntError("No se puede archivar la búsqueda activa.")
+    batch_size = batch_size or settings.HUNT_ARCHIVE_BATCH_SIZE
+    # Las estadísticas por ubicación se calculan desde el historial: antes de sacarlo
+    analytics.aggregate()
+
+    # El ranking sale en orden, así que la posición sigue de un lote al siguiente
+    ranked = {"rank": ArchivedLeaderboard.objects.filter(hunt=hunt).count()}
+
+    def archive_leaderboard(rows):
+        ArchivedLeaderboard.objects.bulk_create([
+            ArchivedLeaderboard(hunt=hunt, user_id=row.user_id, total_points=row.total_points, rank=ranked["rank"] + idx)
+            for idx, row in enumerate(rows, start=1)
+        ])
+        ranked["rank"] += len(rows)
+
+    def archive_progress(rows):
+        ArchivedProgress.objects.bulk_create([
+            ArchivedProgress(
+                hunt=hunt, user_id=row.user_id, location_id=row.location_id, current_hint=row.current_hint,
+                completed=row.completed, points_earned=row.points_earned, completed_at=row.completed_at,
+            )
+            for row in rows
+        ])
+
+    def archive_events(rows):
+        ArchivedParticipation.objects.bulk_create([
+            ArchivedParticipation(
+                hunt=hunt, user_id=row.user_id, location_id=row.location_id,
+                event_type=row.event_type, value=row.value, timestamp=row.timestamp,
+            )
+            for row in rows
+        ])
+
+    moved = {
+        'leaderboard': _move(Leaderboard.objects.filter(hunt=hunt).order_by(*ranking.RANKING_ORDER), archive_leaderboard, batch_size, pause),
+        'progress': _move(UserProgress.objects.filter(hunt=hunt).order_by('pk'), archive_progress, batch_size, pause),
+        'participation': _move(ParticipationHistory.objects.filter(location__hunt=hunt).order_by('pk'), archive_events, batch_size, pause),
+    }
+    Hunt.objects.filter(pk=hunt.pk).update(archived_at=timezone.now())
+    return moved
@@ -0,0 +1,146 @@
+"""
+Medición por solicitud del tiempo total, el tiempo en la base de datos y las
+consultas ejecutadas, agrupada por nombre de URL.
+
+Se activa con ``REQUEST_STATS_ENABLED``. Desactivado, el middleware se retira de
+la cadena al arrancar (``MiddlewareNotUsed``) y no cuesta nada por solicitud.
+Activado, cada respuesta lleva una cabecera ``Server-Timing`` y las estadísticas
+acumuladas se consultan en ``/api/stats/requests/`` (solo staff).
+"""
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from api.query_budget import get_budget
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED = '<sin-ruta>'
+
+
+class QueryRecorder:
+    """
+    ``execute_wrapper`` que cuenta y cronometra las consultas de una solicitud.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()  # (sql, params) -> veces
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            try:
+                self.statements[(sql, repr(params))] += 1
+            except TypeError:
+                self.statements[(sql, None)] += 1
+
+    def duplicates(self):
+        """
+        Consultas idénticas (mismo SQL y parámetros) repetidas: devuelve (extra, [sql...]).
+        """
+        repeated = {statement: times for statement, times in self.statements.items() if times > 1}
+        extra = sum(times - 1 for times in repeated.values())
+        return extra, sorted({sql for sql, _ in repeated})
+
+    def similar(self):
+        """
+        Ejecuciones repetidas del mismo SQL con cualquier parámetro (típico de N+1).
+        """
+        by_sql = Counter()
+        for (sql, _), times in self.statements.items():
+            by_sql[sql] += times
+        return sum(times - 1 for times in by_sql.values() if times > 1)
+
+
+class StatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def add(self, name, wall, db_time, recorder, budget=None):
+        duplicated, duplicated_sql = recorder.duplicates()
+        over_budget = budget is not None and recorder.count > budget
+        with self._lock:
+            entry = self._stats.get(name)
+            if entry is None:
+                entry = self._stats[name] = {
+                    "requests": 0,
+                    "wall_ms_total": 0.0,
+                    "wall_ms_max": 0.0,
+                    "db_ms_total": 0.0,
+                    "queries_total": 0,
+                    "queries_max": 0,
+                    "duplicated_queries_total": 0,
+                    "similar_queries_total": 0,
+                    "over_budget": 0,
+                    "duplicated_sql": [],
+                }
+            entry["requests"] += 1
+            entry["wall_ms_total"] += wall * 1000
+            entry["wall_ms_max"] = max(entry["wall_ms_max"], wall * 1000)
+            entry["db_ms_total"] += db_time * 1000
+            entry["queries_total"] += recorder.count
+            entry["queries_max"] = max(entry["queries_max"], recorder.count)
+            entry["duplicated_queries_total"] += duplicated
+            entry["similar_queries_total"] += recorder.similar()
+            entry["over_budget"] += int(over_budget)
+            if duplicated_sql:
+                # Solo los ejemplos más recientes, para no crecer sin límite
+                entry["duplicated_sql"] = duplicated_sql[:settings.REQUEST_STATS_MAX_SQL_SAMPLES]
+
+    def snapshot(self):
+        with self._lock:
+            stats = {name: dict(entry) for name, entry in self._stats.items()}
+        for entry in stats.values():
+            requests = entry["requests"]
+            entry["wall_ms_avg"] = round(entry["wall_ms_total"] / requests, 3)
+            entry["db_ms_avg"] = round(entry["db_ms_total"] / requests, 3)
+            entry["queries_avg"] = round(entry["queries_total"] / requests, 2)
+            for key in ("wall_ms_total", "wall_ms_max", "db_ms_total"):
+                entry[key] = round(entry[key], 3)
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+registry = StatsRegistry()
+
+
+class QueryStatsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_STATS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.view_name if match else None) or UNRESOLVED
+        budget = get_budget(match.func) if match else None
+        registry.add(name, wall, recorder.duration, recorder, budget)
+        if budget is not None and recorder.count > budget:
+            logger.warning("%s ejecutó %s consultas (presupuesto: %s)", name, recorder.count, budget)
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} consultas", '
+            f'total;dur={wall * 1000:.2f}'
+        )
+        return response
@@ -0,0 +1,111 @@
+"""
+Ranking en vivo por Server-Sent Events.
+
+Cada conexión al stream se suscribe con una cola ``asyncio.Queue`` propia. Cuando
+cambian los puntos de un usuario se calcula una sola vez el mensaje delta (su nueva
+posición y la anterior) y se copia a la cola de cada suscriptor, así que una
+actualización cuesta O(suscriptores) escrituras en memoria y ninguna consulta por
+suscriptor.
+
+Los suscriptores viven en el proceso ASGI que atiende el stream: solo reciben los
+cambios que se confirman en ese mismo proceso.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+
+from api import versions
+from api.models import CustomUser
+from api.rank_cache import rank_cache
+from api.ranking import serialize_entry
+
+# Marca que se encola cuando un suscriptor debe recibir un snapshot completo
+RESYNC = None
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _deliver(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # El cliente va atrasado: se descartan sus mensajes y recibirá un snapshot nuevo
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+class Broadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # cola -> event loop que la consume
+
+    def subscribe(self):
+        """
+        Crea la cola de un suscriptor. Se llama desde el event loop que la va a leer.
+        """
+        queue = asyncio.Queue(maxsize=settings.LIVE_RANKING_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, message):
+        """
+        Entrega el mensaje a todos los suscriptores. Se puede llamar desde cualquier hilo.
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_deliver, queue, message)
+            except RuntimeError:
+                # El event loop ya se cerró
+                self.unsubscribe(queue)
+
+
+broadcaster = Broadcaster()
+
+
+def score_changed(user_id, points):
+    """
+    Registra el nuevo total de un usuario (``None`` si se eliminó) en la caché del
+    ranking y publica el delta a los suscriptores del stream.
+    """
+    versions.bump(versions.LEADERBOARD)
+    if not len(broadcaster):
+        rank_cache.update(user_id, points)
+        return
+
+    if not settings.RANKING_CACHE_ENABLED:
+        # Sin la caché no conocemos la posición anterior: que los clientes pidan un snapshot
+        broadcaster.publish(RESYNC)
+        return
+
+    previous = rank_cache.rank_of(user_id)
+    rank_cache.update(user_id, points)
+    if points is None:
+        # Eliminaciones (usuarios borrados) son raras: se reenvía el snapshot
+        broadcaster.publish(RESYNC)
+        return
+
+    user = CustomUser.objects.only('first_name', 'last_name', 'email').filter(pk=user_id).first()
+    standing = rank_cache.rank_of(user_id)
+    if user is None or standing is None:
+        return
+    rank, points = standing
+    if previous == standing:
+        return
+    previous_rank = previous[0] if previous else None
+    broadcaster.publish(format_event('delta', dict(serialize_entry(user, points, rank), previous_rank=previous_rank)))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import analytics
+
+
+class Command(BaseCommand):
+    help = "Suma a las estadísticas por ubicación los eventos de participación nuevos desde la última ejecución."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Eventos por bloque.")
+        parser.add_argument('--rebuild', action='store_true', help="Borra las estadísticas y procesa todo el historial.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['rebuild']:
+            processed = analytics.rebuild(options['batch_size'])
+        else:
+            processed = analytics.aggregate(options['batch_size'])
+        self.stdout.write(f"Eventos procesados: {processed} en {time.perf_counter() - start:.3f}s.")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import hunts
+from api.models import Hunt
+
+
+class Command(BaseCommand):
+    help = "Mueve el progreso, el ranking y el historial de las búsquedas terminadas a las tablas de archivo."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hunt', type=int, action='append', dest='hunt_ids', help="Id de la búsqueda (se puede repetir). Por defecto, todas las terminadas sin archivar.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Filas por lote (HUNT_ARCHIVE_BATCH_SIZE por defecto).")
+        parser.add_argument('--sleep', type=float, default=0, help="Segundos de pausa entre lotes.")
+
+    def handle(self, *args, **options):
+        if options['hunt_ids']:
+            queryset = Hunt.objects.filter(pk__in=options['hunt_ids'])
+        else:
+            queryset = Hunt.objects.filter(is_active=False, archived_at__isnull=True, ends_at__lte=timezone.now())
+
+        for hunt in queryset.order_by('pk'):
+            try:
+                moved = hunts.archive(hunt, batch_size=options['batch_size'], pause=options['sleep'])
+            except hunts.HuntError as e:
+                raise CommandError(f"{hunt.name}: {e}")
+            summary = ", ".join(f"{table}: {count}" for table, count in moved.items())
+            self.stdout.write(f"{hunt.name} archivada ({summary}).")
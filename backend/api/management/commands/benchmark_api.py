@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea una base de datos de prueba, la llena con datos de ejemplo y mide latencia "
+        "(p50/p95/p99), solicitudes por segundo y consultas por solicitud de cada endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Jugadores a crear (un recorrido por jugador).")
+        parser.add_argument('--locations', type=int, default=20, help="Ubicaciones con desafío y pistas.")
+        parser.add_argument('--visits', type=int, default=3, help="Ubicaciones que visita cada jugador.")
+        parser.add_argument('--workers', type=int, default=4, help="Hilos que ejecutan recorridos en paralelo.")
+        parser.add_argument('--seed', type=int, default=1, help="Semilla para que los recorridos sean reproducibles.")
+        parser.add_argument('--output', help="Archivo JSON donde guardar los resultados.")
+        parser.add_argument('--compare', help="Resultado JSON anterior contra el cual comparar.")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as stream:
+                    previous = json.load(stream)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"No se pudo leer {options['compare']}: {exc}")
+
+        old_config = benchmark.create_test_database(verbosity=options['verbosity'] - 1)
+        try:
+            results = benchmark.run(
+                options['users'],
+                options['locations'],
+                visits=options['visits'],
+                workers=options['workers'],
+                seed_value=options['seed'],
+            )
+        finally:
+            benchmark.destroy_test_database(old_config, verbosity=options['verbosity'] - 1)
+
+        self.stdout.write(f"{'endpoint':<22}{'sol.':>7}{'err.':>6}{'sol/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'consultas':>11}")
+        for name, row in results["endpoints"].items():
+            self.stdout.write(
+                f"{name:<22}{row['requests']:>7}{row['errors']:>6}{row['rps']:>9.1f}"
+                f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}{row['queries_per_request']:>11.2f}"
+            )
+        total = results["total"]
+        self.stdout.write(f"Total: {total['requests']} solicitudes, {total['errors']} errores, {total['rps']:.1f} sol/s")
+
+        if previous is not None:
+            for line in benchmark.compare(previous, results):
+                self.stdout.write(line)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(results, stream, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
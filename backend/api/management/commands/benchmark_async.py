@@ -0,0 +1,71 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import benchmark, events, qr_tokens
+from api.models import Challenge, CustomUser, Location
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea una base de datos de prueba y compara solicitudes por segundo entre los "
+        "endpoints síncronos (/api/) y asíncronos (/api/v2/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Solicitudes por endpoint y versión.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Solicitudes simultáneas.")
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        # Base de datos de prueba, como benchmark_api: los datos de la medición no tocan la real
+        old_config = benchmark.create_test_database(verbosity=options['verbosity'] - 1)
+        try:
+            user = CustomUser.objects.create_user("bench@example.com", "Bench", "Async")
+            location = Location.objects.create(name="Benchmark", qr_code="bench")
+            Challenge.objects.create(location=location, question="¿Benchmark?", correct_answer="Sí", options=["Sí", "No"])
+            headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+            token = qr_tokens.issue(user, location.id)
+
+            for name, path in (('leaderboard', 'leaderboard/'), ('get_challenge', f'get_challenge/{token}/')):
+                sync_rps = self._run_sync(f'/api/{path}', headers, total, concurrency)
+                async_rps = asyncio.run(self._run_async(f'/api/v2/{path}', headers, total, concurrency))
+                self.stdout.write(
+                    f"{name:>14}: síncrono {sync_rps:,.0f} sol/s, asíncrono {async_rps:,.0f} sol/s "
+                    f"(concurrencia {concurrency})"
+                )
+        finally:
+            # Los eventos del buffer se escriben antes de borrar la base de prueba
+            events.event_buffer.flush()
+            benchmark.destroy_test_database(old_config, verbosity=options['verbosity'] - 1)
+
+    def _run_sync(self, url, headers, total, concurrency):
+        def call(_):
+            response = Client().get(url, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} respondió {response.status_code}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(call, range(total)))
+        return total / (time.perf_counter() - start)
+
+    async def _run_async(self, url, headers, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call():
+            async with semaphore:
+                response = await client.get(url, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} respondió {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(total)))
+        return total / (time.perf_counter() - start)
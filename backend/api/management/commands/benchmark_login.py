@@ -0,0 +1,98 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher, get_hasher
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from api import benchmark
+from api.models import CustomUser
+
+PBKDF2 = 'api.hashers.ConfigurablePBKDF2PasswordHasher'
+SCRYPT = 'api.hashers.ConfigurableScryptPasswordHasher'
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea una base de datos de prueba y mide logins por segundo (por núcleo y en total) "
+        "con cada hasher de PASSWORD_HASHERS y distintos costos de PBKDF2 y scrypt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help="Logins por medición.")
+        parser.add_argument(
+            '--iterations', type=int, nargs='+',
+            default=[PBKDF2PasswordHasher.iterations, 600000, 310000],
+            help="Iteraciones de PBKDF2 a comparar.",
+        )
+        parser.add_argument(
+            '--work-factors', type=int, nargs='+',
+            default=[ScryptPasswordHasher.work_factor, 2 ** 15],
+            help="Factores de trabajo (N) de scrypt a comparar.",
+        )
+
+    def _costs(self, hasher, options):
+        """
+        Devuelve [(descripción del costo, settings a sobrescribir)] para el hasher.
+        """
+        if hasher == PBKDF2:
+            return [(f"{n:,} iteraciones", {'PASSWORD_PBKDF2_ITERATIONS': n}) for n in options['iterations']]
+        if hasher == SCRYPT:
+            return [(f"N={n:,}", {'PASSWORD_SCRYPT_WORK_FACTOR': n}) for n in options['work_factors']]
+        return [("costo predeterminado", {})]
+
+    def handle(self, *args, **options):
+        total = options['logins']
+        cores = os.cpu_count() or 1
+        hashers = list(settings.PASSWORD_HASHERS)
+
+        # Base de datos de prueba, como benchmark_api: el usuario de la medición no toca la real
+        old_config = benchmark.create_test_database(verbosity=options['verbosity'] - 1)
+        try:
+            email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+            password = uuid.uuid4().hex
+            CustomUser.objects.create_user(email, "Bench", "Login", password)
+            body = {"email": email, "password": password}
+
+            self.stdout.write(
+                f"{cores} núcleo(s), {settings.PASSWORD_HASH_WORKERS} hilo(s) de hash, "
+                f"sesión al iniciar: {settings.LOGIN_CREATE_SESSION}"
+            )
+            for hasher in hashers:
+                # El hasher medido es el preferido; los demás siguen validando el hash anterior
+                preferred = [hasher] + [other for other in hashers if other != hasher]
+                for cost, overrides in self._costs(hasher, options):
+                    with override_settings(PASSWORD_HASHERS=preferred, **overrides):
+                        sequential, concurrent = self._measure(body, total, cores)
+                        algorithm = get_hasher('default').algorithm
+                    self.stdout.write(
+                        f"{algorithm:<14} {cost:>22}: {sequential:7.1f} logins/s en un hilo, "
+                        f"{concurrent:7.1f} logins/s concurrentes ({concurrent / cores:.1f} por núcleo)"
+                    )
+        finally:
+            benchmark.destroy_test_database(old_config, verbosity=options['verbosity'] - 1)
+
+    def _measure(self, body, total, cores):
+        client = Client()
+        # El primer login vuelve a hashear la contraseña con el hasher y el costo medidos
+        response = client.post('/api/login/', body, content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f"El login respondió {response.status_code}")
+
+        start = time.perf_counter()
+        for _ in range(total):
+            client.post('/api/login/', body, content_type='application/json')
+        sequential = total / (time.perf_counter() - start)
+
+        def login(_):
+            Client().post('/api/login/', body, content_type='application/json')
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=cores * 4) as pool:
+            list(pool.map(login, range(total)))
+        concurrent = total / (time.perf_counter() - start)
+        return sequential, concurrent
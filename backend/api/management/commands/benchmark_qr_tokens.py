@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api import benchmark, qr_tokens
+from api.models import CustomUser, Location
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea una base de datos de prueba y compara el costo de emitir y verificar "
+        "tokens de QR en los modos 'database' y 'signed'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help="Tokens a emitir y verificar por modo.")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Base de datos de prueba, como benchmark_api: no lee ni escribe datos reales
+        old_config = benchmark.create_test_database(verbosity=options['verbosity'] - 1)
+        try:
+            user = CustomUser.objects.create_user("bench@example.com", "Bench", "QR")
+            location = Location.objects.create(name="Benchmark", qr_code="bench")
+            for mode in ('database', 'signed'):
+                self._measure(mode, user, location, iterations)
+        finally:
+            benchmark.destroy_test_database(old_config, verbosity=options['verbosity'] - 1)
+
+    def _measure(self, mode, user, location, iterations):
+        # Cada modo empieza con la tabla de tokens vacía: la transacción se revierte al final
+        with transaction.atomic(), override_settings(QR_TOKEN_MODE=mode):
+            with CaptureQueriesContext(connection) as issue_queries:
+                start = time.perf_counter()
+                tokens = [qr_tokens.issue(user, location.id) for _ in range(iterations)]
+                issue_elapsed = time.perf_counter() - start
+
+            with CaptureQueriesContext(connection) as resolve_queries:
+                start = time.perf_counter()
+                for token in tokens:
+                    qr_tokens.resolve(token, user)
+                resolve_elapsed = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{mode:>8}: emitir {iterations / issue_elapsed:,.0f} tokens/s "
+            f"({len(issue_queries) / iterations:.1f} consultas c/u), "
+            f"verificar {iterations / resolve_elapsed:,.0f} tokens/s "
+            f"({len(resolve_queries) / iterations:.1f} consultas c/u)"
+        )
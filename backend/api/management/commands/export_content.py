@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api import content_io
+
+
+class Command(BaseCommand):
+    help = "Exporta las ubicaciones con su desafío y pistas a JSON Lines o CSV (mismo formato que import_content)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Archivo de salida ('-' para la salida estándar).")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None, help="Por defecto según la extensión.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Ubicaciones leídas por consulta.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = content_io.detect_format(path, options['format'])
+        records = content_io.iter_records(chunk_size=options['chunk_size'])
+
+        if path == '-':
+            content_io.write_records(records, sys.stdout, fmt)
+            return
+
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            count = content_io.write_records(records, stream, fmt)
+        self.stdout.write(self.style.SUCCESS(f"Exportadas {count} ubicaciones a {path}."))
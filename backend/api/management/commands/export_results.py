@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api import content_io, exports
+
+
+class Command(BaseCommand):
+    help = "Exporta el historial de participación, el progreso o el ranking final a CSV o JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(exports.DATASETS), help="Datos a exportar.")
+        parser.add_argument('path', nargs='?', default='-', help="Archivo de salida ('-' para la salida estándar).")
+        parser.add_argument('--format', choices=list(exports.FORMATS), default=None, help="Por defecto según la extensión.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Filas leídas por bloque.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = content_io.detect_format(path, options['format'])
+        lines = exports.iter_lines(options['dataset'], fmt, chunk_size=options['chunk_size'])
+
+        if path == '-':
+            sys.stdout.writelines(lines)
+            return
+
+        count = -1 if fmt == 'csv' else 0  # Sin contar el encabezado
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            for line in lines:
+                stream.write(line)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Exportadas {count} filas a {path}."))
@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from api import content_io
+
+
+class Command(BaseCommand):
+    help = "Importa ubicaciones con su desafío y pistas desde un archivo JSON Lines o CSV (inserta o actualiza)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Archivo a importar ('-' para leer de la entrada estándar).")
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default=None, help="Por defecto según la extensión.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Ubicaciones por bloque de escritura.")
+        parser.add_argument(
+            '--replace-hints',
+            action='store_true',
+            help="Elimina las pistas existentes de cada ubicación importada antes de insertar las del archivo.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = content_io.detect_format(path, options['format'])
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+
+        start = time.perf_counter()
+        try:
+            with stream:
+                locations, challenges, hints = content_io.import_records(
+                    content_io.read_records(stream, fmt),
+                    chunk_size=options['chunk_size'],
+                    replace_hints=options['replace_hints'],
+                )
+        except content_io.ContentError as exc:
+            raise CommandError(f"No se importó nada. {exc}")
+        except IntegrityError as exc:
+            raise CommandError(f"No se importó nada. Conflicto con datos existentes: {exc}")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Importadas {locations} ubicaciones, {challenges} desafíos y {hints} pistas en {elapsed:.2f}s."
+        ))
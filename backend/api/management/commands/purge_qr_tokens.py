@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import token_maintenance
+
+
+class Command(BaseCommand):
+    help = "Elimina los tokens de QR expirados por lotes y mantiene las particiones diarias (PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Filas por lote (QR_TOKEN_SWEEP_BATCH_SIZE por defecto).")
+        parser.add_argument('--sleep', type=float, default=0, help="Segundos de pausa entre lotes.")
+        parser.add_argument('--max-batches', type=int, default=None, help="Detenerse después de este número de lotes.")
+        parser.add_argument(
+            '--convert-partitions',
+            action='store_true',
+            help="Convierte la tabla en una tabla particionada por día de expires_at (operación única).",
+        )
+        parser.add_argument('--days-ahead', type=int, default=None, help="Días de particiones a crear por adelantado.")
+
+    def handle(self, *args, **options):
+        try:
+            if options['convert_partitions']:
+                if token_maintenance.convert_to_partitioned(options['days_ahead']):
+                    self.stdout.write(self.style.SUCCESS("Tabla de tokens convertida a particiones diarias."))
+                else:
+                    self.stdout.write("La tabla de tokens ya está particionada.")
+
+            if token_maintenance.is_partitioned():
+                token_maintenance.ensure_partitions(options['days_ahead'])
+                dropped = token_maintenance.drop_expired_partitions()
+                self.stdout.write(f"Particiones eliminadas: {len(dropped)} {dropped if dropped else ''}".rstrip())
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        deleted, elapsed = token_maintenance.sweep_expired(
+            batch_size=options['batch_size'],
+            pause=options['sleep'],
+            max_batches=options['max_batches'],
+        )
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(f"Tokens expirados eliminados: {deleted} en {elapsed:.3f}s ({rate:,.0f} filas/s).")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api import refresh_tokens
+
+
+class Command(BaseCommand):
+    help = "Elimina por lotes los refresh tokens revocados que ya expiraron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Filas por lote (QR_TOKEN_SWEEP_BATCH_SIZE por defecto).")
+        parser.add_argument('--sleep', type=float, default=0, help="Segundos de pausa entre lotes.")
+        parser.add_argument('--max-batches', type=int, default=None, help="Detenerse después de este número de lotes.")
+
+    def handle(self, *args, **options):
+        deleted, elapsed = refresh_tokens.purge_expired(
+            batch_size=options['batch_size'],
+            pause=options['sleep'],
+            max_batches=options['max_batches'],
+        )
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(f"Refresh tokens revocados eliminados: {deleted} en {elapsed:.3f}s ({rate:,.0f} filas/s).")
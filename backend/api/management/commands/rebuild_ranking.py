@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rank_cache import rank_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Pide a los procesos servidor que reconstruyan la caché del ranking desde la tabla "
+        "Leaderboard en su próxima lectura. La consistencia de cada proceso se revisa con "
+        "GET /api/stats/ranking/ (staff)."
+    )
+
+    def handle(self, *args, **options):
+        # La caché del ranking vive en los procesos servidor, no en este: solo se les
+        # puede avisar a través de una caché compartida
+        if not settings.CACHES_COHERENT:
+            raise CommandError(
+                "Sin REDIS_URL cada proceso servidor tiene su propia caché y no recibe el aviso; "
+                "se reconstruyen solos cada RANKING_CACHE_REBUILD_INTERVAL "
+                f"({settings.RANKING_CACHE_REBUILD_INTERVAL}) segundos o al reiniciarlos."
+            )
+
+        generation = rank_cache.request_rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconstrucción del ranking solicitada (generación {generation}): "
+            "cada proceso la hará en su próxima lectura."
+        ))
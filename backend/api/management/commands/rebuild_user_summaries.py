@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import summaries
+
+
+class Command(BaseCommand):
+    help = "Recalcula en bloque los resúmenes de jugador (UserSummary) desde el ranking, el progreso y el historial."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Usuarios por bloque.")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = summaries.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{written} resúmenes recalculados en {time.perf_counter() - start:.2f}s."
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_challenge_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['-total_points', 'user'], name='leaderboard_rank_idx'),
+        ),
+    ]
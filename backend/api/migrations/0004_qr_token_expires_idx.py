@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_leaderboard_rank_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='qraccesstoken',
+            index=models.Index(fields=['expires_at'], name='qr_token_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 13:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_qr_token_expires_idx'),
+    ]
+
+    operations = [
+        # Hasta ahora solo se registraban completaciones ('Completó el desafío'),
+        # así que las filas existentes se marcan con el tipo COMPLETION (5).
+        migrations.AddField(
+            model_name='participationhistory',
+            name='event_type',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Escaneó el QR'), (2, 'Vio el desafío'), (3, 'Intentó responder'), (4, 'Pidió una pista'), (5, 'Completó el desafío')], default=5),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='participationhistory',
+            name='value',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RemoveField(
+            model_name='participationhistory',
+            name='action',
+        ),
+        migrations.AlterField(
+            model_name='participationhistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
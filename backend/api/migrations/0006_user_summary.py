@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_participation_event_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_points', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('rank_snapshot', models.PositiveIntegerField(blank=True, null=True)),
+                ('current_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.location')),
+            ],
+        ),
+    ]
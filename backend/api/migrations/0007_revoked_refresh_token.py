@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_user_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedRefreshToken',
+            fields=[
+                ('jti', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='revoked_token_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_revoked_refresh_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCursor',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LocationStats',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.location')),
+                ('scans', models.PositiveIntegerField(default=0)),
+                ('challenge_views', models.PositiveIntegerField(default=0)),
+                ('answer_attempts', models.PositiveIntegerField(default=0)),
+                ('correct_answers', models.PositiveIntegerField(default=0)),
+                ('hints_taken', models.PositiveIntegerField(default=0)),
+                ('completions', models.PositiveIntegerField(default=0)),
+                ('points_total', models.PositiveIntegerField(default=0)),
+                ('points_histogram', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
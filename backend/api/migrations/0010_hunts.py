@@ -0,0 +1,134 @@
+# Generated by Django 5.1.3 on 2026-10-18 16:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_location_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLeaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('total_points', models.PositiveIntegerField()),
+                ('rank', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedParticipation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('location_id', models.BigIntegerField()),
+                ('event_type', models.PositiveSmallIntegerField(choices=[(1, 'Escaneó el QR'), (2, 'Vio el desafío'), (3, 'Intentó responder'), (4, 'Pidió una pista'), (5, 'Completó el desafío')])),
+                ('value', models.IntegerField(blank=True, null=True)),
+                ('timestamp', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('location_id', models.BigIntegerField()),
+                ('current_hint', models.PositiveIntegerField()),
+                ('completed', models.BooleanField()),
+                ('points_earned', models.PositiveIntegerField()),
+                ('completed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Hunt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('starts_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='leaderboard',
+            name='leaderboard_rank_idx',
+        ),
+        migrations.AlterField(
+            model_name='leaderboard',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='hunt',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('is_active',), name='hunt_single_active'),
+        ),
+        migrations.AddField(
+            model_name='archivedprogress',
+            name='hunt',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+        migrations.AddField(
+            model_name='archivedparticipation',
+            name='hunt',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+        migrations.AddField(
+            model_name='archivedleaderboard',
+            name='hunt',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+        migrations.AddField(
+            model_name='leaderboard',
+            name='hunt',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='hunt',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='locations', to='api.hunt'),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='hunt',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboard',
+            index=models.Index(fields=['hunt', '-total_points', 'user'], name='leaderboard_hunt_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['hunt', 'name'], name='location_hunt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['hunt', 'user', 'location'], name='progress_hunt_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(fields=('hunt', 'user'), name='leaderboard_hunt_user_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboard',
+            constraint=models.UniqueConstraint(condition=models.Q(('hunt__isnull', True)), fields=('user',), name='leaderboard_default_user_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedprogress',
+            index=models.Index(fields=['hunt', 'user_id'], name='archived_progress_hunt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedparticipation',
+            index=models.Index(fields=['hunt', 'timestamp'], name='archived_event_hunt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedleaderboard',
+            index=models.Index(fields=['hunt', 'rank'], name='archived_lb_hunt_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_hunts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='location',
+            name='location_hunt_idx',
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='qr_code',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('hunt', 'qr_code'), name='location_hunt_qr_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('hunt', 'name'), name='location_hunt_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(condition=models.Q(('hunt__isnull', True)), fields=('qr_code',), name='location_default_qr_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(condition=models.Q(('hunt__isnull', True)), fields=('name',), name='location_default_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_location_unique_per_hunt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersummary',
+            name='hunt',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.hunt'),
+        ),
+    ]
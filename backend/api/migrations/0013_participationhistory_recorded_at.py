@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_user_summary_hunt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participationhistory',
+            name='recorded_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -2,7 +2,6 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 import uuid
-from datetime import timedelta
 from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
@@ -37,12 +36,47 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+# Modelo Hunt: una búsqueda (evento, p. ej. la de un semestre). Agrupa ubicaciones,
+# progreso y ranking; solo una está activa y es la que ven los jugadores. Las
+# filas sin búsqueda forman el espacio por defecto, el que se usa si no hay
+# ninguna activa. Ver api/hunts.py y el comando archive_hunts.
+class Hunt(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    is_active = models.BooleanField(default=False)
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    # Cuándo se movieron su progreso, ranking e historial a las tablas de archivo
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['is_active'], condition=models.Q(is_active=True), name='hunt_single_active'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 # Modelo Location
 class Location(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
-    qr_code = models.CharField(max_length=100, unique=True)
+    qr_code = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Coordenadas opcionales (grados WGS84) para el índice espacial de api/spatial.py
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, null=True, blank=True, related_name='locations', db_index=False)
+
+    class Meta:
+        # Nombre y código QR únicos dentro de cada búsqueda, así se pueden reutilizar
+        # los mismos QR impresos de un semestre a otro. Los NULL no chocan entre sí en
+        # un índice único: el espacio por defecto lleva sus propias restricciones.
+        constraints = [
+            models.UniqueConstraint(fields=['hunt', 'qr_code'], name='location_hunt_qr_uniq'),
+            models.UniqueConstraint(fields=['hunt', 'name'], name='location_hunt_name_uniq'),
+            models.UniqueConstraint(fields=['qr_code'], condition=models.Q(hunt__isnull=True), name='location_default_qr_uniq'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(hunt__isnull=True), name='location_default_name_uniq'),
+        ]
 
     def __str__(self):
         return self.name
@@ -79,31 +113,161 @@ class UserProgress(models.Model):
     points_earned = models.PositiveIntegerField(default=0)
     last_scanned_qr = models.ForeignKey(Location, related_name="user_last_scanned_qr", on_delete=models.SET_NULL, null=True)
     completed_at = models.DateTimeField(auto_now_add=True)
+    # La búsqueda de la ubicación, copiada para filtrar sin unir con Location
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, null=True, blank=True, related_name='+', db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hunt', 'user', 'location'], name='progress_hunt_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.location.name}"
 
 # Modelo Leaderboard
+# Una fila por usuario y búsqueda
 class Leaderboard(models.Model):
-    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, null=True, blank=True, related_name='+', db_index=False)
     total_points = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hunt', 'user'], name='leaderboard_hunt_user_uniq'),
+            # NULL no choca con NULL en una restricción única: el espacio por defecto necesita la suya
+            models.UniqueConstraint(fields=['user'], condition=models.Q(hunt__isnull=True), name='leaderboard_default_user_uniq'),
+        ]
+        indexes = [
+            # Soporta el orden del ranking de cada búsqueda y la paginación por cursor
+            models.Index(fields=['hunt', '-total_points', 'user'], name='leaderboard_hunt_rank_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email}: {self.total_points} pts"
 
+# Modelo UserSummary: resumen desnormalizado del jugador para leer el perfil con
+# una sola consulta por clave primaria. Lo mantiene api/scoring.py (y el escaneo)
+# y se puede recalcular con el comando rebuild_user_summaries. Es el de una búsqueda:
+# si no es la activa, api/summaries.py lo recalcula al leerlo.
+class UserSummary(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_points = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    # Última ubicación escaneada
+    current_location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity = models.DateTimeField(null=True, blank=True)
+    # Posición en el ranking la última vez que el usuario sumó puntos o se recalculó el resumen
+    rank_snapshot = models.PositiveIntegerField(null=True, blank=True)
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, null=True, blank=True, related_name='+', db_index=False)
+
+    def __str__(self):
+        return f"Resumen de {self.user_id}: {self.total_points} pts, {self.completed_count} completadas"
+
 # Modelo ParticipationHistory
 class ParticipationHistory(models.Model):
+    class EventType(models.IntegerChoices):
+        SCAN = 1, 'Escaneó el QR'
+        CHALLENGE_VIEW = 2, 'Vio el desafío'
+        ANSWER_ATTEMPT = 3, 'Intentó responder'
+        HINT_TAKEN = 4, 'Pidió una pista'
+        COMPLETION = 5, 'Completó el desafío'
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     location = models.ForeignKey(Location, on_delete=models.CASCADE)
-    action = models.CharField(max_length=50)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    event_type = models.PositiveSmallIntegerField(choices=EventType.choices)
+    # Dato del evento: puntos ganados, número de pista o 1/0 si la respuesta fue correcta
+    value = models.IntegerField(null=True, blank=True)
+    # Hora en que ocurrió el evento (no la de escritura, que se hace por lotes)
+    timestamp = models.DateTimeField(default=timezone.now)
+    # Hora de escritura en la BD; api/analytics.py espera a que pase ANALYTICS_SAFETY_LAG
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.email} - {self.get_event_type_display()} at {self.timestamp}"
+
+# Estadísticas por ubicación, acumuladas de forma incremental desde
+# ParticipationHistory por api/analytics.py (comando aggregate_location_stats).
+class LocationStats(models.Model):
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    scans = models.PositiveIntegerField(default=0)
+    challenge_views = models.PositiveIntegerField(default=0)
+    answer_attempts = models.PositiveIntegerField(default=0)
+    correct_answers = models.PositiveIntegerField(default=0)
+    hints_taken = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+    points_total = models.PositiveIntegerField(default=0)
+    # Distribución de points_earned: {"puntos": completaciones}
+    points_histogram = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Estadísticas de {self.location_id}: {self.scans} escaneos, {self.completions} completaciones"
+
+
+# Último ParticipationHistory.id procesado por cada agregación incremental
+class AnalyticsCursor(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_event_id}"
+
+# Tablas de archivo ("frías"): filas de búsquedas terminadas que el comando
+# archive_hunts saca de UserProgress, Leaderboard y ParticipationHistory. Guardan
+# los ids sin claves foráneas para no frenar las escrituras ni los borrados.
+class ArchivedLeaderboard(models.Model):
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, related_name='+', db_index=False)
+    user_id = models.BigIntegerField()
+    total_points = models.PositiveIntegerField()
+    # Posición final en el ranking de la búsqueda
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hunt', 'rank'], name='archived_lb_hunt_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hunt_id} #{self.rank}: {self.user_id} ({self.total_points} pts)"
+
+
+class ArchivedProgress(models.Model):
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, related_name='+', db_index=False)
+    user_id = models.BigIntegerField()
+    location_id = models.BigIntegerField()
+    current_hint = models.PositiveIntegerField()
+    completed = models.BooleanField()
+    points_earned = models.PositiveIntegerField()
+    completed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hunt', 'user_id'], name='archived_progress_hunt_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hunt_id}: {self.user_id} - {self.location_id}"
+
+
+class ArchivedParticipation(models.Model):
+    hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, related_name='+', db_index=False)
+    user_id = models.BigIntegerField()
+    location_id = models.BigIntegerField()
+    event_type = models.PositiveSmallIntegerField(choices=ParticipationHistory.EventType.choices)
+    value = models.IntegerField(null=True, blank=True)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hunt', 'timestamp'], name='archived_event_hunt_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.action} at {self.timestamp}"
+        return f"{self.hunt_id}: {self.user_id} - {self.event_type} at {self.timestamp}"
 
 # Modelo QRAccessToken
 def get_expiration_time():
-    return timezone.now() + timedelta(minutes=15)
+    return timezone.now() + settings.QR_TOKEN_LIFETIME
 
 class QRAccessToken(models.Model):
     token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
@@ -112,8 +276,31 @@ class QRAccessToken(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=get_expiration_time)
 
+    class Meta:
+        indexes = [
+            # Permite borrar por lotes los tokens expirados sin recorrer la tabla
+            models.Index(fields=['expires_at'], name='qr_token_expires_idx'),
+        ]
+
     def is_valid(self):
         return timezone.now() < self.expires_at
 
     def __str__(self):
         return f"Token for {self.user.email} - {self.location.name}, Expires at: {self.expires_at}"
+
+
+class RevokedRefreshToken(models.Model):
+    """
+    Refresh token JWT ya usado (rotado). Solo se guardan los revocados y hasta que
+    expiran; después ``purge_revoked_tokens`` los borra.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='revoked_token_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.jti} (expira: {self.expires_at})"
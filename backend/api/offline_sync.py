@@ -0,0 +1,226 @@
+"""
+Sincronización por lotes de acciones hechas sin conexión (escaneos, respuestas y pistas).
+
+El cliente envía sus acciones en el orden en que ocurrieron, cada una con su
+hora local. Se aplican en una sola transacción con lecturas en bloque: los
+paquetes de contenido de todos los QR (``content_cache.get_bundles_by_qr``) y
+las filas de ``UserProgress`` del usuario en esas ubicaciones, bloqueadas con
+``select_for_update``. El progreso se avanza en memoria y se escribe al final
+con un ``bulk_create`` y un ``bulk_update``, así que el número de consultas no
+depende de cuántos escaneos o pistas traiga el lote; solo las respuestas
+correctas pasan por ``scoring.award_completion``, que suma los puntos con el
+candado del ranking. Si el lote trae respuestas, ese candado se toma antes que
+las filas de progreso, en el mismo orden que ``award_completion``.
+
+Cada acción recibe su propio resultado: una acción inválida (QR desconocido,
+respuesta sin escaneo previo, etc.) no impide aplicar las demás. Los eventos se
+registran con la hora del cliente, que se limita a ``[ahora - OFFLINE_SYNC_MAX_AGE, ahora]``;
+la hora de completación la pone el servidor.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api import content_cache, events, hunts, scoring, summaries
+from api.models import Leaderboard, UserProgress
+
+SCAN = 'scan'
+ANSWER = 'answer'
+HINT = 'hint'
+ACTION_TYPES = (SCAN, ANSWER, HINT)
+
+
+class SyncError(ValueError):
+    """
+    El lote completo es inválido (no es una lista, está vacío o es demasiado grande).
+    """
+
+
+class ActionError(Exception):
+    """
+    Una acción del lote no se puede aplicar; el mensaje va en su resultado.
+    """
+
+
+def _timestamp(value, now):
+    if not value:
+        return now
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        # Bien formada pero imposible, p. ej. 30 de febrero
+        parsed = None
+    if parsed is None:
+        raise ActionError("Fecha inválida.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    if parsed < now - timedelta(seconds=settings.OFFLINE_SYNC_MAX_AGE):
+        raise ActionError("La acción es demasiado antigua para sincronizarse.")
+    # Un reloj adelantado en el dispositivo no puede registrar eventos en el futuro
+    return min(parsed, now)
+
+
+def _validate(actions):
+    if not isinstance(actions, list) or not actions:
+        raise SyncError("Se esperaba una lista de acciones.")
+    if len(actions) > settings.OFFLINE_SYNC_MAX_ACTIONS:
+        raise SyncError(f"Máximo {settings.OFFLINE_SYNC_MAX_ACTIONS} acciones por lote.")
+
+
+class _Batch:
+    def __init__(self, user, bundles, progress):
+        self.user = user
+        self.bundles = bundles        # Código QR -> paquete de contenido
+        self.progress = progress      # location_id -> UserProgress (sin pk si es nuevo)
+        self.dirty = set()            # location_id con cambios pendientes
+        self.events = []              # (location_id, tipo, valor, hora)
+        self.last_scanned = None
+
+    def _bundle(self, action):
+        qr_code = action.get('qr_code')
+        bundle = self.bundles.get(qr_code) if isinstance(qr_code, str) else None
+        if bundle is None:
+            raise ActionError("Código QR no válido.")
+        return bundle
+
+    def _open_progress(self, location_id):
+        progress = self.progress.get(location_id)
+        if progress is None:
+            raise ActionError("No se encontró progreso.")
+        if progress.completed:
+            raise ActionError("Ya has completado el desafío para esta ubicación.")
+        return progress
+
+    def scan(self, action, timestamp):
+        bundle = self._bundle(action)
+        progress = self.progress.get(bundle["id"])
+        if progress is None:
+            progress = self.progress[bundle["id"]] = UserProgress(
+                user=self.user, location_id=bundle["id"], last_scanned_qr_id=bundle["id"], hunt_id=bundle.get("hunt")
+            )
+        elif progress.completed:
+            raise ActionError("Ya has completado el desafío para esta ubicación.")
+        progress.last_scanned_qr_id = bundle["id"]
+        self.dirty.add(bundle["id"])
+        self.last_scanned = bundle["id"]
+        self.events.append((bundle["id"], events.EventType.SCAN, None, timestamp))
+        return {"location": bundle["name"]}
+
+    def answer(self, action, timestamp):
+        bundle = self._bundle(action)
+        progress = self._open_progress(bundle["id"])
+        challenge = bundle["challenge"]
+        answer = action.get('answer')
+        if not challenge or not isinstance(answer, str) or not answer:
+            raise ActionError("No se encontró el desafío o la respuesta no es válida.")
+
+        correct = challenge["correct_answer"].lower() == answer.lower()
+        self.events.append((bundle["id"], events.EventType.ANSWER_ATTEMPT, int(correct), timestamp))
+        if not correct:
+            return {"correct": False}
+
+        if progress.pk is None:
+            # award_completion actualiza la fila existente; si es nueva se guarda antes
+            # para conservar las pistas ya tomadas en este lote
+            progress.save()
+            self.dirty.discard(bundle["id"])
+        scoring.award_completion(self.user, bundle["id"], challenge["points"])
+        progress.completed = True
+        return {"correct": True, "points": challenge["points"]}
+
+    def hint(self, action, timestamp):
+        bundle = self._bundle(action)
+        progress = self._open_progress(bundle["id"])
+        try:
+            count = int(action.get('count', 1))
+        except (TypeError, ValueError):
+            count = 0
+        if not 1 <= count <= settings.HINTS_MAX_BATCH:
+            raise ActionError(f"Parámetro 'count' inválido (1 a {settings.HINTS_MAX_BATCH}).")
+
+        # Misma regla que hints.take_hints: current_hint mayor que la última pista significa que no quedan
+        hints = bundle["hints"]
+        if not hints or progress.current_hint > hints[-1][0]:
+            return {"hints": [], "remaining": 0}
+        first = progress.current_hint
+        progress.current_hint += count
+        self.dirty.add(bundle["id"])
+        taken = [(order, text) for order, text in hints if first <= order < first + count]
+        for order, _ in taken:
+            self.events.append((bundle["id"], events.EventType.HINT_TAKEN, order, timestamp))
+        return {
+            "hints": [{"order": order, "text": text} for order, text in taken],
+            "remaining": sum(1 for order, _ in hints if order >= first + count),
+        }
+
+    def flush(self):
+        """
+        Escribe el progreso pendiente: filas nuevas con bulk_create, existentes con bulk_update.
+        """
+        rows = [self.progress[location_id] for location_id in self.dirty]
+        self.dirty.clear()
+        UserProgress.objects.bulk_create([row for row in rows if row.pk is None])
+        UserProgress.objects.bulk_update([row for row in rows if row.pk is not None], ['last_scanned_qr', 'current_hint'])
+
+
+def apply(user, actions):
+    """
+    Aplica las acciones en orden y devuelve un resultado por acción
+    (``{"id", "type", "ok", ...}`` o ``{"id", "type", "ok": False, "error"}``).
+    """
+    _validate(actions)
+    now = timezone.now()
+    qr_codes = {
+        action['qr_code'] for action in actions
+        if isinstance(action, dict) and isinstance(action.get('qr_code'), str)
+    }
+    bundles = content_cache.get_bundles_by_qr(qr_codes)
+
+    results = []
+    with transaction.atomic():
+        # Mismo orden de candados que scoring.award_completion (Leaderboard y luego
+        # UserProgress): al revés, este lote y una respuesta concurrente del mismo
+        # usuario podrían bloquearse mutuamente
+        if any(isinstance(action, dict) and action.get('type') == ANSWER for action in actions):
+            Leaderboard.objects.select_for_update().get_or_create(user=user, hunt_id=hunts.active_id())
+
+        progress = {}
+        rows = (
+            UserProgress.objects.select_for_update()
+            .filter(user=user, location_id__in=[bundle["id"] for bundle in bundles.values()])
+            .order_by('pk')
+        )
+        for row in rows:
+            # (usuario, ubicación) no es único: como en el resto de la API, vale la primera fila
+            progress.setdefault(row.location_id, row)
+
+        batch = _Batch(user, bundles, progress)
+
+        # Los eventos solo se registran si el lote se confirma (antes que las completaciones)
+        def record_events():
+            for location_id, event_type, value, timestamp in batch.events:
+                events.record(user.id, location_id, event_type, value, timestamp=timestamp)
+        transaction.on_commit(record_events)
+
+        for action in actions:
+            if not isinstance(action, dict):
+                results.append({"id": None, "type": None, "ok": False, "error": "Cada acción debe ser un objeto."})
+                continue
+            result = {"id": action.get('id'), "type": action.get('type')}
+            try:
+                if not isinstance(result["type"], str) or result["type"] not in ACTION_TYPES:
+                    raise ActionError(f"Tipo de acción desconocido (se esperaba {', '.join(ACTION_TYPES)}).")
+                timestamp = _timestamp(action.get('timestamp'), now)
+                result.update(getattr(batch, result["type"])(action, timestamp), ok=True)
+            except ActionError as e:
+                result.update(ok=False, error=str(e))
+            results.append(result)
+
+        batch.flush()
+        if batch.last_scanned is not None:
+            summaries.record_scan(user.id, batch.last_scanned)
+
+    return results
@@ -0,0 +1,115 @@
+"""
+Verificación de credenciales para el login.
+
+El hash de la contraseña es trabajo de CPU (``hashlib`` libera el GIL), así que se
+ejecuta en un pool de ``PASSWORD_HASH_WORKERS`` hilos: una avalancha de logins
+queda en cola en lugar de saturar todos los hilos del servidor, y la versión
+asíncrona no bloquea el event loop. Las consultas a la base de datos se hacen en
+el hilo de la solicitud, nunca en el pool.
+
+Si el hash guardado usa otro algoritmo o costo que el preferido en
+``PASSWORD_HASHERS``, se recalcula (también en el pool) y se guarda al iniciar sesión.
+
+Como ``django.contrib.auth.authenticate``, un intento fallido envía
+``user_login_failed``; ``logged_in`` envía ``user_logged_in`` (que actualiza
+``last_login``) cuando el login no crea sesión con ``django.contrib.auth.login``.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+
+from api.models import CustomUser
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix='password-hash',
+                )
+    return _executor
+
+
+def _verify(password, encoded):
+    """
+    Devuelve (válida, nuevo hash o None). Se ejecuta en el pool.
+    """
+    if encoded is None:
+        # Usuario inexistente: se hashea igual para no revelar por el tiempo de respuesta
+        make_password(password)
+        return False, None
+
+    outdated = []
+    valid = check_password(password, encoded, setter=lambda raw: outdated.append(True))
+    return valid, make_password(password) if valid and outdated else None
+
+
+def _find_user_query(email):
+    return CustomUser.objects.filter(email=email).only('password', 'is_active', 'email')
+
+
+def _finish(user, valid, new_hash):
+    if not valid or not user.is_active:
+        return None
+    if new_hash is not None:
+        CustomUser.objects.filter(pk=user.pk).update(password=new_hash)
+        user.password = new_hash
+    return user
+
+
+def _failed_credentials(email):
+    # Como Django, sin la contraseña
+    return {'email': email}
+
+
+def authenticate(email, password, request=None):
+    """
+    Devuelve el usuario si el correo y la contraseña son correctos; si no, None.
+    """
+    user = None
+    if isinstance(email, str) and isinstance(password, str) and email and password:
+        user = _find_user_query(email.lower()).first()
+        valid, new_hash = _pool().submit(_verify, password, user.password if user else None).result()
+        user = _finish(user, valid, new_hash) if user else None
+    if user is None:
+        user_login_failed.send(sender=__name__, credentials=_failed_credentials(email), request=request)
+    return user
+
+
+async def aauthenticate(email, password, request=None):
+    """
+    Versión asíncrona de ``authenticate``: el hash se espera sin bloquear el event loop.
+    """
+    user = None
+    if isinstance(email, str) and isinstance(password, str) and email and password:
+        user = await _find_user_query(email.lower()).afirst()
+        valid, new_hash = await asyncio.wrap_future(_pool().submit(_verify, password, user.password if user else None))
+        if user is not None and (not valid or not user.is_active):
+            user = None
+        if user is not None and new_hash is not None:
+            await CustomUser.objects.filter(pk=user.pk).aupdate(password=new_hash)
+            user.password = new_hash
+    if user is None:
+        await user_login_failed.asend(sender=__name__, credentials=_failed_credentials(email), request=request)
+    return user
+
+
+def logged_in(request, user):
+    """
+    Envía ``user_logged_in`` (actualiza ``last_login``) sin crear sesión.
+    """
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+
+
+async def alogged_in(request, user):
+    await user_logged_in.asend(sender=user.__class__, request=request, user=user)
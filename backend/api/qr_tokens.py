@@ -0,0 +1,125 @@
+"""
+Tokens de acceso a una ubicación que se entregan al escanear un código QR.
+
+Hay dos modos, elegidos con ``QR_TOKEN_MODE``:
+
+- ``'database'``: cada escaneo crea una fila ``QRAccessToken`` y cada uso la busca por UUID.
+- ``'signed'``: el token lleva el id del usuario, el id de la ubicación y la expiración,
+  firmados con HMAC (``django.core.signing``); se verifica sin tocar la base de datos.
+
+En ambos modos el token queda ligado al usuario que escaneó el QR.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+from api.models import QRAccessToken
+
+SIGNING_SALT = 'api.qr_tokens'
+
+
+class QRTokenError(Exception):
+    pass
+
+
+class TokenInvalid(QRTokenError):
+    pass
+
+
+class TokenExpired(QRTokenError):
+    pass
+
+
+class TokenForbidden(QRTokenError):
+    pass
+
+
+def _signer():
+    return signing.Signer(salt=SIGNING_SALT)
+
+
+def issue(user, location_id):
+    """
+    Crea un token de acceso para el usuario y la ubicación y lo devuelve como texto.
+    """
+    if settings.QR_TOKEN_MODE == 'signed':
+        expires = int(time.time() + settings.QR_TOKEN_LIFETIME.total_seconds())
+        return _signer().sign(f"{user.id}.{location_id}.{expires:x}")
+
+    return str(QRAccessToken.objects.create(user=user, location_id=location_id).token)
+
+
+async def aissue(user, location_id):
+    """
+    Versión asíncrona de ``issue``.
+    """
+    if settings.QR_TOKEN_MODE == 'signed':
+        return issue(user, location_id)
+    return str((await QRAccessToken.objects.acreate(user=user, location_id=location_id)).token)
+
+
+def _resolve_signed(token):
+    try:
+        value = _signer().unsign(token)
+        user_id, location_id, expires = value.split('.')
+        return int(user_id), int(location_id), int(expires, 16)
+    except (signing.BadSignature, ValueError):
+        raise TokenInvalid()
+
+
+def _database_lookup(token):
+    try:
+        uuid_token = uuid.UUID(str(token))
+    except ValueError:
+        raise TokenInvalid()
+    return QRAccessToken.objects.only('user_id', 'location_id', 'expires_at').filter(token=uuid_token)
+
+
+def _resolve_database(token):
+    access = _database_lookup(token).first()
+    if access is None:
+        raise TokenInvalid()
+    return access.user_id, access.location_id, access.expires_at.timestamp()
+
+
+async def _aresolve_database(token):
+    access = await _database_lookup(token).afirst()
+    if access is None:
+        raise TokenInvalid()
+    return access.user_id, access.location_id, access.expires_at.timestamp()
+
+
+def resolve(token, user):
+    """
+    Verifica el token y devuelve el id de la ubicación a la que da acceso.
+
+    Lanza TokenInvalid, TokenExpired o TokenForbidden (el token es de otro usuario).
+    Acepta tokens de ambos modos para no invalidar los emitidos antes de un cambio de modo.
+    """
+    if ':' in str(token):
+        claims = _resolve_signed(str(token))
+    else:
+        claims = _resolve_database(token)
+    return _check(claims, user)
+
+
+async def aresolve(token, user):
+    """
+    Versión asíncrona de ``resolve``.
+    """
+    if ':' in str(token):
+        claims = _resolve_signed(str(token))
+    else:
+        claims = await _aresolve_database(token)
+    return _check(claims, user)
+
+
+def _check(claims, user):
+    user_id, location_id, expires = claims
+    if time.time() >= expires:
+        raise TokenExpired()
+    if user_id != user.id:
+        raise TokenForbidden()
+    return location_id
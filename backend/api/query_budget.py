@@ -0,0 +1,36 @@
+"""
+Presupuesto de consultas por vista.
+
+Cada vista de ``api/urls.py`` declara con ``@query_budget(n)`` cuántas consultas
+puede ejecutar como máximo por solicitud. Las pruebas (``QueryBudgetTests``)
+recorren todas las rutas con 10, 1.000 y 100.000 filas en el ranking y fallan si
+una vista no tiene presupuesto, lo excede o si su número de consultas crece con
+el tamaño de la tabla. El presupuesto cuenta las sentencias tal como las ve la
+prueba: con ``EVENT_LOG_SYNC`` activo (cada evento es un INSERT) y con los
+SAVEPOINT de los bloques atómicos, y con las cachés del proceso calientes (el
+usuario del JWT sale de la caché de ``api/authentication.py``). Con ``REQUEST_STATS_ENABLED`` el middleware de
+instrumentación también avisa en el log cuando una solicitud se pasa.
+"""
+from importlib import import_module
+
+
+def query_budget(max_queries):
+    """
+    Declara el máximo de consultas de la vista. Va encima de ``@api_view``.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_budget(view):
+    return getattr(view, 'query_budget', None)
+
+
+def iter_views(urlconf='api.urls'):
+    """
+    Devuelve (nombre de la URL, vista, presupuesto) de cada ruta del urlconf.
+    """
+    for pattern in import_module(urlconf).urlpatterns:
+        yield pattern.name, pattern.callback, get_budget(pattern.callback)
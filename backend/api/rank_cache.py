@@ -0,0 +1,261 @@
+"""
+Caché del ranking en memoria.
+
+Mantiene en cada proceso una lista ordenada de (-total_points, user_id) que se
+actualiza de forma incremental cada vez que cambia ``Leaderboard.total_points``.
+Solo contiene el ranking de la búsqueda activa (``api/hunts.py``) y se
+reconstruye cuando esta cambia.
+Las búsquedas (top-N, posición de un usuario, ventana por cursor) se resuelven
+con búsqueda binaria, sin ordenar la tabla en la base de datos.
+
+Con ``RANKING_CACHE_SHARED`` (por defecto si hay ``REDIS_URL``) cada cambio se
+publica en un registro de secuencia dentro del framework de caché de Django para
+que los demás procesos lo apliquen antes de leer. Sin él, un proceso solo ve sus
+propios cambios, así que se reconstruye desde la BD cada
+``RANKING_CACHE_REBUILD_INTERVAL`` segundos.
+
+``request_rebuild()`` (comando ``rebuild_ranking``) incrementa una generación
+guardada en la misma caché; cada proceso la compara antes de leer y se
+reconstruye si cambió. Solo llega a todos los procesos si esa caché es compartida
+(``CACHES_COHERENT``).
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+SEQ_KEY = 'ranking:seq'
+DELTA_KEY = 'ranking:delta:{}'
+GENERATION_KEY = 'ranking:generation'
+
+
+class RankCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []      # Lista ordenada de (-total_points, user_id)
+        self._points = {}    # user_id -> total_points
+        self._seq = 0        # Última secuencia del registro compartido aplicada
+        self._gap_seen_at = None
+        self._built = False
+        self._hunt_id = None  # Búsqueda con la que se construyó
+        self._built_at = 0.0  # time.monotonic() de la última reconstrucción
+        self._generation = 0  # Generación de reconstrucción con la que se construyó
+
+    # Backend compartido
+
+    @property
+    def shared(self):
+        return settings.RANKING_CACHE_SHARED
+
+    def _backend(self):
+        return caches[settings.RANKING_CACHE_ALIAS]
+
+    def _published(self):
+        """
+        Devuelve (secuencia, generación) publicadas, con una sola lectura de la caché.
+        """
+        backend = self._backend()
+        if not self.shared:
+            return 0, backend.get(GENERATION_KEY, 0)
+        values = backend.get_many([SEQ_KEY, GENERATION_KEY])
+        return values.get(SEQ_KEY, 0), values.get(GENERATION_KEY, 0)
+
+    def _publish(self, user_id, points):
+        backend = self._backend()
+        backend.add(SEQ_KEY, 0, timeout=None)
+        seq = backend.incr(SEQ_KEY)
+        backend.set(DELTA_KEY.format(seq), (user_id, points), timeout=settings.RANKING_CACHE_DELTA_TTL)
+
+    def _sync(self, seq):
+        """
+        Aplica los cambios publicados por otros procesos hasta ``seq``.
+        """
+        if not self.shared or seq == self._seq:
+            return
+        if seq < self._seq or seq - self._seq > settings.RANKING_CACHE_MAX_REPLAY:
+            # La caché compartida se reinició o nos quedamos muy atrás
+            self.rebuild()
+            return
+
+        pending = range(self._seq + 1, seq + 1)
+        deltas = self._backend().get_many([DELTA_KEY.format(n) for n in pending])
+        for n in pending:
+            delta = deltas.get(DELTA_KEY.format(n))
+            if delta is None:
+                # Otro proceso incrementó la secuencia pero aún no escribe el cambio;
+                # si el hueco persiste, el cambio se perdió y reconstruimos.
+                if self._gap_seen_at is None:
+                    self._gap_seen_at = time.monotonic()
+                elif time.monotonic() - self._gap_seen_at > settings.RANKING_CACHE_GAP_TIMEOUT:
+                    self.rebuild()
+                return
+            self._apply(*delta)
+            self._seq = n
+            self._gap_seen_at = None
+
+    # Estructura local
+
+    def _apply(self, user_id, points):
+        old = self._points.pop(user_id, None)
+        if old is not None:
+            idx = bisect.bisect_left(self._keys, (-old, user_id))
+            if idx < len(self._keys) and self._keys[idx] == (-old, user_id):
+                del self._keys[idx]
+        if points is not None:
+            self._points[user_id] = points
+            bisect.insort(self._keys, (-points, user_id))
+
+    def _expired(self):
+        interval = settings.RANKING_CACHE_REBUILD_INTERVAL
+        return not self.shared and interval is not None and time.monotonic() - self._built_at > interval
+
+    def _ensure(self):
+        from api import hunts
+
+        if not self._built or self._hunt_id != hunts.active_id() or self._expired():
+            self.rebuild()
+            return
+        seq, generation = self._published()
+        if generation != self._generation:
+            self.rebuild()
+        else:
+            self._sync(seq)
+
+    def rebuild(self):
+        """
+        Reconstruye la estructura completa desde la tabla Leaderboard.
+        """
+        from api import hunts
+        from api.models import Leaderboard
+
+        with self._lock:
+            hunt_id = hunts.active_id()
+            # Leemos la secuencia antes que la tabla: los cambios posteriores se
+            # vuelven a aplicar y, como llevan el valor absoluto, son idempotentes.
+            seq, generation = self._published()
+            # Siempre desde la base principal: una réplica atrasada dejaría la caché
+            # desactualizada hasta la próxima reconstrucción
+            points = dict(
+                Leaderboard.objects.using(DEFAULT_DB_ALIAS).filter(hunt_id=hunt_id).values_list('user_id', 'total_points')
+            )
+            self._points = points
+            self._keys = sorted((-total, user_id) for user_id, total in points.items())
+            self._seq = seq
+            self._gap_seen_at = None
+            self._built = True
+            self._hunt_id = hunt_id
+            self._built_at = time.monotonic()
+            self._generation = generation
+            return len(self._keys)
+
+    def request_rebuild(self):
+        """
+        Pide a todos los procesos que compartan la caché que se reconstruyan desde
+        la BD en su próxima lectura. Devuelve la nueva generación.
+        """
+        backend = self._backend()
+        backend.add(GENERATION_KEY, 0, timeout=None)
+        return backend.incr(GENERATION_KEY)
+
+    def reset(self):
+        with self._lock:
+            self._keys = []
+            self._points = {}
+            self._seq = 0
+            self._gap_seen_at = None
+            self._built = False
+
+    def update(self, user_id, points):
+        """
+        Registra el nuevo total de un usuario (``None`` si se eliminó su fila).
+        """
+        if not settings.RANKING_CACHE_ENABLED:
+            return
+        with self._lock:
+            if self._built:
+                self._apply(user_id, points)
+        if self.shared:
+            self._publish(user_id, points)
+
+    # Lecturas
+
+    def __len__(self):
+        with self._lock:
+            self._ensure()
+            return len(self._keys)
+
+    def page(self, limit, after=None):
+        """
+        Devuelve (posición inicial, [(user_id, points), ...]) a partir de la fila
+        posterior a ``after`` = (points, user_id).
+        """
+        with self._lock:
+            self._ensure()
+            start = 0
+            if after is not None:
+                points, user_id = after
+                start = bisect.bisect_right(self._keys, (-points, user_id))
+            return start, self._slice(start, limit)
+
+    def slice(self, start, count):
+        """
+        Devuelve ``count`` filas (user_id, points) desde la posición ``start`` (0-based).
+        """
+        with self._lock:
+            self._ensure()
+            return self._slice(start, count)
+
+    def _slice(self, start, count):
+        return [(user_id, -neg) for neg, user_id in self._keys[start:start + count]]
+
+    def rank_of(self, user_id):
+        """
+        Devuelve (rank, points) del usuario o None si no está en el ranking.
+        """
+        with self._lock:
+            self._ensure()
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return bisect.bisect_left(self._keys, (-points, user_id)) + 1, points
+
+    def rank_for(self, user_id, points):
+        """
+        Posición que tendría el usuario con ``points`` puntos (sin modificar la caché).
+        """
+        with self._lock:
+            self._ensure()
+            key = (-points, user_id)
+            rank = bisect.bisect_left(self._keys, key) + 1
+            old = self._points.get(user_id)
+            if old is not None and (-old, user_id) < key:
+                # Su fila actual va antes de la nueva posición: no se cuenta a sí mismo
+                rank -= 1
+            return rank
+
+    def check_consistency(self):
+        """
+        Compara la caché de este proceso con la base de datos y devuelve las
+        diferencias como una lista de (user_id, puntos en caché, puntos en BD).
+        """
+        from api.models import Leaderboard
+
+        with self._lock:
+            self._ensure()
+            cached = {user_id: -neg for neg, user_id in self._keys}
+            hunt_id = self._hunt_id
+        stored = dict(
+            Leaderboard.objects.using(DEFAULT_DB_ALIAS).filter(hunt_id=hunt_id).values_list('user_id', 'total_points')
+        )
+
+        return sorted(
+            (user_id, cached.get(user_id), stored.get(user_id))
+            for user_id in cached.keys() | stored.keys()
+            if cached.get(user_id) != stored.get(user_id)
+        )
+
+
+rank_cache = RankCache()
@@ -0,0 +1,264 @@
+import base64
+import binascii
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from api import hunts
+from api.models import ArchivedLeaderboard, CustomUser, Hunt, Leaderboard
+from api.rank_cache import rank_cache
+
+# Orden estable del ranking: más puntos primero y, a igualdad de puntos,
+# el usuario registrado antes. Coincide con el índice compuesto de Leaderboard.
+RANKING_ORDER = ('-total_points', 'user_id')
+REVERSE_RANKING_ORDER = ('total_points', '-user_id')
+
+
+def encode_cursor(points, user_id, rank):
+    """
+    Codifica la posición de la última fila entregada como un cursor opaco.
+    """
+    raw = f"{points}:{user_id}:{rank}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Devuelve (points, user_id, rank) a partir de un cursor. Lanza ValueError si no es válido.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        points, user_id, rank = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+        return int(points), int(user_id), int(rank)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Cursor inválido")
+
+
+def ranked_above(points, user_id):
+    # Filas que van antes que (points, user_id) en el ranking
+    return Q(total_points__gt=points) | Q(total_points=points, user_id__lt=user_id)
+
+
+def ranked_below(points, user_id):
+    # Filas que van después que (points, user_id) en el ranking
+    return Q(total_points__lt=points) | Q(total_points=points, user_id__gt=user_id)
+
+
+def serialize_entry(user, points, rank):
+    return {
+        "rank": rank,
+        "name": f"{user.first_name} {user.last_name}",
+        "email": user.email,
+        "points": points,
+    }
+
+
+def _users_queryset(rows):
+    return CustomUser.objects.only('first_name', 'last_name', 'email').filter(pk__in=[user_id for user_id, _ in rows])
+
+
+def _serialize_rows(rows, first_rank, users=None):
+    """
+    Serializa filas (user_id, points) de la caché con una sola consulta de usuarios.
+    """
+    if users is None:
+        users = {user.pk: user for user in _users_queryset(rows)}
+    return [
+        serialize_entry(users[user_id], points, first_rank + idx)
+        for idx, (user_id, points) in enumerate(rows)
+        if user_id in users
+    ]
+
+
+def _leaderboard(hunt_id=None):
+    """
+    Filas de Leaderboard de la búsqueda activa (o de ``hunt_id``).
+    """
+    return Leaderboard.objects.filter(hunt_id=hunts.active_id() if hunt_id is None else hunt_id)
+
+
+def _ranking_queryset(hunt_id=None):
+    return _leaderboard(hunt_id).select_related('user').only(
+        'total_points', 'user__id', 'user__first_name', 'user__last_name', 'user__email',
+    )
+
+
+def get_page(cursor=None, limit=None):
+    """
+    Devuelve una página del ranking empezando después del cursor dado.
+
+    La paginación es por keyset sobre (total_points, user_id), por lo que el
+    costo de cada página no depende de su posición en el ranking.
+    """
+    limit = limit or settings.LEADERBOARD_PAGE_SIZE
+    if settings.RANKING_CACHE_ENABLED:
+        return _get_page_cached(cursor, limit)
+
+    queryset, start_rank = _page_queryset(cursor, limit)
+    return _page_from_entries(list(queryset), start_rank, limit)
+
+
+def _page_queryset(cursor, limit, hunt_id=None):
+    queryset = _ranking_queryset(hunt_id).order_by(*RANKING_ORDER)
+    start_rank = 0
+
+    if cursor:
+        points, user_id, start_rank = decode_cursor(cursor)
+        queryset = queryset.filter(ranked_below(points, user_id))
+
+    # Pedimos una fila extra para saber si hay una página siguiente
+    return queryset[:limit + 1], start_rank
+
+
+def _page_from_entries(entries, start_rank, limit):
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    results = [serialize_entry(entry.user, entry.total_points, start_rank + idx + 1) for idx, entry in enumerate(entries)]
+    next_cursor = None
+    if has_more:
+        last = entries[-1]
+        next_cursor = encode_cursor(last.total_points, last.user_id, start_rank + len(entries))
+
+    return {"results": results, "next_cursor": next_cursor}
+
+
+def _cursor_position(cursor):
+    if not cursor:
+        return None
+    points, user_id, _ = decode_cursor(cursor)
+    return points, user_id
+
+
+def _get_page_cached(cursor, limit):
+    start, rows = rank_cache.page(limit + 1, _cursor_position(cursor))
+    return _page_from_rows(start, rows, limit)
+
+
+def _page_from_rows(start, rows, limit, users=None):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        user_id, points = rows[-1]
+        next_cursor = encode_cursor(points, user_id, start + len(rows))
+    return {"results": _serialize_rows(rows, start + 1, users), "next_cursor": next_cursor}
+
+
+async def aget_page(cursor=None, limit=None):
+    """
+    Versión asíncrona de ``get_page`` para las vistas ASGI.
+    """
+    limit = limit or settings.LEADERBOARD_PAGE_SIZE
+    if settings.RANKING_CACHE_ENABLED:
+        # La primera lectura puede reconstruir la caché desde la BD
+        start, rows = await sync_to_async(rank_cache.page)(limit + 1, _cursor_position(cursor))
+        users = {user.pk: user async for user in _users_queryset(rows[:limit])}
+        return _page_from_rows(start, rows, limit, users)
+
+    # Deja leída la búsqueda activa para que armar la consulta no toque la BD
+    await hunts.aactive_id()
+    queryset, start_rank = _page_queryset(cursor, limit)
+    return _page_from_entries([entry async for entry in queryset], start_rank, limit)
+
+
+def get_hunt_page(hunt_id, cursor=None, limit=None):
+    """
+    Página del ranking de una búsqueda cualquiera: la activa desde la caché, una
+    archivada desde ArchivedLeaderboard (con la posición final guardada) y las
+    demás desde Leaderboard. Lanza Hunt.DoesNotExist si no existe.
+    """
+    limit = limit or settings.LEADERBOARD_PAGE_SIZE
+    hunt = Hunt.objects.only('is_active', 'archived_at').get(pk=hunt_id)
+    if hunt.is_active:
+        return get_page(cursor, limit)
+    if hunt.archived_at is None:
+        queryset, start_rank = _page_queryset(cursor, limit, hunt.pk)
+        return _page_from_entries(list(queryset), start_rank, limit)
+
+    start_rank = decode_cursor(cursor)[2] if cursor else 0
+    rows = list(
+        ArchivedLeaderboard.objects.filter(hunt=hunt, rank__gt=start_rank)
+        .order_by('rank')
+        .values_list('user_id', 'total_points')[:limit + 1]
+    )
+    return _page_from_rows(start_rank, rows, limit)
+
+
+def get_rank(entry):
+    """
+    Posición (1-based) de una fila de Leaderboard en el ranking.
+    """
+    if settings.RANKING_CACHE_ENABLED:
+        cached = rank_cache.rank_of(entry.user_id)
+        if cached is not None:
+            return cached[0]
+    return _leaderboard().filter(ranked_above(entry.total_points, entry.user_id)).count() + 1
+
+
+def projected_rank(user_id, points):
+    """
+    Posición que ocupa (o pasa a ocupar) el usuario con ``points`` puntos.
+    """
+    if settings.RANKING_CACHE_ENABLED:
+        return rank_cache.rank_for(user_id, points)
+    return _leaderboard().filter(ranked_above(points, user_id)).exclude(user_id=user_id).count() + 1
+
+
+def get_standing(user):
+    """
+    Devuelve (rank, points) del usuario; (None, 0) si no tiene fila en el ranking.
+    """
+    if settings.RANKING_CACHE_ENABLED:
+        return rank_cache.rank_of(user.id) or (None, 0)
+
+    entry = _leaderboard().filter(user=user).first()
+    if entry is None:
+        return None, 0
+    return get_rank(entry), entry.total_points
+
+
+def get_around(user, size=None):
+    """
+    Devuelve la posición del usuario junto con ``size`` vecinos por arriba y por abajo.
+    """
+    size = settings.LEADERBOARD_AROUND_SIZE if size is None else size
+    if settings.RANKING_CACHE_ENABLED:
+        return _get_around_cached(user, size)
+
+    entry = _ranking_queryset().filter(user=user).first()
+    if entry is None:
+        return None
+
+    rank = get_rank(entry)
+    above = list(
+        _ranking_queryset()
+        .filter(ranked_above(entry.total_points, entry.user_id))
+        .order_by(*REVERSE_RANKING_ORDER)[:size]
+    )
+    above.reverse()
+    below = list(
+        _ranking_queryset()
+        .filter(ranked_below(entry.total_points, entry.user_id))
+        .order_by(*RANKING_ORDER)[:size]
+    )
+
+    first_rank = rank - len(above)
+    rows = above + [entry] + below
+    return {
+        "rank": rank,
+        "results": [serialize_entry(row.user, row.total_points, first_rank + idx) for idx, row in enumerate(rows)],
+    }
+
+
+def _get_around_cached(user, size):
+    found = rank_cache.rank_of(user.id)
+    if found is None:
+        return None
+
+    rank, _ = found
+    first = max(rank - 1 - size, 0)
+    rows = rank_cache.slice(first, rank - first + size)
+    return {"rank": rank, "results": _serialize_rows(rows, first + 1)}
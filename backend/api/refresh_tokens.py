@@ -0,0 +1,105 @@
+"""
+Revocación de refresh tokens rotados.
+
+Con ``ROTATE_REFRESH_TOKENS`` y ``BLACKLIST_AFTER_ROTATION`` cada refresh token
+solo se puede usar una vez. En lugar de la app ``token_blacklist`` de simplejwt
+(que guarda todos los tokens emitidos en una tabla que no deja de crecer), solo se
+guarda el ``jti`` de los tokens ya usados y hasta que expiran:
+
+- Usar un token es un único INSERT por clave primaria: si el ``jti`` ya estaba,
+  el token fue reutilizado y se rechaza. El costo no depende del tamaño de la tabla
+  y dos refresh simultáneos con el mismo token no pueden ganar ambos.
+- ``purge_expired`` borra por lotes, usando el índice de ``expires_at``, los que ya
+  expiraron (un token expirado se rechaza por su firma, no hace falta recordarlo).
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from api.authentication import user_cache
+from api.models import RevokedRefreshToken
+
+
+def revoke(token):
+    """
+    Revoca el refresh token. Devuelve False si ya estaba revocado.
+    """
+    try:
+        with transaction.atomic():
+            RevokedRefreshToken.objects.create(
+                jti=token[jwt_settings.JTI_CLAIM],
+                expires_at=datetime_from_epoch(token['exp']),
+            )
+    except IntegrityError:
+        return False
+    return True
+
+
+def is_revoked(token):
+    return RevokedRefreshToken.objects.filter(pk=token[jwt_settings.JTI_CLAIM]).exists()
+
+
+def purge_expired(batch_size=None, pause=0, max_batches=None):
+    """
+    Borra por lotes los tokens revocados que ya expiraron. Devuelve (filas borradas, segundos).
+    """
+    batch_size = batch_size or settings.QR_TOKEN_SWEEP_BATCH_SIZE
+    deleted = 0
+    batches = 0
+    start = time.perf_counter()
+    now = timezone.now()
+
+    while max_batches is None or batches < max_batches:
+        pks = list(
+            RevokedRefreshToken.objects.filter(expires_at__lt=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        count, _ = RevokedRefreshToken.objects.filter(pk__in=pks).delete()
+        deleted += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+
+    return deleted, time.perf_counter() - start
+
+
+class RotatingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Igual que el de simplejwt, pero revoca el token usado con ``revoke``.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        # Como simplejwt: un usuario eliminado o desactivado no obtiene tokens nuevos.
+        # Se usa la misma caché de usuarios que la autenticación JWT (solo guarda activos).
+        user_id = refresh.payload.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is not None:
+            user = user_cache.get(user_id) if user_cache.enabled else None
+            if user is None:
+                user = get_user_model().objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+            if user_cache.enabled:
+                user_cache.put(user_id, user)
+
+        if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+            if not revoke(refresh):
+                raise InvalidToken("El token de refresco ya fue usado.")
+        elif is_revoked(refresh):
+            raise InvalidToken("El token de refresco fue revocado.")
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
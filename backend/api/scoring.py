@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import events, hunts, live_ranking, summaries
+from api.models import Leaderboard, UserProgress
+
+
+def award_completion(user, location_id, points):
+    """
+    Marca la ubicación como completada y suma los puntos al ranking en una sola transacción.
+
+    La fila de Leaderboard del usuario se bloquea con ``select_for_update`` y sirve
+    como candado por usuario, así que completaciones concurrentes se serializan y
+    los totales quedan exactos. Es idempotente por (usuario, ubicación): devuelve
+    False si la ubicación ya estaba completada y no suma nada. Los puntos van al
+    ranking de la búsqueda activa.
+    """
+    hunt_id = hunts.active_id()
+    with transaction.atomic():
+        leaderboard, _ = Leaderboard.objects.select_for_update().get_or_create(user=user, hunt_id=hunt_id)
+        progress = UserProgress.objects.filter(user=user, location_id=location_id).order_by('pk').first()
+
+        if progress is None:
+            UserProgress.objects.create(
+                user=user,
+                location_id=location_id,
+                completed=True,
+                points_earned=points,
+                last_scanned_qr_id=location_id,
+                hunt_id=hunt_id,
+            )
+        elif progress.completed:
+            return False
+        else:
+            UserProgress.objects.filter(pk=progress.pk).update(
+                completed=True,
+                completed_at=timezone.now(),
+                points_earned=F('points_earned') + points,
+            )
+
+        Leaderboard.objects.filter(pk=leaderboard.pk).update(total_points=F('total_points') + points)
+        new_total = leaderboard.total_points + points
+        summaries.record_completion(user.id, location_id, points, new_total)
+
+        # update() no dispara post_save: al confirmar avisamos a la caché del ranking (y al stream en vivo)
+        # y registramos la completación en el historial de participación
+        transaction.on_commit(lambda: live_ranking.score_changed(user.id, new_total))
+        transaction.on_commit(lambda: events.record(user.id, location_id, events.EventType.COMPLETION, points))
+
+    return True
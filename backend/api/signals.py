@@ -1,6 +1,9 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import CustomUser, Leaderboard
+from .models import CustomUser, Hunt, Leaderboard, Location, Challenge, Hint, UserSummary
+from . import content_cache, db_routers, hunts, live_ranking, versions
+from .authentication import user_cache
 
 @receiver(post_save, sender=CustomUser)
 def create_related_records(sender, instance, created, **kwargs):
@@ -8,5 +11,82 @@ def create_related_records(sender, instance, created, **kwargs):
     Cuando se crea un nuevo usuario, crea automáticamente registros relacionados.
     """
     if created:
-        # Crear una entrada en Leaderboard para el usuario con puntos iniciales en 0
-        Leaderboard.objects.create(user=instance)
+        # Crear el resumen del jugador y su entrada en Leaderboard con puntos iniciales en 0
+        UserSummary.objects.create(user=instance, hunt_id=hunts.active_id())
+        Leaderboard.objects.create(user=instance, hunt_id=hunts.active_id())
+        # Sus primeras lecturas no deben ir a una réplica que aún no tiene estas filas
+        db_routers.mark_written(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Saca al usuario de la caché de autenticación JWT (p. ej. al desactivarlo): de
+    este proceso y, con cachés coherentes, de los demás mediante su versión compartida.
+    """
+    if kwargs.get('update_fields') == frozenset({'last_login'}):
+        # Cada login actualiza last_login: no cambia la autenticación ni lo que muestra el ranking
+        return
+    user_id = instance.pk
+    user_cache.invalidate(user_id)
+    # Otra vez al confirmar, por si otra solicitud cacheó la fila anterior mientras tanto
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
+    # El ranking muestra el nombre y el correo
+    transaction.on_commit(lambda: versions.bump(versions.LEADERBOARD))
+
+
+@receiver(post_save, sender=Leaderboard)
+def update_rank_cache(sender, instance, **kwargs):
+    """
+    Actualiza la caché del ranking (y el ranking en vivo) cuando cambian los puntos de un usuario.
+    """
+    if instance.hunt_id != hunts.active_id():
+        return
+    user_id, points = instance.user_id, instance.total_points
+    transaction.on_commit(lambda: live_ranking.score_changed(user_id, points))
+
+
+@receiver(post_save, sender=Leaderboard)
+def sync_summary_points(sender, instance, created, **kwargs):
+    """
+    Mantiene los puntos del resumen si se edita la fila de Leaderboard (p. ej. desde el admin).
+    """
+    if not created and instance.hunt_id == hunts.active_id():
+        UserSummary.objects.filter(pk=instance.user_id, hunt_id=instance.hunt_id).update(total_points=instance.total_points)
+
+
+@receiver(post_delete, sender=Leaderboard)
+def remove_from_rank_cache(sender, instance, **kwargs):
+    if instance.hunt_id != hunts.active_id():
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: live_ranking.score_changed(user_id, None))
+
+
+@receiver(post_save, sender=Hunt)
+@receiver(post_delete, sender=Hunt)
+def hunt_changed(sender, instance, **kwargs):
+    """
+    Los procesos vuelven a leer la búsqueda activa (p. ej. al editarla desde el admin).
+    """
+    transaction.on_commit(hunts.changed)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_location_content(sender, instance, **kwargs):
+    """
+    Invalida el paquete de contenido cacheado cuando cambia una ubicación.
+    """
+    location_id, qr_code, hunt_id = instance.pk, instance.qr_code, instance.hunt_id
+    transaction.on_commit(lambda: content_cache.invalidate(location_id, qr_code, hunt_id))
+
+
+@receiver(post_save, sender=Challenge)
+@receiver(post_delete, sender=Challenge)
+@receiver(post_save, sender=Hint)
+@receiver(post_delete, sender=Hint)
+def invalidate_related_content(sender, instance, **kwargs):
+    location_id = instance.location_id
+    transaction.on_commit(lambda: content_cache.invalidate(location_id))
@@ -0,0 +1,145 @@
+"""
+Índice espacial en memoria de las ubicaciones con coordenadas.
+
+Las coordenadas se proyectan a metros con una proyección equirrectangular
+centrada en el campus (precisa a esa escala) y se reparten en una grilla
+uniforme de celdas cuadradas. Para buscar los ``k`` más cercanos se recorren
+anillos de celdas alrededor del punto hasta que el k-ésimo encontrado está más
+cerca que cualquier celda sin revisar, así que cada búsqueda solo mira unas
+pocas celdas aunque haya miles de ubicaciones.
+
+Solo contiene las ubicaciones de la búsqueda activa (``api/hunts.py``). Cada
+proceso reconstruye el índice cuando cambia la versión ``LOCATIONS`` de
+``api/versions.py`` (``content_cache.invalidate`` la incrementa) o la búsqueda activa.
+Sin cachés coherentes esa versión es local a cada proceso, así que además se
+reconstruye cada ``SPATIAL_INDEX_REBUILD_INTERVAL`` segundos.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from api import hunts, versions
+from api.models import Location
+
+EARTH_RADIUS = 6371000  # Metros
+POINTS_PER_CELL = 2
+
+
+class SpatialIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0  # time.monotonic() de la última construcción
+        self._cells = {}      # (columna, fila) -> [(x, y, location_id, name, lat, lon)]
+        self._cell_size = 1.0
+        self._origin = (0.0, 0.0, 1.0)  # (lat, lon, cos(lat)) del centro
+        self._bounds = (0, 0, 0, 0)     # Celdas mínimas y máximas ocupadas
+
+    def _project(self, lat, lon):
+        lat0, lon0, cos0 = self._origin
+        return (
+            math.radians(lon - lon0) * cos0 * EARTH_RADIUS,
+            math.radians(lat - lat0) * EARTH_RADIUS,
+        )
+
+    def _cell(self, x, y):
+        return math.floor(x / self._cell_size), math.floor(y / self._cell_size)
+
+    def build(self, rows):
+        """
+        Construye el índice a partir de (id, nombre, latitud, longitud).
+        """
+        rows = list(rows)
+        with self._lock:
+            self._cells = {}
+            self._built_at = time.monotonic()
+            if not rows:
+                self._bounds = (0, 0, 0, 0)
+                return 0
+
+            lat0 = sum(row[2] for row in rows) / len(rows)
+            lon0 = sum(row[3] for row in rows) / len(rows)
+            self._origin = (lat0, lon0, math.cos(math.radians(lat0)))
+            points = [(*self._project(lat, lon), pk, name, lat, lon) for pk, name, lat, lon in rows]
+
+            # Celdas con POINTS_PER_CELL ubicaciones en promedio sobre el área ocupada
+            width = max(p[0] for p in points) - min(p[0] for p in points)
+            height = max(p[1] for p in points) - min(p[1] for p in points)
+            self._cell_size = max(math.sqrt(max(width * height, 1.0) * POINTS_PER_CELL / len(points)), 1.0)
+
+            for point in points:
+                self._cells.setdefault(self._cell(point[0], point[1]), []).append(point)
+            columns = [cell[0] for cell in self._cells]
+            grid_rows = [cell[1] for cell in self._cells]
+            self._bounds = (min(columns), min(grid_rows), max(columns), max(grid_rows))
+            return len(points)
+
+    def _expired(self):
+        interval = settings.SPATIAL_INDEX_REBUILD_INTERVAL
+        return interval is not None and time.monotonic() - self._built_at > interval
+
+    def _ensure(self):
+        hunt_id = hunts.active_id()
+        version = (versions.get(versions.LOCATIONS), hunt_id)
+        if version != self._version or self._expired():
+            self.build(
+                Location.objects.filter(hunt_id=hunt_id, latitude__isnull=False, longitude__isnull=False)
+                .values_list('pk', 'name', 'latitude', 'longitude')
+            )
+            self._version = version
+
+    def nearest(self, lat, lon, k, exclude=frozenset()):
+        """
+        Devuelve hasta ``k`` ubicaciones [(distancia en metros, id, nombre, lat, lon)]
+        ordenadas por distancia, sin las de ``exclude``.
+        """
+        self._ensure()
+        with self._lock:
+            if not self._cells or k < 1:
+                return []
+            x, y = self._project(lat, lon)
+            column, row = self._cell(x, y)
+            min_col, min_row, max_col, max_row = self._bounds
+            # Desde el primer anillo que toca la zona ocupada hasta el que la cubre entera
+            min_ring = max(min_col - column, column - max_col, min_row - row, row - max_row, 0)
+            max_ring = max(column - min_col, max_col - column, row - min_row, max_row - row, 0)
+
+            found = []
+            for ring in range(min_ring, max_ring + 1):
+                for cell in _ring_cells(column, row, ring, self._bounds):
+                    for px, py, pk, name, plat, plon in self._cells.get(cell, ()):
+                        if pk not in exclude:
+                            found.append((math.hypot(px - x, py - y), pk, name, plat, plon))
+                if len(found) >= k:
+                    found.sort()
+                    del found[k:]
+                    # Todo punto fuera de los anillos revisados está al menos a ring * cell_size
+                    if found[-1][0] <= ring * self._cell_size:
+                        break
+            found.sort()
+            return found[:k]
+
+
+def _ring_cells(column, row, ring, bounds):
+    """
+    Celdas a distancia ``ring`` (Chebyshev) de (column, row), recortadas a las ocupadas.
+    """
+    min_col, min_row, max_col, max_row = bounds
+    if ring == 0:
+        yield column, row
+        return
+    first, last = max(column - ring, min_col), min(column + ring, max_col)
+    for edge in (row - ring, row + ring):
+        if min_row <= edge <= max_row:
+            for col in range(first, last + 1):
+                yield col, edge
+    first, last = max(row - ring + 1, min_row), min(row + ring - 1, max_row)
+    for edge in (column - ring, column + ring):
+        if min_col <= edge <= max_col:
+            for cell_row in range(first, last + 1):
+                yield edge, cell_row
+
+
+location_index = SpatialIndex()
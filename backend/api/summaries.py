@@ -0,0 +1,146 @@
+"""
+Resumen desnormalizado por jugador (``UserSummary``): puntos, ubicaciones
+completadas, ubicación actual, última actividad y posición en el ranking.
+
+Se actualiza con ``update()`` por clave primaria dentro de las mismas transacciones
+que escriben el progreso (escaneo y ``scoring.award_completion``), así que leer el
+perfil es una sola consulta. ``rebuild`` lo recalcula en bloque desde
+``Leaderboard``, ``UserProgress`` y ``ParticipationHistory``.
+
+Cada resumen es el de una búsqueda (``api/hunts.py``). Al activar otra, los
+resúmenes no se recalculan todos de una vez: las escrituras solo tocan los de la
+búsqueda activa y ``get_summary`` recalcula el de un usuario cuando encuentra
+uno de otra búsqueda. El comando ``rebuild_user_summaries`` los recalcula en bloque.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from api import db_routers, hunts, ranking
+from api.models import CustomUser, Leaderboard, ParticipationHistory, UserProgress, UserSummary
+
+
+def record_scan(user_id, location_id):
+    db_routers.mark_written(user_id)
+    UserSummary.objects.filter(pk=user_id, hunt_id=hunts.active_id()).update(
+        current_location_id=location_id, last_activity=timezone.now(),
+    )
+
+
+async def arecord_scan(user_id, location_id):
+    await db_routers.amark_written(user_id)
+    await UserSummary.objects.filter(pk=user_id, hunt_id=await hunts.aactive_id()).aupdate(
+        current_location_id=location_id, last_activity=timezone.now(),
+    )
+
+
+def record_completion(user_id, location_id, points, new_total):
+    """
+    Suma una completación. Se llama dentro de la transacción de ``award_completion``.
+    """
+    db_routers.mark_written(user_id)
+    # Un resumen de otra búsqueda no se toca: se recalcula completo al leerlo
+    UserSummary.objects.filter(pk=user_id, hunt_id=hunts.active_id()).update(
+        total_points=F('total_points') + points,
+        completed_count=F('completed_count') + 1,
+        current_location_id=location_id,
+        last_activity=timezone.now(),
+        rank_snapshot=ranking.projected_rank(user_id, new_total),
+    )
+
+
+def get_summary(user):
+    """
+    Lee el resumen del usuario con una consulta; si aún no existe (usuarios
+    anteriores al resumen) o es de otra búsqueda, lo calcula en ese momento.
+    """
+    queryset = UserSummary.objects.select_related('current_location').filter(pk=user.pk)
+    summary = queryset.first()
+    if summary is None or summary.hunt_id != hunts.active_id():
+        rebuild(user_ids=[user.pk])
+        # Recién escrito: desde la base principal
+        summary = queryset.using(DEFAULT_DB_ALIAS).first()
+    return summary
+
+
+def _ranks(user_ids):
+    if user_ids is None:
+        rows = Leaderboard.objects.filter(hunt_id=hunts.active_id()).order_by(*ranking.RANKING_ORDER).values_list('user_id', flat=True)
+        return {user_id: rank for rank, user_id in enumerate(rows.iterator(chunk_size=5000), start=1)}
+    ranks = {}
+    for user in CustomUser.objects.filter(pk__in=user_ids).only('pk'):
+        rank, _ = ranking.get_standing(user)
+        ranks[user.pk] = rank
+    return ranks
+
+
+def _build_chunk(ids, ranks):
+    hunt_id = hunts.active_id()
+    points = dict(Leaderboard.objects.filter(hunt_id=hunt_id, user_id__in=ids).values_list('user_id', 'total_points'))
+    completed = {
+        row['user']: row
+        for row in UserProgress.objects.filter(hunt_id=hunt_id, user_id__in=ids, completed=True)
+        .values('user')
+        .annotate(count=Count('id'), last=Max('completed_at'))
+    }
+    last_event = dict(
+        ParticipationHistory.objects.filter(location__hunt_id=hunt_id, user_id__in=ids)
+        .values('user')
+        .annotate(last=Max('timestamp'))
+        .values_list('user', 'last')
+    )
+    # Ubicación actual: la del último escaneo registrado o, si no hay eventos, la
+    # última escaneada según UserProgress
+    last_scan = ParticipationHistory.objects.filter(
+        user=OuterRef('pk'), location__hunt_id=hunt_id, event_type=ParticipationHistory.EventType.SCAN
+    ).order_by('-timestamp').values('location')[:1]
+    last_progress = UserProgress.objects.filter(user=OuterRef('pk'), hunt_id=hunt_id).order_by('-pk').values('last_scanned_qr')[:1]
+    locations = {
+        row['pk']: row['scan'] or row['progress']
+        for row in CustomUser.objects.filter(pk__in=ids)
+        .annotate(scan=Subquery(last_scan), progress=Subquery(last_progress))
+        .values('pk', 'scan', 'progress')
+    }
+
+    summaries = []
+    for user_id in ids:
+        done = completed.get(user_id, {})
+        activity = [value for value in (done.get('last'), last_event.get(user_id)) if value is not None]
+        summaries.append(UserSummary(
+            user_id=user_id,
+            total_points=points.get(user_id, 0),
+            completed_count=done.get('count', 0),
+            current_location_id=locations.get(user_id),
+            last_activity=max(activity) if activity else None,
+            rank_snapshot=ranks.get(user_id),
+            hunt_id=hunt_id,
+        ))
+    UserSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['total_points', 'completed_count', 'current_location', 'last_activity', 'rank_snapshot', 'hunt'],
+    )
+    return len(summaries)
+
+
+def rebuild(batch_size=1000, user_ids=None):
+    """
+    Recalcula los resúmenes (de todos los usuarios o de ``user_ids``) por bloques.
+    Devuelve cuántos se escribieron.
+    """
+    users = CustomUser.objects.order_by('pk').values_list('pk', flat=True)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+
+    ranks = _ranks(user_ids)
+    written = 0
+    chunk = []
+    for user_id in users.iterator(chunk_size=batch_size):
+        chunk.append(user_id)
+        if len(chunk) >= batch_size:
+            written += _build_chunk(chunk, ranks)
+            chunk = []
+    if chunk:
+        written += _build_chunk(chunk, ranks)
+    return written
@@ -1,3 +1,1278 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api.models import AnalyticsCursor, ArchivedLeaderboard, ArchivedProgress, CustomUser, Hunt, Location, Challenge, Hint, Leaderboard, UserProgress, ParticipationHistory, QRAccessToken, RevokedRefreshToken, UserSummary
+from api import analytics, benchmark, content_cache, content_io, db_routers, events, hunts, instrumentation, live_ranking, qr_tokens, refresh_tokens, spatial, summaries, token_maintenance, versions
+from api.authentication import user_cache
+from api.query_budget import iter_views
+from api.rank_cache import DELTA_KEY, SEQ_KEY, rank_cache
+from api.scoring import award_completion
+
+
+@override_settings(EVENT_LOG_SYNC=True, RANKING_CACHE_REBUILD_INTERVAL=None, ACTIVE_HUNT_CACHE_TTL=None)
+class AwardCompletionTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+
+    def test_suma_los_puntos_una_sola_vez(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(award_completion(self.user, self.location.id, 10))
+            self.assertFalse(award_completion(self.user, self.location.id, 10))
+
+        self.assertEqual(Leaderboard.objects.get(user=self.user).total_points, 10)
+        progress = UserProgress.objects.get(user=self.user, location=self.location)
+        self.assertTrue(progress.completed)
+        self.assertEqual(progress.points_earned, 10)
+        self.assertEqual(ParticipationHistory.objects.filter(user=self.user).count(), 1)
+
+    def test_usa_un_numero_fijo_de_consultas(self):
+        UserProgress.objects.create(user=self.user, location=self.location)
+        rank_cache.rebuild()
+        # SAVEPOINT, bloqueo de Leaderboard, progreso, 3 UPDATE (progreso, ranking y
+        # resumen) y RELEASE; el historial se escribe al confirmar la transacción
+        with self.assertNumQueries(7):
+            award_completion(self.user, self.location.id, 10)
+
+
+@override_settings(EVENT_LOG_SYNC=True)
+class ConcurrentAwardCompletionTests(TransactionTestCase):
+    def setUp(self):
+        rank_cache.reset()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.locations = [
+            Location.objects.create(name=f"Ubicación {i}", qr_code=f"QR-{i}") for i in range(5)
+        ]
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_completaciones_en_paralelo_dan_totales_exactos(self):
+        errors = []
+
+        def complete(location):
+            try:
+                award_completion(self.user, location.id, 10)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        # Cuatro solicitudes simultáneas por cada ubicación
+        threads = [
+            threading.Thread(target=complete, args=(location,))
+            for location in self.locations
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Leaderboard.objects.get(user=self.user).total_points, 10 * len(self.locations))
+        self.assertEqual(ParticipationHistory.objects.filter(user=self.user).count(), len(self.locations))
+
+
+@override_settings(EVENT_LOG_SYNC=True, ACTIVE_HUNT_CACHE_TTL=None)
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        Challenge.objects.create(location=self.location, question="¿Color del reciclaje de papel?", correct_answer="Azul", options=["Azul", "Verde"])
+        Hint.objects.create(location=self.location, text="Segunda pista", order=2)
+        Hint.objects.create(location=self.location, text="Primera pista", order=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_desafio_en_cache_no_consulta_contenido(self):
+        token = QRAccessToken.objects.create(user=self.user, location=self.location)
+        self.client.get(f'/api/get_challenge/{token.token}/')
+
+        # Token, progreso del usuario y el evento de participación; nada de Location/Challenge/Hint
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/get_challenge/{token.token}/')
+        self.assertEqual(response.json()["question"], "¿Color del reciclaje de papel?")
+
+    def test_pistas_en_orden(self):
+        response = self.client.post('/api/scan-qr/', {"qr_code": "QR-BIB"}, format='json')
+        token = response.json()["token"]
+
+        self.assertEqual(self.client.get(f'/api/get_next_hint/{token}/').json()["hint"], "Primera pista")
+        self.assertEqual(self.client.get(f'/api/get_next_hint/{token}/').json()["hint"], "Segunda pista")
+
+
+@override_settings(EVENT_LOG_SYNC=True)
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        Challenge.objects.create(location=location, question="¿Color del reciclaje de papel?", correct_answer="Azul", points=15, options=["Azul", "Verde"])
+        self.headers = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def test_recorrido_completo_en_v2(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get('/api/v2/leaderboard/')).status_code, 401)
+
+        response = await client.post('/api/v2/scan-qr/', {"qr_code": "QR-BIB"}, content_type='application/json', headers=self.headers)
+        token = response.json()["token"]
+        response = await client.get(f'/api/v2/get_challenge/{token}/', headers=self.headers)
+        self.assertEqual(response.json()["options"], ["Azul", "Verde"])
+
+        response = await client.post(f'/api/v2/validate_answer/{token}/', {"answer": "azul"}, content_type='application/json', headers=self.headers)
+        self.assertTrue(response.json()["correct"])
+        leaderboard = await Leaderboard.objects.aget(user=self.user)
+        self.assertEqual(leaderboard.total_points, 15)
+
+    def test_ranking_en_vivo_rechaza_wsgi(self):
+        # El cliente síncrono pasa por el handler WSGI, que no puede enviar el stream
+        response = self.client.get('/api/v2/leaderboard/stream/', headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+
+
+@override_settings(EVENT_LOG_SYNC=True, SINGLE_PROCESS=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        self.challenge = Challenge.objects.create(location=self.location, question="¿?", correct_answer="Sí", options=["Sí", "No"])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_ranking_responde_304_sin_consultas_hasta_que_cambia(self):
+        tag = self.client.get('/api/leaderboard/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leaderboard.objects.filter(user=self.user).update(total_points=10)
+            live_ranking.score_changed(self.user.pk, 10)
+        response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+        self.assertNotEqual(self.client.get('/api/leaderboard/?limit=1')['ETag'], response['ETag'])
+
+    def test_desafio_responde_304_hasta_que_cambia_el_contenido(self):
+        token = QRAccessToken.objects.create(user=self.user, location=self.location).token
+        tag = self.client.get(f'/api/get_challenge/{token}/')['ETag']
+        self.assertEqual(self.client.get(f'/api/get_challenge/{token}/', HTTP_IF_NONE_MATCH=tag).status_code, 304)
+
+        self.challenge.question = "¿Nueva?"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.challenge.save()
+        response = self.client.get(f'/api/get_challenge/{token}/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.json()["question"], "¿Nueva?")
+
+    def test_sin_etag_si_los_contadores_son_locales_del_proceso(self):
+        tag = self.client.get('/api/leaderboard/')['ETag']
+        with self.settings(SINGLE_PROCESS=False):
+            response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class SpatialIndexTests(TestCase):
+    def test_coincide_con_la_busqueda_exhaustiva(self):
+        rng = random.Random(7)
+        rows = [(pk, f"P{pk}", -0.21 + rng.uniform(-0.01, 0.01), -78.49 + rng.uniform(-0.01, 0.01)) for pk in range(2000)]
+        index = spatial.SpatialIndex()
+        index.build(rows)
+        # Sin pasar por la BD: la versión ya está al día
+        index._version = (versions.get(versions.LOCATIONS), hunts.active_id())
+
+        exclude = {pk for pk, *_ in rows[:50]}
+        # Centro, borde y un punto fuera del campus
+        for lat, lon in [(-0.21, -78.49), (-0.2195, -78.4805), (-0.3, -78.6)]:
+            x, y = index._project(lat, lon)
+            brute = sorted(
+                (math.hypot(px - x, py - y), pk)
+                for pk, _, plat, plon in rows if pk not in exclude
+                for px, py in [index._project(plat, plon)]
+            )[:5]
+            found = index.nearest(lat, lon, 5, exclude=exclude)
+            self.assertEqual([pk for _, pk, *_ in found], [pk for _, pk in brute])
+
+    def test_endpoint_omite_las_completadas(self):
+        user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        near = Location.objects.create(name="Biblioteca", qr_code="QR-BIB", latitude=-0.2100, longitude=-78.4900)
+        Location.objects.create(name="Cafetería", qr_code="QR-CAF", latitude=-0.2110, longitude=-78.4900)
+        Location.objects.create(name="Sin coordenadas", qr_code="QR-SIN")
+        UserProgress.objects.create(user=user, location=near, completed=True)
+        versions.bump(versions.LOCATIONS)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.get('/api/locations/nearest/?lat=-0.2100&lon=-78.4900&k=5')
+        self.assertEqual([row["name"] for row in response.json()], ["Cafetería"])
+        self.assertAlmostEqual(response.json()[0]["distance"], 111.2, delta=0.5)
+        self.assertEqual(client.get('/api/locations/nearest/?lat=abc&lon=1').status_code, 400)
+
+    def test_reconstruye_periodicamente_sin_caches_coherentes(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura"))
+        url = '/api/locations/nearest/?lat=-0.2100&lon=-78.4900&k=5'
+        versions.bump(versions.LOCATIONS)
+        self.assertEqual(client.get(url).json(), [])
+
+        # Otro proceso agrega la ubicación: la versión local no cambia
+        Location.objects.bulk_create([Location(name="Biblioteca", qr_code="QR-BIB", latitude=-0.2100, longitude=-78.4900)])
+        with self.settings(SPATIAL_INDEX_REBUILD_INTERVAL=None):
+            self.assertEqual(client.get(url).json(), [])
+        with self.settings(SPATIAL_INDEX_REBUILD_INTERVAL=0):
+            self.assertEqual([row["name"] for row in client.get(url).json()], ["Biblioteca"])
+
+
+@override_settings(EVENT_LOG_SYNC=True)
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        Challenge.objects.create(location=self.location, question="¿Año?", correct_answer="1946", points=15, options=[])
+        Hint.objects.create(location=self.location, text="Primera", order=1)
+        Hint.objects.create(location=self.location, text="Segunda", order=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _sync(self, *actions):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/sync/', {"actions": list(actions)}, format='json')
+
+    def test_aplica_el_lote_en_orden_con_la_hora_del_cliente(self):
+        scanned_at = timezone.now() - timedelta(hours=2)
+        response = self._sync(
+            {"id": "a", "type": "answer", "qr_code": "QR-BIB", "answer": "1946"},
+            {"id": "b", "type": "scan", "qr_code": "QR-BIB", "timestamp": scanned_at.isoformat()},
+            {"id": "c", "type": "hint", "qr_code": "QR-BIB", "count": 2},
+            {"id": "d", "type": "answer", "qr_code": "QR-BIB", "answer": "1900"},
+            {"id": "e", "type": "answer", "qr_code": "QR-BIB", "answer": "1946"},
+            {"id": "f", "type": "scan", "qr_code": "QR-NADA"},
+        )
+        results = {result["id"]: result for result in response.json()["results"]}
+
+        # La respuesta previa al escaneo falla, pero no impide aplicar el resto
+        self.assertEqual(results["a"]["error"], "No se encontró progreso.")
+        self.assertEqual([hint["text"] for hint in results["c"]["hints"]], ["Primera", "Segunda"])
+        self.assertEqual((results["d"]["correct"], results["e"]["points"]), (False, 15))
+        self.assertFalse(results["f"]["ok"])
+
+        progress = UserProgress.objects.get(user=self.user, location=self.location)
+        self.assertEqual((progress.completed, progress.current_hint), (True, 3))
+        self.assertEqual(Leaderboard.objects.get(user=self.user).total_points, 15)
+        scan = ParticipationHistory.objects.get(user=self.user, event_type=events.EventType.SCAN)
+        self.assertEqual(scan.timestamp, scanned_at)
+        self.assertEqual(ParticipationHistory.objects.filter(event_type=events.EventType.HINT_TAKEN).count(), 2)
+
+    def test_actualiza_el_progreso_existente(self):
+        UserProgress.objects.create(user=self.user, location=self.location, current_hint=2)
+        future = (timezone.now() + timedelta(days=1)).isoformat()
+        response = self._sync(
+            {"id": 1, "type": "hint", "qr_code": "QR-BIB", "timestamp": future},
+            {"id": 2, "type": "hint", "qr_code": "QR-BIB"},
+        )
+        first, second = response.json()["results"]
+        self.assertEqual(([hint["order"] for hint in first["hints"]], first["remaining"]), ([2], 0))
+        self.assertEqual(second["hints"], [])
+        self.assertEqual(UserProgress.objects.get(user=self.user).current_hint, 3)
+        # Una hora en el futuro se registra como la hora del servidor
+        self.assertLessEqual(ParticipationHistory.objects.get().timestamp, timezone.now())
+
+    def test_rechaza_lotes_invalidos(self):
+        self.assertEqual(self._sync().status_code, 400)
+        with self.settings(OFFLINE_SYNC_MAX_ACTIONS=1):
+            response = self._sync({"type": "scan", "qr_code": "QR-BIB"}, {"type": "scan", "qr_code": "QR-BIB"})
+        self.assertEqual(response.status_code, 400)
+        old = (timezone.now() - timedelta(seconds=settings.OFFLINE_SYNC_MAX_AGE + 60)).isoformat()
+        response = self._sync({"type": "scan", "qr_code": "QR-BIB", "timestamp": old})
+        self.assertFalse(response.json()["results"][0]["ok"])
+        self.assertFalse(UserProgress.objects.exists())
+
+    def test_fecha_imposible_solo_falla_esa_accion(self):
+        response = self._sync(
+            {"id": 1, "type": "scan", "qr_code": "QR-BIB", "timestamp": "2024-02-30T10:00:00"},
+            {"id": 2, "type": "scan", "qr_code": "QR-BIB"},
+        )
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()["results"]
+        self.assertEqual((first["ok"], first["error"]), (False, "Fecha inválida."))
+        self.assertTrue(second["ok"])
+
+    def test_acciones_malformadas_solo_fallan_ellas(self):
+        response = self._sync(
+            "escaneo",
+            {"id": 2, "type": "scan", "qr_code": ["QR-BIB"]},
+            {"id": 3, "type": "scan", "qr_code": {"code": "QR-BIB"}},
+            {"id": 4, "type": ["scan"], "qr_code": "QR-BIB"},
+            {"id": 5, "type": "scan", "qr_code": "QR-BIB"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["ok"] for result in response.json()["results"]], [False, False, False, False, True])
+        self.assertEqual(UserProgress.objects.get(user=self.user).location, self.location)
+
+
+@override_settings(EVENT_LOG_SYNC=True)
+class HuntTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        # Los procesos guardan la búsqueda activa: que la próxima prueba la vuelva a leer
+        self.addCleanup(hunts.changed)
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.other = CustomUser.objects.create_user("otro@puce.edu.ec", "Luis", "Mora", "clave-segura")
+        self.old_location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        with self.captureOnCommitCallbacks(execute=True):
+            award_completion(self.user, self.old_location.id, 10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _start(self, name):
+        hunt = Hunt.objects.create(name=name)
+        location = Location.objects.create(name=f"Cafetería {name}", qr_code=f"QR-{name}", hunt=hunt)
+        Challenge.objects.create(location=location, question="¿?", correct_answer="Sí", points=15, options=[])
+        with self.captureOnCommitCallbacks(execute=True):
+            hunts.activate(hunt)
+        return hunt, location
+
+    def test_la_busqueda_activa_tiene_su_propio_ranking(self):
+        hunt, location = self._start("2027-1")
+        self.assertEqual(self.client.post('/api/scan-qr/', {"qr_code": "QR-BIB"}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/scan-qr/', {"qr_code": location.qr_code}, format='json').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            award_completion(self.user, location.id, 15)
+
+        self.assertEqual(UserProgress.objects.get(location=location).hunt, hunt)
+        self.assertEqual(Leaderboard.objects.get(user=self.user, hunt=None).total_points, 10)
+        results = self.client.get('/api/leaderboard/').json()["results"]
+        self.assertEqual([(row["email"], row["points"]) for row in results],
+                         [("jugador@puce.edu.ec", 15), ("otro@puce.edu.ec", 0)])
+        self.assertEqual(self.client.get('/api/user-data/').json()["points"], 15)
+
+    def test_el_resumen_se_recalcula_al_leerlo_en_la_nueva_busqueda(self):
+        self.assertEqual(self.client.get('/api/user-data/').json()["completed_count"], 1)
+        hunt, _ = self._start("2027-1")
+        # Activar no recalcula los resúmenes en bloque
+        self.assertIsNone(UserSummary.objects.get(pk=self.user.pk).hunt_id)
+
+        data = self.client.get('/api/user-data/').json()
+        self.assertEqual((data["points"], data["completed_count"], data["current_location"]), (0, 0, None))
+        self.assertEqual(UserSummary.objects.get(pk=self.user.pk).hunt, hunt)
+
+    def test_el_mismo_qr_se_reutiliza_en_otra_busqueda(self):
+        hunt, _ = self._start("2027-1")
+        reused = Location.objects.create(name="Biblioteca", qr_code="QR-BIB", hunt=hunt)
+        response = self.client.post('/api/scan-qr/', {"qr_code": "QR-BIB"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProgress.objects.get(user=self.user, hunt=hunt).location, reused)
+        self.assertEqual(content_cache.get_bundles_by_qr(["QR-BIB"])["QR-BIB"]["id"], reused.id)
+
+    def test_otro_proceso_activa_una_busqueda(self):
+        hunt = Hunt.objects.create(name="2027-1")
+        hunts.changed()
+        self.assertIsNone(hunts.active_id())
+        # Activada desde otro proceso cuya versión 'hunts' no llega a este
+        Hunt.objects.filter(pk=hunt.pk).update(is_active=True)
+        with self.settings(ACTIVE_HUNT_CACHE_TTL=None):
+            self.assertIsNone(hunts.active_id())
+        with self.settings(ACTIVE_HUNT_CACHE_TTL=0):
+            self.assertEqual(hunts.active_id(), hunt.pk)
+
+    def test_archivar_mueve_las_filas_y_conserva_el_ranking(self):
+        first, location = self._start("2027-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            award_completion(self.other, location.id, 15)
+        second, _ = self._start("2027-2")
+        with self.assertRaises(hunts.HuntError):
+            hunts.archive(second)
+
+        out = io.StringIO()
+        call_command('archive_hunts', batch_size=1, stdout=out)
+        self.assertIn("leaderboard: 2, progress: 1, participation: 1", out.getvalue())
+        self.assertFalse(Leaderboard.objects.filter(hunt=first).exists())
+        self.assertEqual(ArchivedProgress.objects.get(hunt=first).points_earned, 15)
+        # El espacio por defecto y la búsqueda activa no se tocan
+        self.assertEqual(Leaderboard.objects.filter(hunt=None).count(), 2)
+
+        page = self.client.get(f'/api/hunts/{first.pk}/leaderboard/?limit=1').json()
+        self.assertEqual((page["results"][0]["email"], page["results"][0]["rank"]), ("otro@puce.edu.ec", 1))
+        page = self.client.get(f'/api/hunts/{first.pk}/leaderboard/?cursor={page["next_cursor"]}').json()
+        self.assertEqual([(row["email"], row["rank"]) for row in page["results"]], [("jugador@puce.edu.ec", 2)])
+
+
+class LiveRankingTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        self.first = CustomUser.objects.create_user("primero@puce.edu.ec", "Luis", "Mora", "clave-segura")
+        self.second = CustomUser.objects.create_user("segundo@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        Leaderboard.objects.filter(user=self.first).update(total_points=20)
+        rank_cache.rebuild()
+
+    async def test_publica_un_delta_por_cambio_a_cada_suscriptor(self):
+        queues = [live_ranking.broadcaster.subscribe() for _ in range(3)]
+        try:
+            await sync_to_async(live_ranking.score_changed)(self.second.id, 30)
+            for queue in queues:
+                message = await asyncio.wait_for(queue.get(), 1)
+                event, data = message.strip().split('\n')
+                self.assertEqual(event, "event: delta")
+                delta = json.loads(data[len("data: "):])
+                self.assertEqual((delta["email"], delta["rank"], delta["previous_rank"], delta["points"]),
+                                 ("segundo@puce.edu.ec", 1, 2, 30))
+        finally:
+            for queue in queues:
+                live_ranking.broadcaster.unsubscribe(queue)
+
+    async def test_cliente_atrasado_recibe_snapshot(self):
+        with self.settings(LIVE_RANKING_QUEUE_SIZE=1):
+            queue = live_ranking.broadcaster.subscribe()
+        try:
+            live_ranking.broadcaster.publish("uno")
+            live_ranking.broadcaster.publish("dos")
+            await asyncio.sleep(0)
+            self.assertIs(await queue.get(), live_ranking.RESYNC)
+        finally:
+            live_ranking.broadcaster.unsubscribe(queue)
+
+
+@override_settings(REQUEST_STATS_ENABLED=True)
+class RequestStatsTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.staff = CustomUser.objects.create_user("admin@puce.edu.ec", "Admin", "PUCE", "clave-segura")
+        CustomUser.objects.filter(pk=self.staff.pk).update(is_staff=True)
+        self.staff.refresh_from_db()
+        self.client = APIClient()
+
+    def test_server_timing_y_estadisticas_por_endpoint(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/user-data/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", total;dur=[\d.]+$')
+
+        self.assertEqual(self.client.get('/api/stats/requests/').status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        stats = self.client.get('/api/stats/requests/').json()
+        self.assertEqual(stats["user-data"]["requests"], 1)
+        self.assertEqual(stats["user-data"]["queries_avg"], stats["user-data"]["queries_total"])
+
+    def test_detecta_consultas_duplicadas(self):
+        recorder = instrumentation.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for _ in range(3):
+                list(Location.objects.filter(pk=1))
+            list(Location.objects.filter(pk=2))
+        self.assertEqual(recorder.count, 4)
+        self.assertEqual(recorder.duplicates()[0], 2)
+        self.assertEqual(recorder.similar(), 3)
+
+
+@override_settings(EVENT_LOG_SYNC=True)
+class UserSummaryTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.rival = CustomUser.objects.create_user("rival@puce.edu.ec", "Luis", "Mora", "clave-segura")
+        Leaderboard.objects.filter(user=self.rival).update(total_points=5)
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        Challenge.objects.create(location=self.location, question="¿?", correct_answer="Azul", points=10, options=["Azul"])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_resumen_mantenido_y_reconstruido_coinciden(self):
+        token = self.client.post('/api/scan-qr/', {"qr_code": "QR-BIB"}, format='json').json()["token"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/validate_answer/{token}/', {"answer": "Azul"}, format='json')
+
+        with self.settings(RANKING_CACHE_ENABLED=False), self.assertNumQueries(1):
+            data = self.client.get('/api/user-data/').json()
+        self.assertEqual((data["points"], data["rank"], data["completed_count"]), (10, 1, 1))
+        self.assertEqual(data["current_location"], {"id": self.location.id, "name": "Biblioteca"})
+
+        fields = ('total_points', 'completed_count', 'current_location_id', 'rank_snapshot')
+        maintained = UserSummary.objects.filter(pk=self.user.pk).values_list(*fields).get()
+        UserSummary.objects.all().delete()
+        self.assertEqual(summaries.rebuild(batch_size=1), 2)
+        self.assertEqual(UserSummary.objects.filter(pk=self.user.pk).values_list(*fields).get(), maintained)
+
+
+@override_settings(EVENT_LOG_SYNC=True, ANALYTICS_SAFETY_LAG=0)
+class LocationStatsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        Location.objects.create(name="Cafetería", qr_code="QR-CAF")
+
+    def _record(self, *events_):
+        for event_type, value in events_:
+            events.record(self.user.id, self.location.id, event_type, value)
+
+    def test_solo_procesa_los_eventos_nuevos(self):
+        EventType = ParticipationHistory.EventType
+        self._record((EventType.SCAN, None), (EventType.ANSWER_ATTEMPT, 0), (EventType.HINT_TAKEN, 1))
+        self.assertEqual(analytics.aggregate(batch_size=2), 3)
+        self._record((EventType.SCAN, None), (EventType.ANSWER_ATTEMPT, 1), (EventType.COMPLETION, 10))
+        self.assertEqual(analytics.aggregate(), 3)
+        self.assertEqual(analytics.aggregate(), 0)
+
+        maintained = analytics.report()
+        first = maintained[0]
+        self.assertEqual((first["scans"], first["completions"], first["answer_accuracy"]), (2, 1, 0.5))
+        self.assertEqual((first["average_hints"], first["points_distribution"]), (0.5, {"10": 1}))
+        self.assertEqual(maintained[1]["scans"], 0)
+
+        analytics.rebuild()
+        self.assertEqual(analytics.report(), maintained)
+
+    @override_settings(ANALYTICS_SAFETY_LAG=60)
+    def test_no_avanza_la_marca_sobre_eventos_recientes(self):
+        EventType = ParticipationHistory.EventType
+        self._record((EventType.SCAN, None), (EventType.SCAN, None), (EventType.SCAN, None))
+        first, second, third = ParticipationHistory.objects.order_by('pk')
+        old = timezone.now() - timedelta(minutes=5)
+        # El segundo se acaba de confirmar: el tercero, aunque antiguo, espera detrás de él
+        ParticipationHistory.objects.filter(pk__in=[first.pk, third.pk]).update(recorded_at=old)
+        self.assertEqual(analytics.aggregate(), 1)
+        self.assertEqual(AnalyticsCursor.objects.get(name=analytics.CURSOR).last_event_id, first.pk)
+
+        ParticipationHistory.objects.filter(pk=second.pk).update(recorded_at=old)
+        self.assertEqual(analytics.aggregate(), 2)
+        self.assertEqual(analytics.report()[0]["scans"], 3)
+
+    def test_informe_de_la_busqueda_activa_o_indicada(self):
+        hunt = Hunt.objects.create(name="Otra búsqueda", is_active=False)
+        Location.objects.create(name="Rectorado", qr_code="QR-REC", hunt=hunt)
+        self.assertEqual([row["location"]["name"] for row in analytics.report()], ["Biblioteca", "Cafetería"])
+        self.assertEqual([row["location"]["name"] for row in analytics.report(hunt.pk)], ["Rectorado"])
+
+        staff = CustomUser.objects.create_user("admin@puce.edu.ec", "Admin", "PUCE", "clave-segura")
+        CustomUser.objects.filter(pk=staff.pk).update(is_staff=True)
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.get(pk=staff.pk))
+        response = client.get(f'/api/stats/locations/?hunt={hunt.pk}')
+        self.assertEqual([row["location"]["name"] for row in response.json()], ["Rectorado"])
+        self.assertEqual(client.get('/api/stats/locations/?hunt=abc').status_code, 400)
+
+
+# SQLite >= 3.35 también tiene UPDATE ... RETURNING
+@override_settings(EVENT_LOG_SYNC=True, QR_TOKEN_MODE='signed', HINTS_UPDATE_RETURNING=True)
+class HintBatchTests(TestCase):
+    def setUp(self):
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        for order in (1, 2, 3):
+            Hint.objects.create(location=self.location, text=f"Pista {order}", order=order)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.token = self.client.post('/api/scan-qr/', {"qr_code": "QR-BIB"}, format='json').json()["token"]
+
+    def test_lote_de_pistas_con_una_sola_escritura(self):
+        self.client.get(f'/api/get_next_hint/{self.token}/')
+
+        # Con la caché caliente y token firmado: el UPDATE ... RETURNING y un evento por pista
+        with self.assertNumQueries(3):
+            data = self.client.get(f'/api/get_next_hint/{self.token}/?count=5').json()
+        self.assertEqual([hint["order"] for hint in data["hints"]], [2, 3])
+        self.assertEqual((data["hint"], data["remaining"]), ("Pista 2", 0))
+
+        data = self.client.get(f'/api/get_next_hint/{self.token}/').json()
+        self.assertEqual(data["message"], "No hay más pistas disponibles para esta ubicación.")
+        self.assertEqual(self.client.get(f'/api/get_next_hint/{self.token}/?count=99').status_code, 400)
+
+    @override_settings(HINTS_UPDATE_RETURNING=False)
+    def test_sin_returning_bloquea_la_fila(self):
+        data = self.client.get(f'/api/get_next_hint/{self.token}/?count=2').json()
+        self.assertEqual([hint["order"] for hint in data["hints"]], [1, 2])
+        data = self.client.get(f'/api/get_next_hint/{self.token}/?count=2').json()
+        self.assertEqual(([hint["order"] for hint in data["hints"]], data["remaining"]), ([3], 0))
+        data = self.client.get(f'/api/get_next_hint/{self.token}/').json()
+        self.assertEqual(data["message"], "No hay más pistas disponibles para esta ubicación.")
+
+
+class QRTokenTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.other = CustomUser.objects.create_user("otro@puce.edu.ec", "Luis", "Mora", "clave-segura")
+        self.location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+
+    def test_token_ligado_al_usuario_en_ambos_modos(self):
+        for mode in ('database', 'signed'):
+            with self.subTest(mode=mode), override_settings(QR_TOKEN_MODE=mode):
+                token = qr_tokens.issue(self.user, self.location.id)
+                self.assertEqual(qr_tokens.resolve(token, self.user), self.location.id)
+                with self.assertRaises(qr_tokens.TokenForbidden):
+                    qr_tokens.resolve(token, self.other)
+
+    @override_settings(QR_TOKEN_MODE='signed')
+    def test_token_firmado_sin_consultas_y_con_expiracion(self):
+        token = qr_tokens.issue(self.user, self.location.id)
+        with self.assertNumQueries(0):
+            qr_tokens.resolve(token, self.user)
+
+        with self.assertRaises(qr_tokens.TokenInvalid):
+            qr_tokens.resolve(token[:-1] + ('A' if token[-1] != 'A' else 'B'), self.user)
+        with override_settings(QR_TOKEN_LIFETIME=timedelta(seconds=-1)):
+            expired = qr_tokens.issue(self.user, self.location.id)
+        with self.assertRaises(qr_tokens.TokenExpired):
+            qr_tokens.resolve(expired, self.user)
+
+
+class TokenSweepTests(TestCase):
+    def test_borra_solo_los_expirados_por_lotes(self):
+        user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        expired = timezone.now() - timedelta(minutes=1)
+        QRAccessToken.objects.bulk_create([QRAccessToken(user=user, location=location, expires_at=expired) for _ in range(5)])
+        valid = QRAccessToken.objects.create(user=user, location=location)
+
+        deleted, _ = token_maintenance.sweep_expired(batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(list(QRAccessToken.objects.values_list('pk', flat=True)), [valid.pk])
+
+
+class RefreshTokenRotationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+
+    def test_un_refresh_token_solo_se_usa_una_vez(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        response = self.client.post('/api/token/refresh/', {"refresh": refresh}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()["refresh"]
+
+        response = self.client.post('/api/token/refresh/', {"refresh": refresh}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/api/token/refresh/', {"refresh": rotated}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_un_usuario_desactivado_no_puede_refrescar(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/api/token/refresh/', {"refresh": refresh}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(RevokedRefreshToken.objects.exists())
+
+    def test_purga_solo_los_expirados(self):
+        now = timezone.now()
+        RevokedRefreshToken.objects.bulk_create(
+            [RevokedRefreshToken(jti=f"viejo{i}", expires_at=now - timedelta(minutes=1)) for i in range(5)]
+            + [RevokedRefreshToken(jti="vigente", expires_at=now + timedelta(days=1))]
+        )
+
+        deleted, _ = refresh_tokens.purge_expired(batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        self.assertEqual(list(RevokedRefreshToken.objects.values_list('pk', flat=True)), ["vigente"])
+
+
+@override_settings(EVENT_LOG_FLUSH_INTERVAL=3600)
+class EventBufferTests(TestCase):
+    def test_encola_sin_consultas_y_escribe_por_lotes(self):
+        user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        buffer = events.EventBuffer()
+
+        with self.assertNumQueries(0):
+            buffer.record(user.id, location.id, events.EventType.SCAN)
+            buffer.record(user.id, location.id, events.EventType.HINT_TAKEN, 1)
+        # Un INSERT; dentro de la transacción de la prueba, el atomic() del lote agrega SAVEPOINT y RELEASE
+        with self.assertNumQueries(3):
+            self.assertEqual(buffer.flush(), 2)
+        buffer.shutdown()
+
+        self.assertEqual(
+            list(ParticipationHistory.objects.order_by('pk').values_list('event_type', 'value')),
+            [(events.EventType.SCAN, None), (events.EventType.HINT_TAKEN, 1)],
+        )
+
+
+    @override_settings(EVENT_LOG_MAX_RETRIES=1, EVENT_LOG_MAX_PENDING=3)
+    def test_reintenta_un_lote_y_luego_descarta_solo_las_filas_invalidas(self):
+        user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        location = Location.objects.create(name="Biblioteca", qr_code="QR-BIB")
+        buffer = events.EventBuffer()
+        self.addCleanup(buffer.shutdown)
+
+        buffer.record(user.id, location.id, events.EventType.SCAN)
+        buffer.record(user.id, location.id, -1)  # Viola el CHECK de event_type
+        with self.assertLogs('api.events', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending(), 2)
+
+        # El buffer está acotado: el cuarto evento no cabe
+        buffer.record(user.id, location.id, events.EventType.HINT_TAKEN, 1)
+        buffer.record(user.id, location.id, events.EventType.HINT_TAKEN, 2)
+        self.assertEqual((buffer.pending(), buffer.dropped()), (3, 1))
+
+        with self.assertLogs('api.events', 'WARNING'):
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual((buffer.pending(), buffer.dropped()), (0, 2))
+        self.assertEqual(
+            list(ParticipationHistory.objects.order_by('pk').values_list('event_type', 'value')),
+            [(events.EventType.SCAN, None), (events.EventType.HINT_TAKEN, 1)],
+        )
+
+class ContentImportExportTests(TestCase):
+    records = [
+        {
+            "name": "Biblioteca",
+            "description": "Planta baja",
+            "qr_code": "QR-BIB",
+            "latitude": -0.2101,
+            "longitude": -78.4902,
+            "challenge": {"question": "¿Qué se recicla en el contenedor azul?", "correct_answer": "Papel", "points": 15, "options": ["Papel", "Vidrio"]},
+            "hints": [{"order": 1, "text": "Busca junto a la entrada"}, {"order": 2, "text": "Es de color azul"}],
+        },
+        {"name": "Cafetería", "description": None, "qr_code": "QR-CAF", "hints": []},
+    ]
+
+    def test_importar_y_exportar_es_idempotente(self):
+        for fmt in ('jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                stream = io.StringIO()
+                content_io.write_records(self.records, stream, fmt)
+                stream.seek(0)
+                content_io.import_records(content_io.read_records(stream, fmt))
+
+                self.assertEqual(list(content_io.iter_records()), self.records)
+                self.assertEqual(Challenge.objects.count(), 1)
+                self.assertEqual(Hint.objects.count(), 2)
+
+    def test_rechaza_campos_con_tipo_incorrecto(self):
+        for field, value, message in (("challenge", "¿?", "'challenge' debe ser un objeto."),
+                                      ("challenge", ["¿?"], "'challenge' debe ser un objeto."),
+                                      ("hints", 3, "'hints' debe ser una lista."),
+                                      ("qr_code", ["QR-1"], "'qr_code' debe ser un texto."),
+                                      ("name", {"es": "Biblioteca"}, "'name' debe ser un texto."),
+                                      ("description", 7, "'description' debe ser un texto.")):
+            with self.subTest(field=field, value=value):
+                with self.assertRaisesMessage(content_io.ContentError, f"Línea 2: {message}"):
+                    content_io.import_records([(1, self.records[1]), (2, dict(self.records[0], **{field: value}))])
+        self.assertFalse(Location.objects.exists())
+
+    def test_rechaza_pistas_con_orden_repetido_sin_escribir(self):
+        record = dict(self.records[0], hints=[{"order": 1, "text": "a"}, {"order": 1, "text": "b"}])
+        with self.assertRaises(content_io.ContentError):
+            content_io.import_records([(1, self.records[1]), (2, record)])
+        self.assertFalse(Location.objects.exists())
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Decisiones del router con un alias de réplica configurado. Es TransactionTestCase
+    porque dentro de la transacción de TestCase todo se lee de 'default'.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.router = db_routers.ReplicaRouter()
+        cache.clear()
+
+    def test_sin_replica_no_enruta(self):
+        self.assertIsNone(self.router.db_for_read(Location))
+        self.assertIsNone(self.router.db_for_write(Location))
+
+    @override_settings(DATABASE_REPLICA_ALIAS='replica')
+    def test_contenido_en_la_replica_salvo_tras_un_cambio(self):
+        self.assertEqual(self.router.db_for_read(Location), 'replica')
+        self.assertEqual(self.router.db_for_read(Leaderboard), 'default')
+        content_cache.invalidate(1)
+        self.assertEqual(self.router.db_for_read(Hint), 'default')
+
+    @override_settings(DATABASE_REPLICA_ALIAS='replica')
+    def test_vistas_de_lectura_leen_sus_propias_escrituras(self):
+        @db_routers.replica_reads
+        def view(request):
+            return self.router.db_for_read(Leaderboard)
+
+        request = RequestFactory().get('/api/leaderboard/')
+        request.user = self.user
+        self.assertEqual(view(request), 'replica')
+        summaries.record_scan(self.user.pk, None)
+        self.assertEqual(view(request), 'default')
+        self.assertEqual(self.router.db_for_write(Leaderboard), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'api'))
+
+    def test_dentro_de_una_transaccion_lee_de_la_base_principal(self):
+        with override_settings(DATABASE_REPLICA_ALIAS='replica'), transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Location), 'default')
+
+    @contextlib.contextmanager
+    def _lagging_replica(self):
+        """
+        Segundo alias real: un SQLite aparte con el esquema del contenido y sin
+        datos, como una réplica que aún no recibe los cambios. El alias no existía
+        al preparar la clase, así que se permite solo mientras dura la réplica.
+        """
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+        })['replica']
+        try:
+            with mock.patch.object(type(self), 'databases', {'default', 'replica'}), \
+                    override_settings(DATABASE_REPLICA_ALIAS='replica'):
+                with connections['replica'].schema_editor() as editor:
+                    for model in (Hunt, Location, Challenge, Hint):
+                        editor.create_model(model)
+                yield
+        finally:
+            connections['replica'].close()
+            del connections['replica']
+            del connections.settings['replica']
+            os.remove(path)
+
+    def test_importar_contenido_con_una_replica_atrasada(self):
+        record = {"name": "Biblioteca", "description": "", "qr_code": "QR-1",
+                  "challenge": {"question": "¿?", "correct_answer": "Sí"}, "hints": [{"order": 1, "text": "a"}]}
+        with self._lagging_replica():
+            self.assertEqual(content_io.import_records([(1, record)]), (1, 1, 1))
+            # Reimportar encuentra la ubicación existente en la base principal
+            self.assertEqual(content_io.import_records([(1, dict(record, description="Nueva"))]), (1, 0, 1))
+
+            cache.clear()
+            # Fuera de una transacción el contenido se lee de la réplica, que aún no lo tiene
+            self.assertFalse(Location.objects.exists())
+            self.assertEqual(Location.objects.using('default').get().description, "Nueva")
+
+
+class ResultsExportTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user("admin@puce.edu.ec", "Admin", "PUCE", "clave-segura")
+        CustomUser.objects.filter(pk=self.staff.pk).update(is_staff=True)
+        self.player = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        Leaderboard.objects.filter(user=self.player).update(total_points=30)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.staff)}")
+
+    def test_ranking_en_csv_y_jsonl(self):
+        response = self.client.get('/api/export/leaderboard/?output=csv')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "rank,user_id,email,first_name,last_name,total_points")
+        self.assertEqual(lines[1], f"1,{self.player.pk},jugador@puce.edu.ec,Ana,Pérez,30")
+
+        response = self.client.get('/api/export/leaderboard/?output=jsonl')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["rank"] for row in rows], [1, 2])
+
+    def test_solo_staff(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.player)}")
+        self.assertEqual(self.client.get('/api/export/progress/').status_code, 403)
+
+
+class BenchmarkTests(TestCase):
+    def test_percentiles_por_rango_mas_cercano(self):
+        values = list(range(1, 101))
+        self.assertEqual([benchmark.percentile(values, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(benchmark.percentile([7], 99), 7)
+
+    def test_recorridos_sin_errores(self):
+        results = benchmark.run(users=5, locations=4, visits=2, workers=1)
+
+        self.assertEqual(results["total"]["errors"], 0)
+        self.assertEqual(results["endpoints"]["scan_qr_code"]["requests"], 10)
+        self.assertEqual(results["endpoints"]["update_user_progress"]["requests"], 10)
+        self.assertEqual(results["meta"]["users"], 5)
+
+
+@override_settings(PASSWORD_HASHERS=['api.hashers.ConfigurablePBKDF2PasswordHasher'], PASSWORD_PBKDF2_ITERATIONS=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.body = {"email": "jugador@puce.edu.ec", "password": "clave-segura"}
+
+    def test_login_solo_jwt_sin_sesion(self):
+        response = self.client.post('/api/login/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access_token", response.json())
+        self.assertFalse(Session.objects.exists())
+
+        response = self.client.post('/api/login/', {**self.body, "password": "otra"}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_login_actualiza_last_login_y_avisa_los_fallidos(self):
+        failed = []
+
+        def on_failed(sender, credentials, **kwargs):
+            failed.append(credentials)
+        user_login_failed.connect(on_failed)
+        self.addCleanup(user_login_failed.disconnect, on_failed)
+
+        self.assertEqual(self.client.post('/api/login/', self.body, content_type='application/json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.client.post('/api/login/', {**self.body, "password": "otra"}, content_type='application/json')
+        self.assertEqual(failed, [{"email": "jugador@puce.edu.ec"}])
+
+    def test_rehash_al_cambiar_el_costo(self):
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.client.post('/api/login/', self.body, content_type='application/json').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+
+    async def test_login_asincrono(self):
+        client = AsyncClient()
+        response = await client.post('/api/v2/login/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("refresh_token", response.json())
+
+
+class AuthUserCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_no_consulta_el_usuario_en_cada_solicitud(self):
+        self.client.get('/api/user-data/')
+        # Solo la lectura del resumen
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/user-data/').status_code, 200)
+
+    def test_desactivar_invalida_la_cache(self):
+        self.assertEqual(self.client.get('/api/user-data/').status_code, 200)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get('/api/user-data/').status_code, 401)
+
+    @override_settings(CACHES_COHERENT=True)
+    def test_la_invalidacion_de_otro_proceso_llega_por_la_version_compartida(self):
+        self.assertEqual(self.client.get('/api/user-data/').status_code, 200)
+        # Otro proceso desactiva al usuario: aquí solo cambia la versión compartida
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/user-data/').status_code, 200)
+        versions.bump(versions.user_key(self.user.pk))
+        self.assertEqual(self.client.get('/api/user-data/').status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_SIZE=2)
+    def test_desaloja_el_menos_usado(self):
+        for user_id in (1, 2, 3):
+            user_cache.put(user_id, self.user)
+        self.assertIsNone(user_cache.get(1))
+        self.assertEqual(len(user_cache), 2)
+
+
+@override_settings(RANKING_CACHE_REBUILD_INTERVAL=None)
+class LeaderboardPaginationTests(TestCase):
+    """
+    Paginación por cursor y ventana ?around=me, desde la caché del ranking y desde la BD.
+    """
+
+    def setUp(self):
+        rank_cache.reset()
+        self.users = []
+        # Tres empatados en 20 puntos: se ordenan por id de usuario
+        for n, points in enumerate((20, 30, 20, 10, 20)):
+            user = CustomUser.objects.create_user(f"jugador{n}@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+            Leaderboard.objects.filter(user=user).update(total_points=points)
+            self.users.append(user)
+        self.expected = [
+            ("jugador1@puce.edu.ec", 1, 30), ("jugador0@puce.edu.ec", 2, 20), ("jugador2@puce.edu.ec", 3, 20),
+            ("jugador4@puce.edu.ec", 4, 20), ("jugador3@puce.edu.ec", 5, 10),
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[2])
+
+    def _paths(self):
+        for enabled in (True, False):
+            with self.subTest(cache=enabled), self.settings(RANKING_CACHE_ENABLED=enabled):
+                yield
+
+    def test_recorre_el_ranking_por_cursor_a_traves_de_empates(self):
+        for _ in self._paths():
+            rows, url, pages = [], '/api/leaderboard/?limit=2', 0
+            while url:
+                page = self.client.get(url).json()
+                rows += [(row["email"], row["rank"], row["points"]) for row in page["results"]]
+                url = f'/api/leaderboard/?limit=2&cursor={page["next_cursor"]}' if page["next_cursor"] else None
+                pages += 1
+            self.assertEqual(rows, self.expected)
+            self.assertEqual(pages, 3)
+
+    def test_cursor_invalido(self):
+        for _ in self._paths():
+            for cursor in ("no-es-un-cursor", base64.urlsafe_b64encode(b"a:b:c").decode()):
+                response = self.client.get(f'/api/leaderboard/?cursor={cursor}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_ventana_alrededor_del_usuario(self):
+        for _ in self._paths():
+            window = self.client.get('/api/leaderboard/?around=me&size=1').json()
+            self.assertEqual(window["rank"], 3)
+            self.assertEqual([(row["email"], row["rank"], row["points"]) for row in window["results"]], self.expected[1:4])
+
+            # En el primer lugar no hay vecinos por arriba
+            self.client.force_authenticate(self.users[1])
+            window = self.client.get('/api/leaderboard/?around=me&size=2').json()
+            self.assertEqual([row["rank"] for row in window["results"]], [1, 2, 3])
+            self.client.force_authenticate(self.users[2])
+
+
+@override_settings(RANKING_CACHE_SHARED=False, RANKING_CACHE_REBUILD_INTERVAL=None)
+class RankCacheTests(TestCase):
+    def setUp(self):
+        rank_cache.reset()
+        self.users = [
+            CustomUser.objects.create_user(f"jugador{n}@puce.edu.ec", "Ana", "Pérez", "clave-segura") for n in range(3)
+        ]
+        self.ids = [user.id for user in self.users]
+        for user_id, points in zip(self.ids, (10, 10, 5)):
+            Leaderboard.objects.filter(user_id=user_id).update(total_points=points)
+        rank_cache.rebuild()
+
+    def test_update_ordena_los_empates_por_usuario(self):
+        a, b, c = self.ids
+        rank_cache.update(c, 10)
+        self.assertEqual(rank_cache.slice(0, 3), [(a, 10), (b, 10), (c, 10)])
+        rank_cache.update(a, 4)
+        self.assertEqual(rank_cache.slice(0, 3), [(b, 10), (c, 10), (a, 4)])
+        self.assertEqual(rank_cache.rank_of(c), (2, 10))
+        # La página siguiente al empate empieza justo después de la fila del cursor
+        start, rows = rank_cache.page(2, after=(10, b))
+        self.assertEqual((start, rows), (1, [(c, 10), (a, 4)]))
+
+    def test_rank_for_no_cuenta_la_fila_actual_del_usuario(self):
+        a, b, c = self.ids
+        # Sube: de tercero a primero, por delante de los empatados con más puntos
+        self.assertEqual(rank_cache.rank_for(c, 11), 1)
+        # Empata: queda detrás de los usuarios con id menor
+        self.assertEqual(rank_cache.rank_for(c, 10), 3)
+        # Baja: de primero a último sin contarse a sí mismo
+        self.assertEqual(rank_cache.rank_for(a, 0), 3)
+        self.assertEqual(rank_cache.rank_for(a, 10), 1)
+        # La caché no cambia
+        self.assertEqual(rank_cache.rank_of(a), (1, 10))
+
+    def test_reconstruye_periodicamente_sin_publicacion_compartida(self):
+        a = self.ids[0]
+        Leaderboard.objects.filter(user_id=a).update(total_points=50)
+        self.assertEqual(rank_cache.rank_of(a), (1, 10))
+        with self.settings(RANKING_CACHE_REBUILD_INTERVAL=0):
+            self.assertEqual(rank_cache.rank_of(a), (1, 50))
+
+    @override_settings(RANKING_CACHE_SHARED=True, RANKING_CACHE_GAP_TIMEOUT=3600)
+    def test_sync_aplica_deltas_y_reconstruye_si_falta_uno(self):
+        a, b, c = self.ids
+        backend = caches[settings.RANKING_CACHE_ALIAS]
+        backend.delete(SEQ_KEY)
+        rank_cache.rebuild()
+
+        # Otro proceso publica un cambio
+        backend.set(SEQ_KEY, 1, timeout=None)
+        backend.set(DELTA_KEY.format(1), (c, 30), timeout=None)
+        self.assertEqual(rank_cache.rank_of(c), (1, 30))
+
+        # El delta 2 aún no se escribe: el 3 espera a que el hueco se llene
+        Leaderboard.objects.filter(user_id=b).update(total_points=40)
+        backend.set(SEQ_KEY, 3, timeout=None)
+        backend.set(DELTA_KEY.format(3), (a, 20), timeout=None)
+        self.assertEqual(rank_cache.rank_of(a), (2, 10))
+        self.assertEqual(rank_cache.rank_of(a), (2, 10))
+
+        # Si el hueco persiste, el cambio se perdió y se reconstruye desde la BD
+        with self.settings(RANKING_CACHE_GAP_TIMEOUT=0):
+            self.assertEqual(rank_cache.rank_of(b), (1, 40))
+        self.assertEqual(rank_cache.rank_of(c), (3, 5))
+        backend.delete_many([SEQ_KEY, DELTA_KEY.format(1), DELTA_KEY.format(3)])
+
+    def test_consistencia_del_ranking_y_reconstruccion_solicitada(self):
+        staff = CustomUser.objects.create_user("admin@puce.edu.ec", "Admin", "PUCE", "clave-segura")
+        CustomUser.objects.filter(pk=staff.pk).update(is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(staff)}")
+        rank_cache.rebuild()
+        response = self.client.get('/api/stats/ranking/')
+        self.assertEqual(response.json(), {"consistent": True, "count": 0, "mismatches": []})
+
+        rank_cache._apply(self.ids[2], 99)
+        response = self.client.get('/api/stats/ranking/')
+        self.assertEqual(response.json()["mismatches"], [{"user_id": self.ids[2], "cached": 99, "stored": 5}])
+
+        # Sin una caché compartida los procesos servidor no reciben el aviso
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ranking', stdout=io.StringIO())
+        with self.settings(CACHES_COHERENT=True):
+            call_command('rebuild_ranking', stdout=io.StringIO())
+        # Cualquier proceso que lea la caché ve la nueva generación y se reconstruye
+        self.assertEqual(rank_cache.rank_of(self.ids[2]), (3, 5))
+        self.assertTrue(self.client.get('/api/stats/ranking/').json()["consistent"])
+
+
+# Los presupuestos son los de PostgreSQL: las pistas usan UPDATE ... RETURNING también en SQLite
+@override_settings(EVENT_LOG_SYNC=True, REQUEST_STATS_ENABLED=True, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   RANKING_CACHE_REBUILD_INTERVAL=None, SPATIAL_INDEX_REBUILD_INTERVAL=None, ACTIVE_HUNT_CACHE_TTL=None,
+                   HINTS_UPDATE_RETURNING=True)
+class QueryBudgetTests(TestCase):
+    """
+    Ejecuta cada vista de api/urls.py con 10, 1.000 y 100.000 filas en el ranking:
+    no debe exceder su @query_budget ni hacer más consultas cuando la tabla crece.
+    """
+    SIZES = (10, 1000, 100000)
+
+    def setUp(self):
+        rank_cache.reset()
+        caches[settings.CONTENT_CACHE_ALIAS].clear()
+        self.user = CustomUser.objects.create_user("jugador@puce.edu.ec", "Ana", "Pérez", "clave-segura")
+        self.staff = CustomUser.objects.create_user("admin@puce.edu.ec", "Admin", "PUCE", "clave-segura")
+        CustomUser.objects.filter(pk=self.staff.pk).update(is_staff=True)
+        self.client = APIClient()
+        self.sequence = 0
+
+    def _grow_leaderboard(self, rows):
+        start = Leaderboard.objects.count()
+        users = CustomUser.objects.bulk_create(
+            [CustomUser(email=f"relleno{i}@puce.edu.ec", first_name="Relleno", last_name=str(i)) for i in range(start, rows)],
+            batch_size=5000,
+        )
+        Leaderboard.objects.bulk_create(
+            [Leaderboard(user=user, total_points=(user.pk * 7) % 500) for user in users],
+            batch_size=5000,
+        )
+        rank_cache.rebuild()
+
+    def _login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+    def _location(self):
+        self.sequence += 1
+        location = Location.objects.create(name=f"Ubicación {self.sequence}", qr_code=f"QR-{self.sequence}")
+        Challenge.objects.create(location=location, question="¿?", correct_answer="Sí", options=["Sí", "No"])
+        Hint.objects.create(location=location, text="Pista", order=1)
+        # Se mide con la caché de contenido caliente, como en producción
+        content_cache.get_bundle(location.id)
+        content_cache.get_bundle_by_qr(location.qr_code)
+        return location
+
+    def _token(self):
+        location = self._location()
+        UserProgress.objects.create(user=self.user, location=location)
+        return QRAccessToken.objects.create(user=self.user, location=location).token
+
+    def _consume(self, response):
+        # Las respuestas en streaming consultan la base de datos al leerlas
+        b''.join(response.streaming_content)
+        return response
+
+    def _scenario(self, name):
+        """
+        Prepara los datos de una solicitud a la ruta ``name`` y devuelve la función que la hace.
+        """
+        self.sequence += 1
+        self.client.credentials()
+        if name == 'register':
+            body = {"email": f"nuevo{self.sequence}@puce.edu.ec", "first_name": "Nuevo", "last_name": "Jugador", "password": "clave"}
+            return lambda: self.client.post('/api/register/', body, format='json')
+        if name in ('login', 'token_obtain_pair'):
+            # Sin cookie de sesión, como un login real
+            self.client.cookies.clear()
+            path = '/api/login/' if name == 'login' else '/api/token/'
+            return lambda: self.client.post(path, {"email": self.user.email, "password": "clave-segura"}, format='json')
+        if name == 'token_refresh':
+            refresh = str(RefreshToken.for_user(self.user))
+            return lambda: self.client.post('/api/token/refresh/', {"refresh": refresh}, format='json')
+        if name == 'request-stats':
+            self._login(self.staff)
+            return lambda: self.client.get('/api/stats/requests/')
+        if name == 'export':
+            self._login(self.staff)
+            return lambda: self._consume(self.client.get('/api/export/leaderboard/?output=jsonl'))
+        if name == 'location-stats':
+            self._location()
+            self._login(self.staff)
+            return lambda: self.client.get('/api/stats/locations/')
+        if name == 'ranking-consistency':
+            self._login(self.staff)
+            return lambda: self.client.get('/api/stats/ranking/')
+
+        self._login(self.user)
+        if name == 'user-data':
+            return lambda: self.client.get('/api/user-data/')
+        if name == 'get_leaderboard':
+            return lambda: self.client.get('/api/leaderboard/')
+        if name == 'hunt-leaderboard':
+            hunt = Hunt.objects.create(name=f"Búsqueda {self.sequence}", archived_at=timezone.now())
+            ArchivedLeaderboard.objects.create(hunt=hunt, user_id=self.user.pk, total_points=30, rank=1)
+            return lambda: self.client.get(f'/api/hunts/{hunt.pk}/leaderboard/')
+        if name == 'nearest-locations':
+            return lambda: self.client.get('/api/locations/nearest/?lat=-0.21&lon=-78.49')
+        if name == 'sync':
+            location = self._location()
+            actions = [
+                {"id": 1, "type": "scan", "qr_code": location.qr_code},
+                {"id": 2, "type": "hint", "qr_code": location.qr_code},
+                {"id": 3, "type": "answer", "qr_code": location.qr_code, "answer": "Sí"},
+            ]
+            return lambda: self.client.post('/api/sync/', {"actions": actions}, format='json')
+        if name == 'scan_qr_code':
+            location = self._location()
+            return lambda: self.client.post('/api/scan-qr/', {"qr_code": location.qr_code}, format='json')
+
+        token = self._token()
+        if name == 'get_challenge':
+            return lambda: self.client.get(f'/api/get_challenge/{token}/')
+        if name == 'validate_answer':
+            return lambda: self.client.post(f'/api/validate_answer/{token}/', {"answer": "Sí"}, format='json')
+        if name == 'update_user_progress':
+            return lambda: self.client.post(f'/api/update_user_progress/{token}/')
+        if name == 'get_next_hint':
+            return lambda: self.client.get(f'/api/get_next_hint/{token}/')
+        raise AssertionError(f"No hay escenario para la ruta '{name}'")
+
+    def _count_queries(self, name):
+        request = self._scenario(name)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = request()
+        self.assertLess(response.status_code, 400, f"{name}: {response.status_code}")
+        return len(queries)
+
+    def test_cada_vista_respeta_su_presupuesto(self):
+        views = list(iter_views())
+        counts = {name: [] for name, _, _ in views}
+        for size in self.SIZES:
+            self._grow_leaderboard(size)
+            for name, _, _ in views:
+                self._count_queries(name)  # Calienta las cachés del proceso
+                counts[name].append(self._count_queries(name))
+
+        for name, _, budget in views:
+            with self.subTest(view=name):
+                self.assertIsNotNone(budget, f"La vista '{name}' no declara @query_budget")
+                self.assertLessEqual(max(counts[name]), budget, f"{name}: {counts[name]} consultas (presupuesto {budget})")
+                self.assertEqual(len(set(counts[name])), 1, f"{name} crece con el tamaño de la tabla: {counts[name]}")
@@ -0,0 +1,230 @@
+"""
+Limpieza de QRAccessToken expirados.
+
+- ``sweep_expired`` borra filas expiradas en lotes pequeños, cada uno en su propia
+  transacción corta, para no mantener bloqueos largos.
+- ``TokenSweeper`` ejecuta la limpieza periódicamente en un hilo del proceso servidor
+  (también la de refresh tokens revocados, ver ``api/refresh_tokens.py``).
+- Las funciones de particiones convierten la tabla en una tabla particionada por día
+  de ``expires_at`` (solo PostgreSQL), de modo que los días vencidos se eliminan
+  con un DROP de la partición completa en lugar de borrar fila por fila.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from api import refresh_tokens
+from api.models import CustomUser, Location, QRAccessToken
+
+logger = logging.getLogger(__name__)
+
+TABLE = QRAccessToken._meta.db_table
+PARTITION_PREFIX = f"{TABLE}_p"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def sweep_expired(batch_size=None, pause=0, max_batches=None):
+    """
+    Borra los tokens expirados por lotes. Devuelve (filas borradas, segundos).
+    """
+    batch_size = batch_size or settings.QR_TOKEN_SWEEP_BATCH_SIZE
+    deleted = 0
+    batches = 0
+    start = time.perf_counter()
+    now = timezone.now()
+
+    while max_batches is None or batches < max_batches:
+        # El índice de expires_at permite encontrar el lote sin recorrer la tabla
+        pks = list(
+            QRAccessToken.objects.filter(expires_at__lt=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        count, _ = QRAccessToken.objects.filter(pk__in=pks).delete()
+        deleted += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+
+    return deleted, time.perf_counter() - start
+
+
+# Particiones por día (PostgreSQL)
+
+def _require_postgresql():
+    if connection.vendor != 'postgresql':
+        raise RuntimeError("El particionado de QRAccessToken solo está disponible en PostgreSQL.")
+
+
+def _partition_name(day):
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def convert_to_partitioned(days_ahead=None):
+    """
+    Convierte la tabla de tokens en una tabla particionada por rango diario de
+    ``expires_at``. Solo se copian los tokens que siguen vigentes.
+
+    La clave primaria pasa a ser (id, expires_at) y la unicidad del token a
+    (token, expires_at), porque PostgreSQL exige la columna de partición en ellas.
+    """
+    _require_postgresql()
+    if is_partitioned():
+        return False
+
+    legacy = f"{TABLE}_legacy"
+    sequence = f"{TABLE}_part_id_seq"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        cursor.execute(f'CREATE SEQUENCE "{sequence}"')
+        cursor.execute(f"""
+            CREATE TABLE "{TABLE}" (
+                "id" bigint NOT NULL DEFAULT nextval('{sequence}'),
+                "token" uuid NOT NULL,
+                "created_at" timestamp with time zone NOT NULL,
+                "expires_at" timestamp with time zone NOT NULL,
+                "location_id" bigint NOT NULL REFERENCES "{Location._meta.db_table}" ("id") DEFERRABLE INITIALLY DEFERRED,
+                "user_id" bigint NOT NULL REFERENCES "{CustomUser._meta.db_table}" ("id") DEFERRABLE INITIALLY DEFERRED,
+                PRIMARY KEY ("id", "expires_at"),
+                UNIQUE ("token", "expires_at")
+            ) PARTITION BY RANGE ("expires_at")
+        """)
+        cursor.execute(f'ALTER SEQUENCE "{sequence}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'CREATE INDEX "{TABLE}_part_user_idx" ON "{TABLE}" ("user_id")')
+        cursor.execute(f'CREATE INDEX "{TABLE}_part_location_idx" ON "{TABLE}" ("location_id")')
+        cursor.execute(f'CREATE INDEX "{TABLE}_part_expires_idx" ON "{TABLE}" ("expires_at")')
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+        ensure_partitions(days_ahead, cursor=cursor)
+
+        cursor.execute(f"""
+            INSERT INTO "{TABLE}" ("id", "token", "created_at", "expires_at", "location_id", "user_id")
+            SELECT "id", "token", "created_at", "expires_at", "location_id", "user_id"
+            FROM "{legacy}" WHERE "expires_at" >= now()
+        """)
+        cursor.execute(f"""SELECT setval('{sequence}', COALESCE((SELECT MAX("id") FROM "{legacy}"), 0) + 1, false)""")
+        cursor.execute(f'DROP TABLE "{legacy}"')
+    return True
+
+
+def ensure_partitions(days_ahead=None, cursor=None):
+    """
+    Crea las particiones diarias desde hoy hasta ``days_ahead`` días adelante.
+    """
+    _require_postgresql()
+    days_ahead = settings.QR_TOKEN_PARTITION_DAYS_AHEAD if days_ahead is None else days_ahead
+    today = timezone.now().astimezone(dt_timezone.utc).date()
+
+    def create(cur):
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            lower = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+            upper = lower + timedelta(days=1)
+            cur.execute(
+                f'CREATE TABLE IF NOT EXISTS "{_partition_name(day)}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+
+    if cursor is not None:
+        create(cursor)
+    else:
+        with connection.cursor() as cur:
+            create(cur)
+
+
+def drop_expired_partitions():
+    """
+    Elimina completas las particiones diarias cuyos tokens ya expiraron todos.
+    Devuelve la lista de particiones eliminadas.
+    """
+    _require_postgresql()
+    today = timezone.now().astimezone(dt_timezone.utc).date()
+    dropped = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        for (name,) in cursor.fetchall():
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            day = datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d').date()
+            # La partición cubre [day, day + 1): vence por completo al terminar el día
+            if day < today:
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+                cursor.execute(f'DROP TABLE "{name}"')
+                dropped.append(name)
+    return dropped
+
+
+def run_maintenance():
+    """
+    Un ciclo de limpieza: con particiones, crea las próximas y elimina las vencidas;
+    en todos los casos borra por lotes los tokens expirados que queden.
+    """
+    dropped = []
+    if settings.QR_TOKEN_PARTITIONED and is_partitioned():
+        ensure_partitions()
+        dropped = drop_expired_partitions()
+    deleted, elapsed = sweep_expired()
+    return deleted, elapsed, dropped
+
+
+class TokenSweeper(threading.Thread):
+    """
+    Hilo en segundo plano que ejecuta ``run_maintenance`` cada ``interval`` segundos.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='qr-token-sweeper', daemon=True)
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                deleted, elapsed, dropped = run_maintenance()
+                if deleted or dropped:
+                    logger.info("Tokens de QR expirados eliminados: %s filas en %.3fs, particiones: %s", deleted, elapsed, dropped)
+                deleted, elapsed = refresh_tokens.purge_expired()
+                if deleted:
+                    logger.info("Refresh tokens revocados y expirados eliminados: %s filas en %.3fs", deleted, elapsed)
+            except Exception:
+                logger.exception("Error al limpiar los tokens de QR expirados")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_sweeper():
+    """
+    Inicia el barrido periódico si ``QR_TOKEN_SWEEP_INTERVAL`` es mayor que cero.
+    """
+    global _sweeper
+    interval = settings.QR_TOKEN_SWEEP_INTERVAL
+    if not interval:
+        return None
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = TokenSweeper(interval)
+            _sweeper.start()
+    return _sweeper
@@ -2,17 +2,27 @@ from django.urls import path
 from . import views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from api.views import get_leaderboard
+from api.query_budget import query_budget
+from api.refresh_tokens import RotatingTokenRefreshSerializer
 
 urlpatterns = [
     path('login/', views.login_user, name='login'),
     path('register/', views.register_user, name='register'),
     path('user-data/', views.get_user_data, name='user-data'),
-    path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/', query_budget(1)(TokenObtainPairView.as_view()), name='token_obtain_pair'),
+    # SAVEPOINT, INSERT del jti usado y RELEASE (api/refresh_tokens.py)
+    path('token/refresh/', query_budget(3)(TokenRefreshView.as_view(serializer_class=RotatingTokenRefreshSerializer)), name='token_refresh'),
     path('leaderboard/', get_leaderboard, name='get_leaderboard'),
+    path('hunts/<int:hunt_id>/leaderboard/', views.get_hunt_leaderboard, name='hunt-leaderboard'),
+    path('locations/nearest/', views.get_nearest_locations, name='nearest-locations'),
+    path('sync/', views.sync_actions, name='sync'),
     path('scan-qr/', views.scan_qr_code, name='scan_qr_code'),
-    path('get_challenge/<uuid:token>/', views.get_challenge, name='get_challenge'),
-    path('validate_answer/<uuid:token>/', views.validate_answer, name='validate_answer'),
+    path('get_challenge/<str:token>/', views.get_challenge, name='get_challenge'),
+    path('validate_answer/<str:token>/', views.validate_answer, name='validate_answer'),
     path('update_user_progress/<str:token>/', views.update_user_progress, name='update_user_progress'),
-    path('get_next_hint/<uuid:token>/', views.get_next_hint, name='get_next_hint'),
+    path('get_next_hint/<str:token>/', views.get_next_hint, name='get_next_hint'),
+    path('stats/requests/', views.get_request_stats, name='request-stats'),
+    path('stats/locations/', views.get_location_stats, name='location-stats'),
+    path('stats/ranking/', views.get_ranking_consistency, name='ranking-consistency'),
+    path('export/<str:dataset>/', views.export_data, name='export'),
 ]
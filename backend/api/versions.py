@@ -0,0 +1,122 @@
+"""
+Contadores de versión para respuestas condicionales (ETag / 304).
+
+Cada estado cacheable por los clientes tiene un contador en la caché
+``VERSION_CACHE_ALIAS`` que se incrementa al escribir:
+
+- ``leaderboard``: cualquier cambio de puntos (``live_ranking.score_changed``)
+  o de datos de un usuario.
+- ``location:<id>``: cualquier cambio del contenido de la ubicación
+  (``content_cache.invalidate``).
+- ``locations``: cualquier cambio de contenido; reconstruye el índice espacial
+  de ``api/spatial.py``.
+- ``hunts``: cambio de la búsqueda activa (``api/hunts.py``).
+- ``user:<id>``: cambio o borrado de un usuario; invalida su copia en la caché
+  de autenticación de cada proceso (``api/authentication.py``).
+
+Las vistas arman el ETag con la versión y los parámetros de la solicitud y, si
+coincide con ``If-None-Match``, responden 304 sin consultar el ranking ni
+serializar nada. Si el contador se pierde (la caché lo desalojó) se reinicia en
+un valor aleatorio, para no repetir ETags ya entregados. Con varios procesos, la
+caché debe ser compartida (Redis/Memcached) para que todos vean los incrementos;
+si es local del proceso y no hay ``SINGLE_PROCESS``, ``enabled()`` es False y las
+vistas responden sin ETag (los contadores se siguen usando para otras cachés).
+"""
+import hashlib
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+LEADERBOARD = 'leaderboard'
+LOCATIONS = 'locations'
+HUNTS = 'hunts'
+KEY = 'version:{}'
+
+
+def location_key(location_id):
+    return f'location:{location_id}'
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def _backend():
+    return caches[settings.VERSION_CACHE_ALIAS]
+
+
+def enabled():
+    """
+    True si se pueden enviar ETag: todos los procesos ven los mismos contadores.
+    """
+    if not settings.CONDITIONAL_GET_ENABLED:
+        return False
+    return settings.SINGLE_PROCESS or not isinstance(_backend(), LocMemCache)
+
+
+def _seed():
+    return secrets.randbits(48)
+
+
+def get(name):
+    key = KEY.format(name)
+    backend = _backend()
+    version = backend.get(key)
+    if version is None:
+        backend.add(key, _seed(), timeout=None)
+        version = backend.get(key)
+    return version
+
+
+async def aget(name):
+    version = await _backend().aget(KEY.format(name))
+    if version is None:
+        version = await sync_to_async(get)(name)
+    return version
+
+
+def bump(name):
+    key = KEY.format(name)
+    backend = _backend()
+    try:
+        return backend.incr(key)
+    except ValueError:
+        # No existía: cualquier valor nuevo sirve mientras no repita uno anterior
+        backend.add(key, _seed(), timeout=None)
+        return backend.get(key)
+
+
+def etag(name, *parts):
+    """
+    ETag fuerte para el estado ``name`` en su versión actual y los ``parts`` de la solicitud.
+    """
+    digest = hashlib.sha1(':'.join(str(part) for part in (get(name), *parts)).encode()).hexdigest()
+    return f'"{name.split(":")[0]}-{digest[:20]}"'
+
+
+def not_modified(request, tag):
+    """
+    Devuelve la respuesta 304 si el cliente ya tiene ``tag``; si no, None.
+    """
+    if not enabled():
+        return None
+    # Comparación débil, como pide If-None-Match (un proxy con gzip puede debilitar el ETag)
+    etags = [value.removeprefix('W/') for value in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+    if tag in etags or '*' in etags:
+        return with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), tag)
+    return None
+
+
+def with_etag(response, tag):
+    if not enabled():
+        return response
+    response['ETag'] = tag
+    # El cliente puede guardar la respuesta, pero debe revalidarla en cada uso
+    response['Cache-Control'] = 'private, no-cache'
+    return response
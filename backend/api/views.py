@@ -1,17 +1,22 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import status
-from django.contrib.auth import authenticate, login
-from api.models import CustomUser, Leaderboard, Location, UserProgress, QRAccessToken, Challenge, Hint, ParticipationHistory
-import uuid
-from django.utils import timezone
+from django.contrib.auth import login
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from api import analytics, content_cache, events, exports, hints, hunts, instrumentation, offline_sync, passwords, qr_tokens, ranking, scoring, spatial, summaries, versions
+from api.db_routers import replica_reads
+from api.query_budget import query_budget
+from api.rank_cache import rank_cache
+from api.models import CustomUser, Hunt, UserProgress
 import logging
 logger = logging.getLogger(__name__)
 
 
 # Registro de usuario
+@query_budget(4)
 @api_view(['POST'])
 def register_user(request):
     first_name = request.data.get('first_name')
@@ -28,21 +33,26 @@ def register_user(request):
         return Response({"error": "El correo electrónico ya está en uso."}, status=status.HTTP_400_BAD_REQUEST)
 
     # Crear el usuario y guardarlo en la base de datos
-    user = CustomUser.objects.create_user(email=email, password=password, first_name=first_name, last_name=last_name)
-    user.save()
+    CustomUser.objects.create_user(email=email, password=password, first_name=first_name, last_name=last_name)
 
     return Response({"message": "Usuario registrado correctamente."}, status=status.HTTP_201_CREATED)
 
 # Login de usuario con JWTs
+# Presupuesto: buscar al usuario, actualizar last_login y, si su hash está desactualizado, guardarlo de nuevo
+@query_budget(3)
 @api_view(['POST'])
 def login_user(request):
-    email = request.data.get('email').lower()  # Usamos email para autenticar
+    email = request.data.get('email')  # Usamos email para autenticar
     password = request.data.get('password')
 
-    user = authenticate(request, username=email, password=password)  # Autenticación por email
+    # El hash se calcula en el pool acotado de api/passwords.py
+    user = passwords.authenticate(email, password, request)
 
     if user is not None:
-        login(request, user)
+        if settings.LOGIN_CREATE_SESSION:
+            login(request, user)
+        else:
+            passwords.logged_in(request, user)
 
         # Generar un token JWT para la autenticación futura
         refresh = RefreshToken.for_user(user)
@@ -58,8 +68,10 @@ def login_user(request):
         }, status=status.HTTP_401_UNAUTHORIZED)
 
 # Obtener datos del usuario
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_user_data(request):
     user = request.user  # Obtenemos el usuario autenticado
 
@@ -68,142 +80,242 @@ def get_user_data(request):
         first_name = user.first_name if user.first_name else "Nombre"
         last_name = user.last_name if user.last_name else "Apellido"
 
-        # Verificar si el usuario tiene un registro en Leaderboard
-        leaderboard = Leaderboard.objects.filter(user=user).first()
-        points = leaderboard.total_points if leaderboard else 0
+        # Resumen desnormalizado: una sola lectura por clave primaria
+        summary = summaries.get_summary(user)
+        location = summary.current_location
+
+        # Posición en vivo desde la caché del ranking si está activa; si no, la guardada en el resumen
+        rank = summary.rank_snapshot
+        if settings.RANKING_CACHE_ENABLED:
+            rank, _ = ranking.get_standing(user)
 
         return Response({
             "name": f"{first_name} {last_name}",
-            "points": points,
+            "points": summary.total_points,
+            "rank": rank,
+            "completed_count": summary.completed_count,
+            "current_location": {"id": location.id, "name": location.name} if location else None,
+            "last_activity": summary.last_activity,
         })
     return Response({"error": "No autenticado"}, status=401)
 
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_leaderboard(request):
-    leaderboard_data = Leaderboard.objects.select_related('user').order_by('-total_points')  # Orden descendente por puntos
-    ranking = [
-        {
-            "rank": idx + 1,
-            "name": f"{entry.user.first_name} {entry.user.last_name}",
-            "email": entry.user.email,
-            "points": entry.total_points,
-        }
-        for idx, entry in enumerate(leaderboard_data)
-    ]
-    return Response(ranking, status=status.HTTP_200_OK)
+    # Sin cambios en el ranking desde la última descarga: 304 sin consultarlo
+    around_me = request.query_params.get('around') == 'me'
+    tag = versions.etag(versions.LEADERBOARD, request.query_params.urlencode(), request.user.pk if around_me else '')
+    unchanged = versions.not_modified(request, tag)
+    if unchanged:
+        return unchanged
+
+    # Ventana alrededor del usuario: ?around=me&size=K
+    if around_me:
+        try:
+            size = min(int(request.query_params.get('size', settings.LEADERBOARD_AROUND_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({"error": "Parámetro 'size' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        window = ranking.get_around(request.user, max(size, 0))
+        if window is None:
+            return Response({"error": "El usuario no está en el ranking."}, status=status.HTTP_404_NOT_FOUND)
+        return versions.with_etag(Response(window, status=status.HTTP_200_OK), tag)
+
+    # Paginación por cursor: ?cursor=...&limit=N
+    try:
+        limit = min(int(request.query_params.get('limit', settings.LEADERBOARD_PAGE_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({"error": "Parámetro 'limit' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page = ranking.get_page(request.query_params.get('cursor'), limit)
+    except ValueError:
+        return Response({"error": "Cursor inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return versions.with_etag(Response(page, status=status.HTTP_200_OK), tag)
+
+# Ranking de una búsqueda cualquiera, también de las terminadas o archivadas
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_hunt_leaderboard(request, hunt_id):
+    try:
+        limit = min(int(request.query_params.get('limit', settings.LEADERBOARD_PAGE_SIZE)), settings.LEADERBOARD_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return Response({"error": "Parámetro 'limit' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page = ranking.get_hunt_page(hunt_id, request.query_params.get('cursor'), limit)
+    except Hunt.DoesNotExist:
+        return Response({"error": "No existe la búsqueda."}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError:
+        return Response({"error": "Cursor inválido."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(page, status=status.HTTP_200_OK)
+
+
+def _resolve_qr_token(request, token):
+    """
+    Devuelve (location_id, None) si el token de acceso es válido o (None, respuesta de error).
+    """
+    try:
+        return qr_tokens.resolve(token, request.user), None
+    except qr_tokens.TokenExpired:
+        return None, Response({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+    except qr_tokens.TokenForbidden:
+        return None, Response({"error": "El token no pertenece a este usuario."}, status=status.HTTP_403_FORBIDDEN)
+    except qr_tokens.TokenInvalid:
+        return None, Response({"error": "Token inválido."}, status=status.HTTP_404_NOT_FOUND)
+
+
+# Ubicaciones más cercanas que el usuario aún no completó: ?lat=..&lon=..&k=N
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_nearest_locations(request):
+    try:
+        lat = float(request.query_params['lat'])
+        lon = float(request.query_params['lon'])
+        k = min(int(request.query_params.get('k', settings.NEAREST_LOCATIONS_DEFAULT)), settings.NEAREST_LOCATIONS_MAX)
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError
+    except (KeyError, ValueError):
+        return Response({"error": "Se necesitan 'lat' y 'lon' válidos (y 'k' entero)."}, status=status.HTTP_400_BAD_REQUEST)
+
+    completed = set(
+        UserProgress.objects.filter(hunt_id=hunts.active_id(), user=request.user, completed=True)
+        .values_list('location_id', flat=True)
+    )
+    nearest = spatial.location_index.nearest(lat, lon, k, exclude=completed)
+    return Response([
+        {"id": pk, "name": name, "latitude": plat, "longitude": plon, "distance": round(distance, 1)}
+        for distance, pk, name, plat, plon in nearest
+    ], status=status.HTTP_200_OK)
+
 
 # Escanear código QR
+@query_budget(7)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def scan_qr_code(request):
     user = request.user
     qr_code_value = request.data.get('qr_code')
 
-    try:
-        # Buscar la ubicación según el código QR proporcionado
-        location = Location.objects.get(qr_code=qr_code_value)
+    # Buscar la ubicación según el código QR proporcionado (desde la caché de contenido)
+    location = content_cache.get_bundle_by_qr(qr_code_value) if qr_code_value else None
+    if location is None:
+        return Response({"error": "Código QR no válido."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Verificar si el usuario ya completó el desafío en esta ubicación
-        user_progress, created = UserProgress.objects.get_or_create(user=user, location=location)
-        if user_progress.completed:
-            return Response({"error": "Ya has completado el desafío para esta ubicación."}, status=status.HTTP_403_FORBIDDEN)
+    # Verificar si el usuario ya completó el desafío en esta ubicación
+    user_progress, created = UserProgress.objects.get_or_create(
+        user=user, location_id=location["id"], defaults={"last_scanned_qr_id": location["id"], "hunt_id": location.get("hunt")}
+    )
+    if user_progress.completed:
+        return Response({"error": "Ya has completado el desafío para esta ubicación."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Crear un nuevo QRAccessToken válido por un tiempo limitado
-        qr_access_token = QRAccessToken.objects.create(
-            user=user,
-            location=location
-        )
+    # Crear un token de acceso válido por un tiempo limitado (fila QRAccessToken o token firmado)
+    access_token = qr_tokens.issue(user, location["id"])
 
-        # Actualizar el progreso del usuario (registrar la última ubicación escaneada)
-        user_progress.last_scanned_qr = location
-        user_progress.save()
+    # Actualizar el progreso del usuario (registrar la última ubicación escaneada);
+    # una fila recién creada ya la tiene
+    if user_progress.last_scanned_qr_id != location["id"]:
+        user_progress.last_scanned_qr_id = location["id"]
+        user_progress.save(update_fields=['last_scanned_qr'])
+    summaries.record_scan(user.id, location["id"])
+    events.record(user.id, location["id"], events.EventType.SCAN)
 
-        response_data = {
-            "message": "QR escaneado con éxito.",
-            "location": location.name,
-            "token": str(qr_access_token.token),  # Devolver el token para acceder a las pistas y desafíos
-        }
-
-        return Response(response_data, status=status.HTTP_200_OK)
+    response_data = {
+        "message": "QR escaneado con éxito.",
+        "location": location["name"],
+        "token": access_token,  # Devolver el token para acceder a las pistas y desafíos
+    }
 
-    except Location.DoesNotExist:
-        return Response({"error": "Código QR no válido."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(response_data, status=status.HTTP_200_OK)
 
 
 # Obtener desafío usando el token
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_challenge(request, token):
     try:
-        # Obtener el token y verificar que sea válido
-        uuid_token = uuid.UUID(str(token))
-        qr_access_token = QRAccessToken.objects.get(token=uuid_token)
-
-        if not qr_access_token.is_valid():
-            return Response({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+        # Verificar que el token sea válido y pertenezca al usuario
+        location_id, error_response = _resolve_qr_token(request, token)
+        if error_response:
+            return error_response
 
         # Obtener el progreso del usuario para la ubicación del token
-        user_progress = UserProgress.objects.filter(user=request.user, location=qr_access_token.location).first()
+        user_progress = UserProgress.objects.filter(user=request.user, location_id=location_id).first()
 
         if user_progress and user_progress.completed:
             return Response({"message": "Este desafío ya ha sido completado."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Obtener el challenge asociado a la ubicación
-        challenge = Challenge.objects.filter(location=qr_access_token.location).first()
+        # El cliente ya tiene esta versión del desafío: 304 sin leer ni serializar el contenido
+        tag = versions.etag(versions.location_key(location_id), location_id)
+        unchanged = versions.not_modified(request, tag)
+        if unchanged:
+            events.record(request.user.id, location_id, events.EventType.CHALLENGE_VIEW)
+            return unchanged
+
+        # Obtener el challenge asociado a la ubicación (desde la caché de contenido)
+        location = content_cache.get_bundle(location_id)
+        challenge = location["challenge"] if location else None
 
         if challenge:
+            events.record(request.user.id, location_id, events.EventType.CHALLENGE_VIEW)
             response_data = {
-                "question": challenge.question,
-                "points": challenge.points,
-                "options": challenge.options,
+                "question": challenge["question"],
+                "points": challenge["points"],
+                "options": challenge["options"],
             }
-            return Response(response_data, status=status.HTTP_200_OK)
+            return versions.with_etag(Response(response_data, status=status.HTTP_200_OK), tag)
         else:
             return Response({"message": "No hay desafíos disponibles para esta ubicación."}, status=status.HTTP_404_NOT_FOUND)
 
-    except QRAccessToken.DoesNotExist:
-        return Response({"error": "Token inválido."}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         logger.exception("Error inesperado al obtener el desafío con el token: %s", token)
         return Response({"error": f"Error inesperado: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 
+@query_budget(11)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def validate_answer(request, token):
     try:
-        # Obtener el token y verificar que sea válido
-        uuid_token = uuid.UUID(str(token))
-        qr_access_token = QRAccessToken.objects.get(token=uuid_token)
-
-        if not qr_access_token.is_valid():
-            return Response({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+        # Verificar que el token sea válido y pertenezca al usuario
+        location_id, error_response = _resolve_qr_token(request, token)
+        if error_response:
+            return error_response
 
         # Verificar si el usuario ya completó este desafío
-        user_progress = UserProgress.objects.filter(user=request.user, location=qr_access_token.location).first()
+        user_progress = UserProgress.objects.filter(user=request.user, location_id=location_id).first()
 
         if user_progress and user_progress.completed:
             return Response({"message": "Este desafío ya ha sido completado."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Obtener el desafío asociado
-        challenge = Challenge.objects.filter(location=qr_access_token.location).first()
+        # Obtener el desafío asociado (desde la caché de contenido)
+        location = content_cache.get_bundle(location_id)
+        challenge = location["challenge"] if location else None
 
         # Validar la respuesta
         answer = request.data.get('answer')
         if challenge and answer:
-            if challenge.correct_answer.lower() == answer.lower():
-                # Marcar el desafío como completado
-                user_progress.completed = True
-                user_progress.completed_at = timezone.now()
-                user_progress.points_earned += challenge.points
-                user_progress.save()
+            correct = challenge["correct_answer"].lower() == answer.lower()
+            events.record(request.user.id, location_id, events.EventType.ANSWER_ATTEMPT, int(correct))
+            if correct:
+                # Marcar el desafío como completado y sumar los puntos (operación atómica)
+                scoring.award_completion(request.user, location_id, challenge["points"])
 
                 response_data = {
                     "message": "Respuesta correcta.",
-                    "points": challenge.points,
+                    "points": challenge["points"],
                     "correct": True,
                 }
                 return Response(response_data, status=status.HTTP_200_OK)
@@ -216,117 +328,162 @@ def validate_answer(request, token):
         else:
             return Response({"error": "No se encontró el desafío o la respuesta no es válida."}, status=status.HTTP_404_NOT_FOUND)
 
-    except QRAccessToken.DoesNotExist:
-        return Response({"error": "Token inválido."}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({"error": f"Error inesperado: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@query_budget(9)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def update_user_progress(request, token):
     try:
-        # Obtener el token y verificar que sea válido
-        qr_access_token = QRAccessToken.objects.get(token=uuid.UUID(token))
-
-        if not qr_access_token.is_valid():
-            return Response({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+        # Verificar que el token sea válido y pertenezca al usuario
+        location_id, error_response = _resolve_qr_token(request, token)
+        if error_response:
+            return error_response
 
         user = request.user
-        location = qr_access_token.location
+        location = content_cache.get_bundle(location_id)
 
         # Obtener el challenge asociado a la ubicación
-        challenge = Challenge.objects.filter(location=location).first()
+        challenge = location["challenge"] if location else None
 
         if not challenge:
             return Response({"error": "No hay desafíos disponibles para esta ubicación."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Obtener o crear el progreso del usuario en la ubicación
-        user_progress, created = UserProgress.objects.get_or_create(user=user, location=location)
-
-        if not created:
-            # Si el progreso ya existía, simplemente incrementamos los puntos y marcamos como completado
-            user_progress.points_earned += challenge.points
-            user_progress.completed = True
-            user_progress.save()
-        else:
-            # Si es la primera vez que se registra el progreso en esta ubicación
-            user_progress.points_earned = challenge.points
-            user_progress.completed = True
-            user_progress.last_scanned_qr = location
-            user_progress.save()
-
-        # Actualizar el leaderboard
-        leaderboard, _ = Leaderboard.objects.get_or_create(user=user)
-        leaderboard.total_points += challenge.points
-        leaderboard.save()
-
-        # Registrar en el historial de participación
-        ParticipationHistory.objects.create(
-            user=user,
-            location=location,
-            action='Completó el desafío'
-        )
+        # Completar la ubicación y sumar los puntos en una sola transacción.
+        # Si validate_answer ya la completó, no se vuelven a sumar puntos.
+        if not scoring.award_completion(user, location["id"], challenge["points"]):
+            return Response({"message": "El desafío ya había sido completado."}, status=status.HTTP_200_OK)
 
         return Response({"message": "Progreso del usuario actualizado con éxito."}, status=status.HTTP_200_OK)
 
-    except QRAccessToken.DoesNotExist:
-        return Response({"error": "Token inválido."}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         # Log para ayudar con la depuración
         return Response({"error": "Error inesperado. Inténtalo más tarde."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Obtener la siguiente pista
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_next_hint(request, token):
     try:
-        # Convertir el token a UUID
-        try:
-            uuid_token = uuid.UUID(str(token))  # Convertimos a string para evitar problemas con valores inesperados
-        except ValueError:
-            logger.error("Token inválido: %s", token)
-            return Response({"error": "Token inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        # Verificar que el token sea válido y pertenezca al usuario
+        location_id, error_response = _resolve_qr_token(request, token)
+        if error_response:
+            logger.error("Token rechazado (%s): %s", error_response.data["error"], token)
+            return error_response
 
-        # Verificar que el token exista y sea válido
         try:
-            qr_access_token = QRAccessToken.objects.get(token=uuid_token)
-        except QRAccessToken.DoesNotExist:
-            logger.error("Token no encontrado: %s", uuid_token)
-            return Response({"error": "Token no encontrado."}, status=status.HTTP_404_NOT_FOUND)
-
-        if not qr_access_token.is_valid():
-            logger.error("Token expirado: %s", uuid_token)
-            return Response({"error": "El token ha expirado."}, status=status.HTTP_403_FORBIDDEN)
+            count = int(request.query_params.get('count', 1))
+            if not 1 <= count <= settings.HINTS_MAX_BATCH:
+                raise ValueError
+        except ValueError:
+            return Response({"error": f"Parámetro 'count' inválido (1 a {settings.HINTS_MAX_BATCH})."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Obtener el progreso del usuario en la ubicación actual
+        # Pistas ordenadas desde la caché de contenido; el progreso se avanza con un solo UPDATE
         user = request.user
-        location = qr_access_token.location
-
+        location = content_cache.get_bundle(location_id)
         try:
-            user_progress = UserProgress.objects.get(user=user, location=location)
-        except UserProgress.DoesNotExist:
-            logger.error("No se encontró progreso para el usuario: %s en la ubicación: %s", user.email, location.name)
+            taken, remaining = hints.take_hints(user.id, location_id, location, count)
+        except hints.NoProgress:
+            logger.error("No se encontró progreso para el usuario: %s en la ubicación: %s", user.email, location_id)
             return Response({"error": "No se encontró progreso."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Obtener la siguiente pista según el progreso actual
-        current_hint_number = user_progress.current_hint
-        next_hint = Hint.objects.filter(location=location, order=current_hint_number).first()
-
-        if next_hint:
-            # Actualizar el progreso del usuario al siguiente número de pista
-            user_progress.current_hint += 1
-            user_progress.save()
-
-            response_data = {
-                "hint": next_hint.text
-            }
-            return Response(response_data, status=status.HTTP_200_OK)
-        else:
+        if not taken:
             # Si no hay más pistas disponibles
-            logger.info("No hay más pistas disponibles para la ubicación: %s", location.name)
+            logger.info("No hay más pistas disponibles para la ubicación: %s", location["name"] if location else location_id)
             return Response({"message": "No hay más pistas disponibles para esta ubicación."}, status=status.HTTP_200_OK)
 
+        for order, _ in taken:
+            events.record(user.id, location_id, events.EventType.HINT_TAKEN, order)
+
+        response_data = {
+            "hint": taken[0][1],  # Primera pista, como antes de las entregas por lotes
+            "hints": [{"order": order, "text": text} for order, text in taken],
+            "remaining": remaining,
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
     except Exception as e:
         logger.exception("Error inesperado al obtener la siguiente pista con el token: %s", token)
         return Response({"error": "Error inesperado. Inténtalo más tarde."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Sincronizar acciones hechas sin conexión (api/offline_sync.py):
+# {"actions": [{"id", "type": "scan"|"answer"|"hint", "qr_code", "answer", "count", "timestamp"}]}
+# Presupuesto para un lote con una respuesta correcta: cada respuesta correcta
+# adicional suma las consultas de award_completion; escaneos y pistas no suman.
+@query_budget(17)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sync_actions(request):
+    try:
+        results = offline_sync.apply(request.user, request.data.get('actions'))
+    except offline_sync.SyncError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+# Estadísticas por endpoint (middleware de instrumentación, solo staff)
+@query_budget(0)
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def get_request_stats(request):
+    if not settings.REQUEST_STATS_ENABLED:
+        return Response({"error": "La instrumentación está desactivada (REQUEST_STATS_ENABLED)."}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        instrumentation.registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(instrumentation.registry.snapshot())
+
+
+# Estadísticas por ubicación (api/analytics.py, solo staff) de la búsqueda activa o
+# de ?hunt=<id>. Se actualizan con el comando aggregate_location_stats.
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_location_stats(request):
+    hunt_id = request.query_params.get('hunt')
+    if hunt_id is not None:
+        try:
+            hunt_id = int(hunt_id)
+        except ValueError:
+            return Response({"error": "Parámetro 'hunt' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analytics.report(hunt_id))
+
+
+# Consistencia de la caché del ranking (api/rank_cache.py, solo staff). Compara la
+# caché del proceso que atiende la petición con la tabla Leaderboard.
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_ranking_consistency(request):
+    mismatches = rank_cache.check_consistency()
+    return Response({
+        "consistent": not mismatches,
+        "count": len(mismatches),
+        "mismatches": [
+            {"user_id": user_id, "cached": cached, "stored": stored}
+            for user_id, cached, stored in mismatches[:20]
+        ],
+    })
+
+
+# Exportación de resultados en CSV o JSON Lines (api/exports.py, solo staff). Las
+# filas se leen mientras se envía la respuesta: la consulta ocurre al consumirla.
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_data(request, dataset):
+    if dataset not in exports.DATASETS:
+        return Response({"error": f"No existe la exportación '{dataset}'."}, status=status.HTTP_404_NOT_FOUND)
+    # No se usa ?format= porque DRF lo reserva para elegir el renderer
+    fmt = request.query_params.get('output', 'csv')
+    if fmt not in exports.FORMATS:
+        return Response({"error": "El formato debe ser 'csv' o 'jsonl'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(exports.iter_lines(dataset, fmt), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
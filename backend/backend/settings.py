@@ -53,7 +53,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ],
 }
 
@@ -61,10 +61,132 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),  # Tiempo de vida del access token
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),     # Tiempo de vida del refresh token
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
+    'BLACKLIST_AFTER_ROTATION': True,  # Revoca el token usado en api/refresh_tokens.py (sin la app token_blacklist)
 }
 
+# Cachés: 'default' para usos generales y 'content' para el contenido del juego
+# (ubicaciones, desafíos y pistas). Con REDIS_URL las dos se comparten entre todos
+# los procesos servidor (requiere el paquete redis) y las invalidaciones llegan a
+# todos. Sin ella cada proceso tiene las suyas: SINGLE_PROCESS=True declara que hay
+# un solo proceso (runserver, un worker) y que por lo tanto siguen siendo coherentes.
+REDIS_URL = os.getenv('REDIS_URL')
+SINGLE_PROCESS = os.getenv('SINGLE_PROCESS', 'False') == 'True'
+CACHES_COHERENT = bool(REDIS_URL) or SINGLE_PROCESS
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'content': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'content',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'content': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'content',
+        },
+    }
+CONTENT_CACHE_ALIAS = 'content'
+# Segundos; las señales invalidan antes si cambia el contenido, pero con cachés por
+# proceso solo en el proceso que hizo el cambio: los demás lo ven al expirar
+CONTENT_CACHE_TIMEOUT = 3600 if CACHES_COHERENT else 30
+# Contadores de versión para los ETag del ranking y del contenido (api/versions.py).
+# Con varios procesos debe ser una caché compartida: si es local (LocMem) y no hay
+# SINGLE_PROCESS, no se envían ETag, porque un proceso respondería 304 con datos
+# que otro ya cambió
+VERSION_CACHE_ALIAS = 'default'
+CONDITIONAL_GET_ENABLED = os.getenv('CONDITIONAL_GET_ENABLED', 'True') == 'True'
+
+# Caché de usuarios autenticados por JWT (api/authentication.py). Con TTL en 0 se
+# lee el usuario de la base de datos en cada solicitud. Con cachés coherentes cada
+# acierto se compara con la versión compartida del usuario, así que desactivarlo
+# llega a todos los procesos; sin ellas solo al que hizo el cambio, y los demás lo
+# ven al vencer el TTL, por eso es mucho más corto
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60' if CACHES_COHERENT else '5'))  # Segundos
+AUTH_USER_CACHE_SIZE = 10000
+
+# Tokens de acceso por QR (api/qr_tokens.py):
+# 'database' guarda una fila QRAccessToken por escaneo; 'signed' usa tokens firmados sin BD
+QR_TOKEN_MODE = os.getenv('QR_TOKEN_MODE', 'database')
+QR_TOKEN_LIFETIME = timedelta(minutes=15)
+# Limpieza de QRAccessToken expirados (api/token_maintenance.py, comando purge_qr_tokens)
+QR_TOKEN_SWEEP_INTERVAL = int(os.getenv('QR_TOKEN_SWEEP_INTERVAL', '0'))  # Segundos; 0 desactiva el hilo de limpieza
+QR_TOKEN_SWEEP_BATCH_SIZE = 1000
+QR_TOKEN_PARTITIONED = os.getenv('QR_TOKEN_PARTITIONED', 'False') == 'True'  # Tabla particionada por día (PostgreSQL)
+QR_TOKEN_PARTITION_DAYS_AHEAD = 7
+
+# Historial de participación por lotes (api/events.py)
+EVENT_LOG_BATCH_SIZE = 500      # Eventos por bulk_create; al llegar a este número se escribe de inmediato
+EVENT_LOG_FLUSH_INTERVAL = 2.0  # Segundos máximos que un evento espera en memoria
+EVENT_LOG_SYNC = False          # True escribe cada evento dentro de la solicitud
+EVENT_LOG_MAX_PENDING = 100000  # Eventos máximos en memoria; los que no caben se descartan
+EVENT_LOG_MAX_RETRIES = 3       # Lotes fallidos seguidos antes de guardar fila por fila
+# Segundos que api/analytics.py espera antes de contar un evento escrito: un id menor
+# cuya transacción aún no se confirmó no puede quedar detrás de la marca
+ANALYTICS_SAFETY_LAG = EVENT_LOG_FLUSH_INTERVAL + 30
+
+# Máximo de pistas que se pueden pedir de una vez (get_next_hint?count=)
+HINTS_MAX_BATCH = 5
+# Avance de pistas con UPDATE ... RETURNING (api/hints.py). None: solo en PostgreSQL;
+# True lo fuerza (p. ej. SQLite >= 3.35), False usa siempre select_for_update
+HINTS_UPDATE_RETURNING = None
+
+# Sincronización de acciones hechas sin conexión (api/offline_sync.py, sync/)
+OFFLINE_SYNC_MAX_ACTIONS = 100        # Acciones por lote
+OFFLINE_SYNC_MAX_AGE = 7 * 24 * 3600  # Segundos; acciones más antiguas se rechazan
+
+# Segundos que un proceso reutiliza el id de la búsqueda activa (api/hunts.py). Con
+# cachés coherentes el cambio se avisa por la versión 'hunts' y no hace falta
+ACTIVE_HUNT_CACHE_TTL = None if CACHES_COHERENT else 10
+
+# Archivo de búsquedas terminadas (api/hunts.py, comando archive_hunts)
+HUNT_ARCHIVE_BATCH_SIZE = 2000  # Filas movidas por transacción
+
+# Ubicaciones más cercanas sin completar (api/spatial.py, locations/nearest/?k=)
+NEAREST_LOCATIONS_DEFAULT = 3
+NEAREST_LOCATIONS_MAX = 20
+# La versión LOCATIONS que invalida el índice solo llega a todos los procesos si las
+# cachés son coherentes; si no, cada proceso lo reconstruye cada tantos segundos
+SPATIAL_INDEX_REBUILD_INTERVAL = None if CACHES_COHERENT else CONTENT_CACHE_TIMEOUT
+
+# Ranking paginado por cursor
+LEADERBOARD_PAGE_SIZE = 50      # Filas por página por defecto
+LEADERBOARD_MAX_PAGE_SIZE = 200  # Máximo permitido con ?limit=
+LEADERBOARD_AROUND_SIZE = 5      # Vecinos por arriba y por abajo con ?around=me
+
+# Caché del ranking en memoria (api/rank_cache.py)
+RANKING_CACHE_ENABLED = True
+# Con varios procesos de servidor, publicar los cambios en una caché compartida
+# (Redis/Memcached configurado en CACHES) para que todos los procesos los apliquen.
+# Activo por defecto si hay REDIS_URL
+RANKING_CACHE_SHARED = os.getenv('RANKING_CACHE_SHARED', str(bool(REDIS_URL))) == 'True'
+RANKING_CACHE_ALIAS = 'default'
+# Sin publicación compartida cada proceso solo ve sus propios cambios: se reconstruye
+# desde la BD cada tantos segundos (None: nunca, si hay un solo proceso o publicación compartida)
+RANKING_CACHE_REBUILD_INTERVAL = None if RANKING_CACHE_SHARED or SINGLE_PROCESS else 30
+RANKING_CACHE_DELTA_TTL = 300     # Segundos que se conserva cada cambio publicado
+RANKING_CACHE_MAX_REPLAY = 10000  # Si hay más cambios pendientes, se reconstruye desde la BD
+RANKING_CACHE_GAP_TIMEOUT = 2     # Segundos antes de dar por perdido un cambio publicado
+
+# Ranking en vivo por Server-Sent Events (/api/v2/leaderboard/stream/, requiere ASGI)
+LIVE_RANKING_QUEUE_SIZE = 100  # Mensajes pendientes por cliente antes de reenviarle el snapshot
+LIVE_RANKING_HEARTBEAT = 15    # Segundos sin cambios antes de enviar un ping
+
+# Medición de tiempo y consultas por endpoint (api/instrumentation.py).
+# Desactivada, el middleware se retira al arrancar y no agrega costo.
+REQUEST_STATS_ENABLED = os.getenv('REQUEST_STATS_ENABLED', 'False') == 'True'
+REQUEST_STATS_MAX_SQL_SAMPLES = 5  # Ejemplos de SQL duplicado que se guardan por endpoint
+
 MIDDLEWARE = [
+    'api.instrumentation.QueryStatsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -109,9 +231,46 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASSWORD'),
         'HOST': os.getenv('DATABASE_HOST'),
         'PORT': os.getenv('DATABASE_PORT'),
+        # Conexiones persistentes: se reutilizan entre solicitudes durante estos
+        # segundos y se verifican antes de usarlas (0 = una conexión por solicitud)
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # Detrás de PgBouncer en modo transacción los cursores del lado del servidor
+        # (los de .iterator() en las exportaciones) no funcionan
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DATABASE_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
     }
 }
 
+# Pool de conexiones de Django (requiere psycopg 3 con psycopg[pool] en lugar de
+# psycopg2). Reemplaza a las conexiones persistentes.
+if os.getenv('DATABASE_POOL', 'False') == 'True':
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+            # Verifica cada conexión al sacarla del pool
+            'check': ConnectionPool.check_connection,
+        },
+    }
+
+# Réplica de solo lectura (api/db_routers.py). Usa las mismas credenciales que la
+# base principal; en las pruebas es un espejo de 'default'.
+if os.getenv('DATABASE_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DATABASE_REPLICA_HOST'),
+        'PORT': os.getenv('DATABASE_REPLICA_PORT', os.getenv('DATABASE_PORT')),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICA_ALIAS = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+# Segundos en que las lecturas de un usuario (o del contenido) van a la base
+# principal después de escribir, para no leer datos que la réplica aún no tiene
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +290,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hash de contraseñas (api/hashers.py). PASSWORD_HASHER_PROFILE elige el algoritmo
+# preferido ('pbkdf2' o 'scrypt'); los demás siguen aceptándose y las contraseñas
+# se vuelven a hashear con el preferido en el siguiente login. En 0, el costo es
+# el predeterminado de Django.
+PASSWORD_HASHER_PROFILE = os.getenv('PASSWORD_HASHER_PROFILE', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '0'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', '0'))
+_PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'api.hashers.ConfigurablePBKDF2PasswordHasher',
+    'scrypt': 'api.hashers.ConfigurableScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for hasher in _PASSWORD_HASHER_PROFILES.values() if hasher != _PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Hilos que calculan hashes en paralelo (api/passwords.py); el resto de logins espera en cola
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+
+# Con False, el login solo devuelve los JWT y no crea una sesión de Django
+# (el admin sigue usando su propio login con sesión)
+LOGIN_CREATE_SESSION = os.getenv('LOGIN_CREATE_SESSION', 'False') == 'True'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
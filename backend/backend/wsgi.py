@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Limpieza periódica de tokens de QR expirados (desactivada si QR_TOKEN_SWEEP_INTERVAL es 0)
+from api.token_maintenance import start_sweeper  # noqa: E402
+start_sweeper()
@@ -40,7 +40,7 @@ const Leaderboard = ({ onBack, currentUser }) => {
             }
 
             const data = await response.json();
-            setPlayers(data);
+            setPlayers(data.results); // El endpoint ahora devuelve una página: { results, next_cursor }
         } catch (err) {
             setError('Error al cargar el ranking.');
         } finally {
@@ -48,8 +48,52 @@ const Leaderboard = ({ onBack, currentUser }) => {
         }
     };
 
+    // Aplica un cambio del ranking en vivo: el usuario pasa de previous_rank a rank
+    // y los jugadores entre ambas posiciones se desplazan un lugar
+    const applyDelta = (current, delta) => {
+        const { previous_rank: previousRank, ...entry } = delta;
+        const others = current
+            .filter((player) => player.email !== entry.email)
+            .map((player) => {
+                if (previousRank == null) {
+                    return player.rank >= entry.rank ? { ...player, rank: player.rank + 1 } : player;
+                }
+                if (entry.rank < previousRank && player.rank >= entry.rank && player.rank < previousRank) {
+                    return { ...player, rank: player.rank + 1 };
+                }
+                if (entry.rank > previousRank && player.rank > previousRank && player.rank <= entry.rank) {
+                    return { ...player, rank: player.rank - 1 };
+                }
+                return player;
+            });
+        const size = Math.max(current.length, 1);
+        return [...others, entry]
+            .sort((a, b) => a.rank - b.rank)
+            .filter((player) => player.rank <= size);
+    };
+
     useEffect(() => {
         fetchLeaderboard();
+
+        // Actualizaciones en vivo por Server-Sent Events: solo si hay un backend ASGI
+        // configurado (REACT_APP_LIVE_RANKING_URL); runserver (WSGI) no puede enviar el stream
+        const liveRankingUrl = process.env.REACT_APP_LIVE_RANKING_URL;
+        const token = localStorage.getItem('access_token');
+        if (!liveRankingUrl || !token || typeof EventSource === 'undefined') {
+            return undefined;
+        }
+        const source = new EventSource(
+            `${liveRankingUrl}/api/v2/leaderboard/stream/?access_token=${encodeURIComponent(token)}`
+        );
+        source.addEventListener('snapshot', (event) => {
+            setPlayers(JSON.parse(event.data).results);
+            setLoading(false);
+        });
+        source.addEventListener('delta', (event) => {
+            const delta = JSON.parse(event.data);
+            setPlayers((current) => applyDelta(current, delta));
+        });
+        return () => source.close();
     }, []);
 
     const maxPoints = players.length > 0 ? Math.max(...players.map((player) => player.points)) : 1;
@@ -94,7 +138,7 @@ const Leaderboard = ({ onBack, currentUser }) => {
                     <List>
                         {players.map((player) => (
                             <ListItem
-                                key={player.rank}
+                                key={player.email}
                                 sx={{
                                     backgroundColor: currentUser === player.name ? '#FFE082' : '#FFFFFF', // Fondo amarillo suave si es el usuario actual
                                     borderRadius: '15px',